@@ -7,6 +7,28 @@ It includes routers for handling user-related and task-related endpoints.
 Routers:
     - router_users: Handles user registration, login, and user management functionalities.
     - router_tasks: Manages task creation, retrieval, updating, and deletion for authenticated users.
+    - router_metrics: Exposes in-process counters and gauges at /metrics.
+    - router_debug: Protected diagnostics under /debug, such as recent request profiles.
+    - router_batch: Executes many API requests in one round trip at /batch.
+
+Middleware:
+    - ProfilingMiddleware: Profiles requests carrying a signed ``X-Profile-Token`` header or
+      picked by a sampling rate, when profiling is enabled. Added first so it runs closest to
+      the routes.
+    - CompressionMiddleware: Negotiates gzip, brotli or zstd with the client and compresses
+      responses above a minimum size, including streaming responses.
+    - AdmissionMiddleware: Limits concurrent requests per route class (auth, read, write) and
+      sheds excess load with 503 and ``Retry-After``. Added last so it runs first.
+
+Lifespan:
+    - task_archiver: Background thread moving finished and deleted tasks out of the hot
+      tasks table (see db/archival.py), started with the application and stopped with it.
+    - audit_log: Background writer of the audit trail (see db/audit.py); the events still
+      buffered at shutdown are written before the application exits.
+    - revocation_list: Background thread deleting the rows of expired revoked tokens (see
+      auth/revocation.py).
+    - maintenance_scheduler: Background thread running ANALYZE, VACUUM and ``PRAGMA optimize``
+      on the databases in quiet periods (see db/maintenance.py).
 
 Usage:
     To run the application, use the following command:
@@ -25,11 +47,44 @@ API Documentation:
 """
 
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from router.router_users import router as router_users
 from router.router_tasks import router as router_tasks
+from router.router_metrics import router as router_metrics
+from router.router_debug import router as router_debug
+from router.router_batch import router as router_batch
+from middleware.profiling import ProfilingMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.admission import AdmissionMiddleware
+from auth.revocation import revocation_list
+from db.archival import task_archiver
+from db.audit import audit_log
+from db.maintenance import maintenance_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task_archiver.start()
+    audit_log.start()
+    revocation_list.start()
+    maintenance_scheduler.start()
+    yield
+    task_archiver.stop()
+    maintenance_scheduler.stop()
+    revocation_list.stop()
+    audit_log.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
 
 app.include_router(router_users)
-app.include_router(router_tasks)
\ No newline at end of file
+app.include_router(router_tasks)
+app.include_router(router_metrics)
+app.include_router(router_debug)
+app.include_router(router_batch)
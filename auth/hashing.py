@@ -0,0 +1,146 @@
+"""
+This module defines the password hashing policy shared by the whole application.
+
+The cost of a password hash decides both how expensive offline attacks are and how much CPU
+every login burns, so it is set deliberately rather than left at library defaults: at
+startup the cost factor is calibrated so that one hash takes about
+``PASSWORD_HASH_TARGET_MS`` on the current hardware, never going below a safe floor. An
+explicit ``BCRYPT_ROUNDS`` or ``ARGON2_TIME_COST`` skips calibration, which keeps the cost
+identical across heterogeneous workers.
+
+bcrypt is the default scheme; argon2 can be selected with ``PASSWORD_HASH_SCHEME`` when the
+optional ``argon2-cffi`` package is installed. Hashes made with the other scheme or with a
+lower cost remain valid, and ``verify_and_update`` returns a replacement hash for them, so
+``authenticate_user`` upgrades users transparently on their next login.
+
+Functions:
+- build_password_context: Create the CryptContext implementing the policy.
+- calibrate_bcrypt_rounds: Pick the bcrypt rounds closest to a target latency.
+- calibrate_argon2_time_cost: Pick the argon2 time cost closest to a target latency.
+
+Configuration (environment variables):
+- PASSWORD_HASH_SCHEME: "bcrypt" (default) or "argon2".
+- PASSWORD_HASH_TARGET_MS: Target time per hash used for calibration (default 250).
+- BCRYPT_ROUNDS: Fixed bcrypt rounds; calibrated when empty.
+- BCRYPT_MIN_ROUNDS / BCRYPT_MAX_ROUNDS: Bounds of the calibrated rounds (defaults 10 / 16).
+- ARGON2_TIME_COST: Fixed argon2 time cost; calibrated when empty.
+- ARGON2_MEMORY_KIB: argon2 memory cost in KiB (default 65536).
+- ARGON2_PARALLELISM: argon2 lanes (default 1).
+"""
+
+
+import math
+import os
+import time
+
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+
+from logs.logger import logger
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS", "")
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+ARGON2_TIME_COST = os.getenv("ARGON2_TIME_COST", "")
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+CALIBRATION_ROUNDS = 6
+CALIBRATION_SAMPLES = 3
+
+
+def _best_time(hasher) -> float:
+    timings = []
+    for _ in range(CALIBRATION_SAMPLES):
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def calibrate_bcrypt_rounds(target_ms: float = PASSWORD_HASH_TARGET_MS, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                            max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """Pick the bcrypt rounds whose hash time is closest to a target latency.
+
+    Each additional round doubles the work, so one cheap measurement is enough to
+    extrapolate.
+
+    Args:
+        target_ms (float): The target time per hash in milliseconds.
+        min_rounds (int): The lowest acceptable rounds.
+        max_rounds (int): The highest acceptable rounds.
+
+    Returns:
+        int: The calibrated rounds.
+    """
+    elapsed = _best_time(bcrypt.using(rounds=CALIBRATION_ROUNDS))
+    rounds = CALIBRATION_ROUNDS + round(math.log2(target_ms / 1000.0 / elapsed))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+def calibrate_argon2_time_cost(target_ms: float = PASSWORD_HASH_TARGET_MS, memory_kib: int = ARGON2_MEMORY_KIB,
+                               parallelism: int = ARGON2_PARALLELISM, max_time_cost: int = 10) -> int:
+    """Pick the argon2 time cost whose hash time is closest to a target latency.
+
+    The work grows linearly with the time cost at a fixed memory cost.
+
+    Args:
+        target_ms (float): The target time per hash in milliseconds.
+        memory_kib (int): The memory cost in KiB.
+        parallelism (int): The number of lanes.
+        max_time_cost (int): The highest acceptable time cost.
+
+    Returns:
+        int: The calibrated time cost, at least 2.
+    """
+    from passlib.hash import argon2 as argon2_hash
+
+    elapsed = _best_time(argon2_hash.using(time_cost=1, memory_cost=memory_kib, parallelism=parallelism))
+    return max(2, min(max_time_cost, round(target_ms / 1000.0 / elapsed)))
+
+
+def build_password_context(scheme: str = PASSWORD_HASH_SCHEME) -> CryptContext:
+    """Create the CryptContext implementing the hashing policy.
+
+    Args:
+        scheme (str): The scheme new hashes are made with, "bcrypt" or "argon2".
+
+    Raises:
+        RuntimeError: If argon2 is selected without the argon2-cffi package.
+        ValueError: If the scheme is unknown.
+
+    Returns:
+        CryptContext: A context that hashes with the policy and flags weaker hashes for update.
+    """
+    if scheme not in ("bcrypt", "argon2"):
+        raise ValueError(f"Unknown PASSWORD_HASH_SCHEME: {scheme}")
+    if scheme == "argon2" and argon2 is None:
+        raise RuntimeError("The argon2-cffi package is required for PASSWORD_HASH_SCHEME=argon2")
+
+    if scheme == "bcrypt":
+        rounds = int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else calibrate_bcrypt_rounds()
+        settings = {"bcrypt__default_rounds": rounds, "bcrypt__min_rounds": rounds}
+        logger.info(f"Password hashing policy: bcrypt with {rounds} rounds")
+    else:
+        time_cost = int(ARGON2_TIME_COST) if ARGON2_TIME_COST else calibrate_argon2_time_cost()
+        settings = {
+            "argon2__time_cost": time_cost,
+            "argon2__min_rounds": time_cost,
+            "argon2__memory_cost": ARGON2_MEMORY_KIB,
+            "argon2__parallelism": ARGON2_PARALLELISM,
+        }
+        logger.info(f"Password hashing policy: argon2 with time cost {time_cost} and {ARGON2_MEMORY_KIB} KiB")
+
+    # Hashes of the other scheme keep verifying but are flagged for update.
+    schemes = [scheme] + [other for other in ("bcrypt", "argon2") if other != scheme and (other != "argon2" or argon2)]
+    return CryptContext(schemes=schemes, default=scheme, deprecated="auto", **settings)
+
+
+pwd_context = build_password_context()
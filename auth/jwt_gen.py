@@ -2,10 +2,11 @@ from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 import os
+import uuid
 from logs.logger import logger
+from auth.hashing import pwd_context
 
 load_dotenv()
 
@@ -15,8 +16,6 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -32,7 +31,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash the provided password using bcrypt.
+    """Hash the provided password with the shared hashing policy.
 
     Args:
         password (str): The password to be hashed.
@@ -43,7 +42,7 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
-    """Create a JWT access token with an expiration time.
+    """Create a JWT access token with an expiration time and a unique ``jti`` claim.
 
     Args:
         data (dict): The data to include in the token payload.
@@ -57,7 +56,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     logger.info(f"Token expiration set to: {expire}")
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -0,0 +1,242 @@
+"""
+This module provides rate limiting for the password hashing routes.
+
+/login, /token and POST /users each run a bcrypt operation, so a single client can saturate
+every core by hammering them. The limiter keeps one token bucket per client IP and one per
+username. Buckets refill continuously, which gives the smoothness of a sliding window while
+storing only two numbers per key. Buckets that have refilled completely carry no
+information and are evicted by a periodic sweep.
+
+The limiter is applied as a route dependency. It runs before the handler, so a rejected
+request never reaches the database or the password hasher.
+
+Classes:
+- RateLimitRule: Burst size and refill rate of a bucket.
+- MemoryBucketStore: In-process bucket store for a single worker.
+- SQLBucketStore: Bucket store backed by the shared ``rate_limit_buckets`` table.
+- RateLimiter: FastAPI dependency enforcing the per-IP and per-username rules.
+
+Configuration (environment variables):
+- RATE_LIMIT_ENABLED: Set to "false" to disable rate limiting (default "true").
+- RATE_LIMIT_BACKEND: "memory" (default) or "sql" to share limits between workers.
+- RATE_LIMIT_IP_BURST / RATE_LIMIT_IP_PER_MINUTE: Per-IP bucket (defaults 30 / 60).
+- RATE_LIMIT_USER_BURST / RATE_LIMIT_USER_PER_MINUTE: Per-username bucket (defaults 10 / 20).
+- RATE_LIMIT_SWEEP_SECONDS: Interval between idle-key sweeps (default 60).
+"""
+
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+
+from db.database import SessionLocal
+from db.models import RateLimitBucket
+from logs.logger import logger
+from logs.metrics import metrics
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+
+
+class RateLimitRule(NamedTuple):
+    """Burst size and refill rate of a token bucket."""
+    burst: float
+    per_minute: float
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+IP_RULE = RateLimitRule(
+    float(os.getenv("RATE_LIMIT_IP_BURST", "30")),
+    float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60")),
+)
+USER_RULE = RateLimitRule(
+    float(os.getenv("RATE_LIMIT_USER_BURST", "10")),
+    float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "20")),
+)
+
+
+def _refill(tokens: float, updated_at: float, now: float, rule: RateLimitRule) -> float:
+    return min(rule.burst, tokens + (now - updated_at) * rule.rate)
+
+
+def _retry_after(tokens: float, rule: RateLimitRule) -> float:
+    return (1.0 - tokens) / rule.rate if rule.rate > 0 else float("inf")
+
+
+class MemoryBucketStore:
+    """In-process token bucket store.
+
+    Each key holds its token count and last update time. Keys whose bucket would be full
+    again are removed every ``sweep_interval`` seconds.
+
+    Args:
+        sweep_interval (float): Seconds between idle-key sweeps.
+        clock (Callable[[], float]): Time source, monotonic by default.
+    """
+
+    def __init__(self, sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._buckets: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = clock()
+
+    def hit(self, key: str, rule: RateLimitRule) -> float:
+        """Take one token from a bucket.
+
+        Args:
+            key (str): The bucket key.
+            rule (RateLimitRule): The bucket's burst size and refill rate.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise seconds until a token is available.
+        """
+        now = self.clock()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            tokens = rule.burst if bucket is None else _refill(bucket[0], bucket[1], now, rule)
+            if tokens < 1.0:
+                self._buckets[key] = [tokens, now, rule]
+                return _retry_after(tokens, rule)
+            self._buckets[key] = [tokens - 1.0, now, rule]
+            return 0.0
+
+    def _sweep(self, now: float) -> None:
+        idle = [key for key, (tokens, updated_at, rule) in self._buckets.items()
+                if _refill(tokens, updated_at, now, rule) >= rule.burst]
+        for key in idle:
+            del self._buckets[key]
+        self._last_sweep = now
+        if idle:
+            logger.debug(f"Evicted {len(idle)} idle rate limit buckets")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLBucketStore:
+    """Token bucket store backed by the shared ``rate_limit_buckets`` table.
+
+    Each row records when its bucket is full again under the rule it was last hit with, so
+    the sweep evicts every bucket on its own schedule. When two workers create the same
+    bucket at once, the one losing the insert retries on the row the other created.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        sweep_interval (float): Seconds between idle-key sweeps.
+        clock (Callable[[], float]): Time source returning Unix timestamps.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.session_factory = session_factory
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._last_sweep = clock()
+
+    def hit(self, key: str, rule: RateLimitRule) -> float:
+        now = self.clock()
+        with self.session_factory() as db:
+            for attempt in range(2):
+                try:
+                    tokens = self._take(db, key, rule, now)
+                    db.commit()
+                    break
+                except IntegrityError:
+                    db.rollback()
+                    if attempt:
+                        raise
+        return 0.0 if tokens >= 1.0 else _retry_after(tokens, rule)
+
+    def _take(self, db, key: str, rule: RateLimitRule, now: float) -> float:
+        bucket = db.query(RateLimitBucket).filter(RateLimitBucket.key == key).with_for_update().first()
+        if bucket is None:
+            bucket = RateLimitBucket(key=key, tokens=rule.burst, updated_at=now)
+            db.add(bucket)
+            db.flush()
+        tokens = _refill(bucket.tokens, bucket.updated_at, now, rule)
+        bucket.tokens = tokens - 1.0 if tokens >= 1.0 else tokens
+        bucket.updated_at = now
+        bucket.full_at = now + (rule.burst - bucket.tokens) / rule.rate if rule.rate > 0 else None
+        if now - self._last_sweep >= self.sweep_interval:
+            db.query(RateLimitBucket).filter(RateLimitBucket.full_at < now).delete()
+            self._last_sweep = now
+        return tokens
+
+
+async def _extract_username(request: Request) -> Optional[str]:
+    """Return the username submitted in a JSON or form body, if any."""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/json"):
+            body = await request.json()
+        elif content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+            body = await request.form()
+        else:
+            return None
+    except Exception:
+        return None
+    username = body.get("username") if hasattr(body, "get") else None
+    return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+class RateLimiter:
+    """FastAPI dependency enforcing per-IP and per-username token buckets.
+
+    Args:
+        scope (str): Namespace shared by all routes drawing from the same budget.
+        store (MemoryBucketStore | SQLBucketStore, optional): The bucket store. Defaults to
+            the store selected by ``RATE_LIMIT_BACKEND``.
+        ip_rule (RateLimitRule): The per-IP rule.
+        user_rule (RateLimitRule): The per-username rule.
+    """
+
+    def __init__(self, scope: str, store=None, ip_rule: RateLimitRule = IP_RULE, user_rule: RateLimitRule = USER_RULE):
+        self.scope = scope
+        if store is None:
+            store = SQLBucketStore() if RATE_LIMIT_BACKEND == "sql" else MemoryBucketStore()
+        self.store = store
+        self.ip_rule = ip_rule
+        self.user_rule = user_rule
+
+    async def __call__(self, request: Request) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        client_ip = request.client.host if request.client else "unknown"
+        checks = [(f"{self.scope}:ip:{client_ip}", self.ip_rule)]
+        username = await _extract_username(request)
+        if username:
+            checks.append((f"{self.scope}:user:{username}", self.user_rule))
+
+        for key, rule in checks:
+            if isinstance(self.store, MemoryBucketStore):
+                retry_after = self.store.hit(key, rule)
+            else:
+                retry_after = await run_in_threadpool(self.store.hit, key, rule)
+            if retry_after > 0:
+                metrics.incr(f"rate_limit.{self.scope}.rejected")
+                logger.warning(f"Rate limit exceeded for {key}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+                )
+        metrics.incr(f"rate_limit.{self.scope}.allowed")
+
+
+auth_rate_limit = RateLimiter("auth")
@@ -0,0 +1,239 @@
+"""
+This module provides revocation of access tokens before their expiry.
+
+Every access token carries a unique ``jti`` claim. Revoking a token inserts its ``jti`` into
+the ``revoked_tokens`` table, and every worker mirrors that table in memory. Authenticating
+a request therefore never queries the database for revocation: ``get_current_user`` asks the
+in-memory deny list, which answers from a Bloom filter for the vast majority of tokens that
+were never revoked and confirms the rare positive against an exact set.
+
+Workers load rows added by other workers incrementally, at most once every
+``REVOCATION_REFRESH_SECONDS``, using the row ID as a cursor. A token revoked on one worker
+is thus rejected by the others within that interval. IDs are not always committed in
+order: on PostgreSQL a transaction holding a lower ID can commit after one holding a
+higher ID. Every refresh therefore also re-reads the last ``REVOCATION_REFRESH_OVERLAP``
+IDs below the cursor. A row committed later than that is still picked up by the full
+reload every ``REVOCATION_PRUNE_SECONDS``, so no revocation takes longer than that to reach
+every worker. The reload also drops the entries of expired tokens, rebuilding the deny list
+and its Bloom filter from the table.
+
+Refreshing runs on the request path, so it only reads. Expired rows are deleted from the
+table by a background thread, started with the application and stopped with it; a failed
+delete is retried at the next interval without holding back the refreshes.
+
+Classes:
+- BloomFilter: Fixed-size Bloom filter for strings.
+- RevocationList: In-memory mirror of the revoked tokens table, with a background thread
+  deleting expired rows.
+
+Configuration (environment variables):
+- REVOCATION_REFRESH_SECONDS: Minimum interval between loads of new rows (default 1).
+- REVOCATION_REFRESH_OVERLAP: IDs below the cursor re-read on every refresh (default 100).
+- REVOCATION_PRUNE_SECONDS: Interval between full reloads, and between deletions of expired
+  rows (default 300).
+- REVOCATION_BLOOM_CAPACITY: Expected number of revoked, unexpired tokens (default 100000).
+- REVOCATION_BLOOM_ERROR_RATE: Target false positive rate of the filter (default 0.001).
+"""
+
+
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from db.database import SessionLocal
+from db.models import RevokedToken
+from logs.logger import logger
+from logs.metrics import metrics
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "1"))
+REVOCATION_REFRESH_OVERLAP = int(os.getenv("REVOCATION_REFRESH_OVERLAP", "100"))
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "300"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter for strings.
+
+    The size and number of hash functions are derived from the expected capacity and the
+    target false positive rate. Positions come from one BLAKE2b digest split into two
+    halves (double hashing).
+
+    Args:
+        capacity (int): Expected number of items.
+        error_rate (float): Target false positive rate at that capacity.
+    """
+
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """In-memory mirror of the revoked tokens table.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        refresh_interval (float): Minimum seconds between loads of new rows.
+        prune_interval (float): Seconds between full reloads, and between deletions of
+            expired rows.
+        clock (Callable[[], float]): Time source returning Unix timestamps.
+        overlap (int): IDs below the cursor re-read on every refresh.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, refresh_interval: float = REVOCATION_REFRESH_SECONDS,
+                 prune_interval: float = REVOCATION_PRUNE_SECONDS, clock: Callable[[], float] = time.time,
+                 overlap: int = REVOCATION_REFRESH_OVERLAP):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.overlap = overlap
+        self.prune_interval = prune_interval
+        self.clock = clock
+        self._revoked: Dict[str, float] = {}
+        self._bloom = BloomFilter()
+        self._cursor = 0
+        self._next_refresh = 0.0
+        self._next_reload = clock() + prune_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Tell whether a token has been revoked.
+
+        Args:
+            jti (Optional[str]): The token's ``jti`` claim; tokens without one cannot be revoked.
+
+        Returns:
+            bool: True if the token was revoked and has not expired yet.
+        """
+        if not jti:
+            return False
+        if self.clock() >= self._next_refresh:
+            self.refresh()
+        if jti not in self._bloom:
+            return False
+        metrics.incr("revocation.bloom_positives")
+        return jti in self._revoked
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token for all workers.
+
+        Args:
+            jti (str): The token's ``jti`` claim.
+            expires_at (float): Unix timestamp of the token's expiry.
+        """
+        with self.session_factory() as db:
+            db.add(RevokedToken(jti=jti, expires_at=expires_at))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        with self._lock:
+            self._add(jti, expires_at)
+        metrics.incr("revocation.revoked")
+        logger.info(f"Revoked token {jti}")
+
+    def refresh(self) -> None:
+        """Load the rows other workers added since the last refresh, or the whole table when due.
+
+        The full reload drops expired entries and catches rows committed too late for the
+        incremental refresh window. Refreshing never writes. Only one thread refreshes at a
+        time; the others keep answering from the current state instead of waiting.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            now = self.clock()
+            self._next_refresh = now + self.refresh_interval
+            with self.session_factory() as db:
+                if now >= self._next_reload:
+                    self._next_reload = now + self.prune_interval
+                    self._reload(db, now)
+                    return
+                rows = (
+                    db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+                    .filter(RevokedToken.id > self._cursor - self.overlap)
+                    .order_by(RevokedToken.id)
+                    .all()
+                )
+                for row in rows:
+                    self._add(row.jti, row.expires_at)
+                    self._cursor = max(self._cursor, row.id)
+        except Exception as e:
+            logger.error(f"Failed to refresh the token revocation list: {e}")
+        finally:
+            self._lock.release()
+
+    def _add(self, jti: str, expires_at: float) -> None:
+        self._revoked[jti] = expires_at
+        self._bloom.add(jti)
+
+    def _reload(self, db, now: float) -> None:
+        rows = db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.expires_at >= now
+        ).all()
+        bloom = BloomFilter()
+        for row in rows:
+            bloom.add(row.jti)
+        self._revoked = {row.jti: row.expires_at for row in rows}
+        self._bloom = bloom
+        self._cursor = max([self._cursor, *(row.id for row in rows)])
+
+    def purge_expired(self) -> int:
+        """Delete the rows of expired tokens from the table.
+
+        Returns:
+            int: The number of deleted rows.
+        """
+        with self.session_factory() as db:
+            deleted = db.query(RevokedToken).filter(RevokedToken.expires_at < self.clock()).delete()
+            db.commit()
+        if deleted:
+            logger.info(f"Deleted {deleted} expired token revocations")
+        return deleted
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="revocation-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.prune_interval):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.error(f"Failed to delete expired token revocations: {e}")
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revocation_list = RevocationList()
+metrics.register_gauge("revocation.entries", lambda: len(revocation_list))
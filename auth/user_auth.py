@@ -1,34 +1,74 @@
-from fastapi import Depends, HTTPException, status, Cookie
+import hmac
+import os
+
+from fastapi import Depends, HTTPException, Request, status, Cookie, Header
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
-from db.database import get_db
-from db.crud import get_user_by_username
+from db.database import get_read_db
+from db.crud import get_cached_user
 from auth.jwt_gen import SECRET_KEY, ALGORITHM
+from auth.revocation import revocation_list
 from logs.logger import logger
 
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Credential problems"
 )
 
-def get_current_user(access_token: str = Cookie(None), db: Session = Depends(get_db)):
+def get_current_user(request: Request = None, access_token: str = Cookie(None), db: Session = Depends(get_read_db)):
     """Retrieve the current user based on the provided access token.
 
+    The user is looked up through the shared cache (see db/cache.py), so most requests do
+    not query the users table. The sub-requests of one batch share a single authentication:
+    the user resolved for a token is kept in the batch's ``batch_auth`` scope entry and
+    reused by the others.
+
     Args:
+        request (Request): The incoming request.
         access_token (str): The JWT access token provided via cookies.
-        db (Session): The database session dependency.
+        db (Session): The read-only database session dependency.
 
     Raises:
-        HTTPException: If the access token is missing, invalid, or the user is not found.
+        HTTPException: If the access token is missing, invalid, revoked, or the user is not found.
 
     Returns:
-        User: The user object retrieved from the database.
+        User: A detached copy of the user, holding its id, username and email.
     """
     if not access_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token not found",
         )
+    batch_auth = request.scope.get("batch_auth") if request is not None else None
+    if batch_auth is None:
+        return _resolve_user(access_token, db)
+    with batch_auth["lock"]:
+        if access_token not in batch_auth["users"]:
+            batch_auth["users"][access_token] = _resolve_user(access_token, db)
+        return batch_auth["users"][access_token]
+
+def preload_batch_user(batch_auth: dict, access_token: str, db: Session) -> None:
+    """Resolve the user of a batch's access token ahead of its sub-requests.
+
+    A transactional batch calls this before it takes the writer connection, so
+    authenticating its sub-requests does no database work while the transaction is open.
+    Failures are left to the sub-requests, which report them with their own status.
+
+    Args:
+        batch_auth (dict): The batch's ``batch_auth`` scope entry.
+        access_token (str): The JWT access token of the batch request.
+        db (Session): The database session used for the lookup.
+    """
+    try:
+        user = _resolve_user(access_token, db)
+    except HTTPException:
+        return
+    with batch_auth["lock"]:
+        batch_auth["users"][access_token] = user
+
+def _resolve_user(access_token: str, db: Session):
     try:
         logger.info(f"get current user func received the following access_token: {access_token}")
         payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -40,7 +80,12 @@ def get_current_user(access_token: str = Cookie(None), db: Session = Depends(get
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token",
             )
-        user = get_user_by_username(db, username)
+        if revocation_list.is_revoked(payload.get("jti")):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+            )
+        user = get_cached_user(db, username)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,3 +98,20 @@ def get_current_user(access_token: str = Cookie(None), db: Session = Depends(get
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Allow a request only if it carries the operator token in ``X-Admin-Token``.
+
+    The diagnostics routes are hidden entirely (404) when ``ADMIN_TOKEN`` is not set.
+
+    Args:
+        x_admin_token (str): The ``X-Admin-Token`` header.
+
+    Raises:
+        HTTPException: If admin access is disabled or the token does not match.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        logger.warning("Rejected diagnostics request with a missing or invalid admin token")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
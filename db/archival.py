@@ -0,0 +1,219 @@
+"""
+This module moves finished and deleted tasks out of the hot ``tasks`` table.
+
+Every list query scans the owner's rows in ``tasks``, so tasks nobody works on any more
+should not stay there forever. A background thread periodically moves the tasks that were
+finished or soft-deleted longer than ``TASK_ARCHIVE_RETENTION_DAYS`` ago to
+``tasks_archive``. Work is done in small batches of ``TASK_ARCHIVE_BATCH_SIZE`` rows, each
+one short transaction (copy, then delete by primary key), with a pause in between, so the
+writer lock is never held for long and regular writes interleave with the archival.
+
+With task sharding (see db/sharding.py), every shard is archived in turn.
+
+Archived rows can be purged for good after ``TASK_ARCHIVE_PURGE_DAYS``, again in batches.
+Tombstones of deleted tasks are kept, so delta-sync clients still learn about deletions. A
+finished task gets a tombstone of its own when it is archived, in the same transaction, so
+sync clients drop it too.
+
+Classes:
+- TaskArchiver: Background thread archiving and purging tasks.
+
+Functions:
+- archive_tasks: Move the archivable tasks to the archive table in batches.
+- purge_archive: Delete archived tasks older than a cutoff in batches.
+
+Metrics:
+- task_archive.archived / task_archive.purged: Rows moved to and deleted from the archive.
+- task_archive.runs / task_archive.failures: Completed and failed archival runs.
+
+Configuration (environment variables):
+- TASK_ARCHIVE_ENABLED: Set to "false" to disable the background archiver (default "true").
+- TASK_ARCHIVE_RETENTION_DAYS: Age after which finished and deleted tasks are archived (default 30).
+- TASK_ARCHIVE_PURGE_DAYS: Age after which archived tasks are deleted; 0 keeps them (default 0).
+- TASK_ARCHIVE_BATCH_SIZE: Rows moved per transaction (default 500).
+- TASK_ARCHIVE_INTERVAL_SECONDS: Time between archival runs (default 300).
+- TASK_ARCHIVE_PAUSE_MS: Pause between two batches (default 50).
+"""
+
+
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, insert, literal, or_, select
+
+from .database import SessionLocal
+from .models import Task, TaskArchive, TaskTombstone
+from .sharding import shard_router
+from .sync import next_change_seq
+from logs.logger import logger
+from logs.metrics import metrics
+
+TASK_ARCHIVE_ENABLED = os.getenv("TASK_ARCHIVE_ENABLED", "true").lower() == "true"
+TASK_ARCHIVE_RETENTION_DAYS = float(os.getenv("TASK_ARCHIVE_RETENTION_DAYS", "30"))
+TASK_ARCHIVE_PURGE_DAYS = float(os.getenv("TASK_ARCHIVE_PURGE_DAYS", "0"))
+TASK_ARCHIVE_BATCH_SIZE = int(os.getenv("TASK_ARCHIVE_BATCH_SIZE", "500"))
+TASK_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("TASK_ARCHIVE_INTERVAL_SECONDS", "300"))
+TASK_ARCHIVE_PAUSE_MS = float(os.getenv("TASK_ARCHIVE_PAUSE_MS", "50"))
+
+ARCHIVED_COLUMNS = ("id", "name", "description", "status", "owner_id", "updated_at", "seq", "deleted_at")
+
+ARCHIVABLE_IDS = (
+    select(Task.id)
+    .where(or_(Task.deleted_at < bindparam("cutoff"),
+               Task.status.is_(True) & Task.deleted_at.is_(None) & (Task.updated_at < bindparam("cutoff"))))
+    .order_by(Task.id)
+    .limit(bindparam("limit"))
+)
+PURGEABLE_IDS = (
+    select(TaskArchive.id)
+    .where(TaskArchive.archived_at < bindparam("cutoff"))
+    .order_by(TaskArchive.id)
+    .limit(bindparam("limit"))
+)
+
+
+def archive_tasks(session_factory: Callable = SessionLocal, older_than: Optional[datetime] = None,
+                  batch_size: int = TASK_ARCHIVE_BATCH_SIZE, pause: float = TASK_ARCHIVE_PAUSE_MS / 1000.0) -> int:
+    """Move finished and deleted tasks to the archive table in batches.
+
+    Every archived finished task gets a tombstone, like a deleted one.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        older_than (Optional[datetime]): Archive tasks finished or deleted before this time.
+            Defaults to now minus ``TASK_ARCHIVE_RETENTION_DAYS``.
+        batch_size (int): Rows moved per transaction.
+        pause (float): Seconds to wait between two batches.
+
+    Returns:
+        int: The number of archived tasks.
+    """
+    if older_than is None:
+        older_than = datetime.utcnow() - timedelta(days=TASK_ARCHIVE_RETENTION_DAYS)
+    archived = 0
+    while True:
+        with session_factory() as db:
+            ids = db.execute(ARCHIVABLE_IDS, {"cutoff": older_than, "limit": batch_size}).scalars().all()
+            if not ids:
+                break
+            finished = db.execute(select(Task.id, Task.owner_id).where(Task.id.in_(ids) & Task.deleted_at.is_(None)))
+            for task_id, owner_id in finished.all():
+                db.add(TaskTombstone(task_id=task_id, owner_id=owner_id, seq=next_change_seq(db, owner_id)))
+            columns = [Task.__table__.c[name] for name in ARCHIVED_COLUMNS]
+            db.execute(
+                insert(TaskArchive).from_select(
+                    [*ARCHIVED_COLUMNS, "archived_at"],
+                    select(*columns, literal(datetime.utcnow())).where(Task.id.in_(ids)),
+                )
+            )
+            db.execute(delete(Task).where(Task.id.in_(ids)))
+            db.commit()
+        archived += len(ids)
+        metrics.incr("task_archive.archived", len(ids))
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    if archived:
+        logger.info(f"Archived {archived} finished or deleted tasks")
+    return archived
+
+
+def purge_archive(session_factory: Callable = SessionLocal, older_than: Optional[datetime] = None,
+                  batch_size: int = TASK_ARCHIVE_BATCH_SIZE, pause: float = TASK_ARCHIVE_PAUSE_MS / 1000.0) -> int:
+    """Delete archived tasks in batches.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        older_than (Optional[datetime]): Delete tasks archived before this time. Defaults to
+            now minus ``TASK_ARCHIVE_PURGE_DAYS``.
+        batch_size (int): Rows deleted per transaction.
+        pause (float): Seconds to wait between two batches.
+
+    Returns:
+        int: The number of deleted archive rows.
+    """
+    if older_than is None:
+        older_than = datetime.utcnow() - timedelta(days=TASK_ARCHIVE_PURGE_DAYS)
+    purged = 0
+    while True:
+        with session_factory() as db:
+            ids = db.execute(PURGEABLE_IDS, {"cutoff": older_than, "limit": batch_size}).scalars().all()
+            if not ids:
+                break
+            db.execute(delete(TaskArchive).where(TaskArchive.id.in_(ids)))
+            db.commit()
+        purged += len(ids)
+        metrics.incr("task_archive.purged", len(ids))
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    if purged:
+        logger.info(f"Purged {purged} archived tasks")
+    return purged
+
+
+class TaskArchiver:
+    """Background thread archiving and purging tasks at a fixed interval.
+
+    Args:
+        enabled (bool): Whether ``start`` launches the thread.
+        interval (float): Seconds between archival runs.
+        purge_days (float): Age in days after which archived tasks are deleted; 0 keeps them.
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+    """
+
+    def __init__(self, enabled: bool = TASK_ARCHIVE_ENABLED, interval: float = TASK_ARCHIVE_INTERVAL_SECONDS,
+                 purge_days: float = TASK_ARCHIVE_PURGE_DAYS, session_factory: Callable = SessionLocal):
+        self.enabled = enabled
+        self.interval = interval
+        self.purge_days = purge_days
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="task-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> Dict[str, int]:
+        """Archive the archivable tasks and purge old archive rows now.
+
+        Returns:
+            Dict[str, int]: The number of archived and purged rows.
+        """
+        archived = purged = 0
+        for session_factory in self._session_factories():
+            archived += archive_tasks(session_factory)
+            if self.purge_days > 0:
+                purged += purge_archive(session_factory, datetime.utcnow() - timedelta(days=self.purge_days))
+        metrics.incr("task_archive.runs")
+        return {"archived": archived, "purged": purged}
+
+    def _session_factories(self) -> List[Callable]:
+        if shard_router.enabled:
+            return [functools.partial(shard_router.session, name) for name in shard_router.names]
+        return [self.session_factory]
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                metrics.incr("task_archive.failures")
+                logger.error(f"Task archival failed: {e}")
+
+
+task_archiver = TaskArchiver()
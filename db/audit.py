@@ -0,0 +1,337 @@
+"""
+This module keeps an append-only audit trail of user and task mutations.
+
+The mutation functions in db/crud.py record an event (who changed which user or task, and
+the new values) without touching the database: events go into a bounded in-memory buffer,
+and a background writer flushes them in batches to a sink:
+
+- SQLAuditSink: The ``audit_events`` table on the primary (default).
+- FileAuditSink: Gzip-compressed NDJSON files, rotated by size, keeping a fixed number of
+  old files.
+
+Durability is a trade-off between write latency and how many events a crash can lose. The
+writer flushes every ``AUDIT_FLUSH_INTERVAL_MS`` milliseconds, and as soon as
+``AUDIT_FLUSH_SIZE`` events are waiting. With an interval of 0, every event is written
+before the mutation returns. A full buffer (``AUDIT_BUFFER_SIZE``) is flushed by the caller
+itself, so a slow sink slows writers down instead of losing events. When the sink fails,
+events stay buffered and are retried; only what exceeds the buffer is dropped.
+
+Events recorded inside ``AuditLog.deferred()`` are held back instead, so a batch
+transaction can submit them only once it has committed.
+
+Classes:
+- SQLAuditSink: Writes audit events to the ``audit_events`` table.
+- FileAuditSink: Writes audit events to rotating compressed NDJSON files.
+- AuditLog: Buffers audit events and flushes them from a background thread.
+
+Metrics:
+- audit.recorded / audit.written / audit.flushes: Recorded and written events, and batches.
+- audit.caller_flushes: Flushes made by a caller because the buffer was full.
+- audit.failures / audit.dropped: Failed flushes, and events dropped after failures.
+- audit.buffered: Events waiting to be written (gauge).
+
+Configuration (environment variables):
+- AUDIT_ENABLED: Set to "false" to stop recording events (default "true").
+- AUDIT_SINK: "sql" (default) or "file".
+- AUDIT_DIR: Directory of the file sink (default "./audit").
+- AUDIT_FILE_MAX_BYTES: Size after which the current file is rotated (default 10 MiB).
+- AUDIT_FILE_BACKUPS: Number of rotated files kept (default 10).
+- AUDIT_BUFFER_SIZE: Maximum number of buffered events (default 10000).
+- AUDIT_FLUSH_SIZE: Number of waiting events that triggers a flush (default 100).
+- AUDIT_FLUSH_INTERVAL_MS: Maximum time an event waits to be written; 0 writes at once (default 1000).
+"""
+
+
+import glob
+import gzip
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select
+
+from .database import SessionLocal
+from .models import AuditEvent
+from logs.logger import logger
+from logs.metrics import metrics
+
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+AUDIT_SINK = os.getenv("AUDIT_SINK", "sql")
+AUDIT_DIR = os.getenv("AUDIT_DIR", "./audit")
+AUDIT_FILE_MAX_BYTES = int(os.getenv("AUDIT_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+AUDIT_FILE_BACKUPS = int(os.getenv("AUDIT_FILE_BACKUPS", "10"))
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_MS = float(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "1000"))
+
+FILTER_FIELDS = ("action", "entity", "entity_id", "owner_id", "actor_id")
+
+_deferred_audit: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("deferred_audit_events", default=None)
+
+
+class SQLAuditSink:
+    """Writes audit events to the ``audit_events`` table.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        rows = [{**event, "occurred_at": datetime.fromisoformat(event["occurred_at"]),
+                 "details": json.dumps(event["details"])} for event in events]
+        with self.session_factory() as db:
+            db.execute(insert(AuditEvent), rows)
+            db.commit()
+
+    def query(self, filters: Dict[str, Any], since: Optional[datetime], until: Optional[datetime],
+              limit: int) -> List[Dict[str, Any]]:
+        statement = select(AuditEvent).order_by(AuditEvent.id.desc()).limit(limit)
+        for field, value in filters.items():
+            statement = statement.where(getattr(AuditEvent, field) == value)
+        if since is not None:
+            statement = statement.where(AuditEvent.occurred_at >= since)
+        if until is not None:
+            statement = statement.where(AuditEvent.occurred_at < until)
+        with self.session_factory() as db:
+            return [{
+                "occurred_at": event.occurred_at.isoformat(),
+                "action": event.action,
+                "entity": event.entity,
+                "entity_id": event.entity_id,
+                "owner_id": event.owner_id,
+                "actor_id": event.actor_id,
+                "details": json.loads(event.details),
+            } for event in db.execute(statement).scalars()]
+
+
+class FileAuditSink:
+    """Writes audit events to rotating gzip-compressed NDJSON files.
+
+    Every worker process appends to its own ``current-<pid>.ndjson.gz``, one gzip member per
+    batch, so workers never interleave their writes. Once the file exceeds ``max_bytes`` it
+    is renamed with a timestamp, and the oldest rotated files beyond ``backups`` are deleted.
+
+    Args:
+        directory (str): The directory holding the files.
+        max_bytes (int): Size after which the current file is rotated.
+        backups (int): Number of rotated files kept.
+    """
+
+    def __init__(self, directory: str = AUDIT_DIR, max_bytes: int = AUDIT_FILE_MAX_BYTES,
+                 backups: int = AUDIT_FILE_BACKUPS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        path = os.path.join(self.directory, f"current-{os.getpid()}.ndjson.gz")
+        lines = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+        with gzip.open(path, "at", encoding="utf-8") as file:
+            file.write(lines)
+        if os.path.getsize(path) >= self.max_bytes:
+            stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+            os.replace(path, os.path.join(self.directory, f"audit-{stamp}-{os.getpid()}.ndjson.gz"))
+            rotated = sorted(glob.glob(os.path.join(self.directory, "audit-*.ndjson.gz")), reverse=True)
+            for old in rotated[self.backups:]:
+                os.remove(old)
+
+    def query(self, filters: Dict[str, Any], since: Optional[datetime], until: Optional[datetime],
+              limit: int) -> List[Dict[str, Any]]:
+        matches: List[Dict[str, Any]] = []
+        for path in glob.glob(os.path.join(self.directory, "*.ndjson.gz")):
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as file:
+                    events = [json.loads(line) for line in file if line.strip()]
+            except FileNotFoundError:
+                # Rotated by another worker since the listing; skipped by this query.
+                continue
+            for event in events:
+                occurred_at = datetime.fromisoformat(event["occurred_at"])
+                if ((since is None or occurred_at >= since) and (until is None or occurred_at < until)
+                        and all(event.get(field) == value for field, value in filters.items())):
+                    matches.append(event)
+        matches.sort(key=lambda event: event["occurred_at"], reverse=True)
+        return matches[:limit]
+
+
+class AuditLog:
+    """Buffers audit events and flushes them to a sink from a background thread.
+
+    Args:
+        sink (optional): The sink the events are written to. Defaults to the one selected by
+            ``AUDIT_SINK``.
+        enabled (bool): Whether events are recorded.
+        buffer_size (int): Maximum number of buffered events.
+        flush_size (int): Number of waiting events that triggers a flush.
+        flush_interval (float): Maximum seconds an event waits; 0 writes every event at once.
+    """
+
+    def __init__(self, sink=None, enabled: bool = AUDIT_ENABLED, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 flush_size: int = AUDIT_FLUSH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL_MS / 1000.0):
+        if sink is None:
+            sink = FileAuditSink() if AUDIT_SINK == "file" else SQLAuditSink()
+        self.sink = sink
+        self.enabled = enabled
+        self.buffer_size = buffer_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, action: str, entity: str, entity_id: int, owner_id: int, actor_id: Optional[int] = None,
+               **details) -> None:
+        """Record a mutation. Returns without waiting for the event to be written.
+
+        Args:
+            action (str): What happened, e.g. "task.updated".
+            entity (str): The kind of record changed, "task" or "user".
+            entity_id (int): The identifier of the changed record.
+            owner_id (int): The user the changed record belongs to.
+            actor_id (Optional[int]): The authenticated user who made the change, when known.
+            **details: The changed fields.
+        """
+        if not self.enabled:
+            return
+        event = {
+            "occurred_at": datetime.utcnow().isoformat(),
+            "action": action,
+            "entity": entity,
+            "entity_id": entity_id,
+            "owner_id": owner_id,
+            "actor_id": actor_id,
+            "details": details,
+        }
+        deferred = _deferred_audit.get()
+        if deferred is not None:
+            deferred.append(event)
+            return
+        self.submit([event])
+
+    def submit(self, events: List[Dict[str, Any]]) -> None:
+        """Add complete events to the buffer."""
+        if not events:
+            return
+        with self._lock:
+            self._buffer.extend(events)
+            waiting = len(self._buffer)
+        metrics.incr("audit.recorded", len(events))
+        if waiting >= self.buffer_size:
+            metrics.incr("audit.caller_flushes")
+            self.flush()
+        elif self.flush_interval <= 0 or (waiting >= self.flush_size and self._thread is None):
+            self.flush()
+        elif waiting >= self.flush_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write the buffered events now.
+
+        Returns:
+            int: The number of events written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                self.sink.write(batch)
+            except Exception as e:
+                metrics.incr("audit.failures")
+                logger.error(f"Failed to write {len(batch)} audit events: {e}")
+                with self._lock:
+                    self._buffer[:0] = batch
+                    excess = len(self._buffer) - self.buffer_size
+                    if excess > 0:
+                        del self._buffer[:excess]
+                if excess > 0:
+                    metrics.incr("audit.dropped", excess)
+                    logger.error(f"Dropped the {excess} oldest audit events")
+                return 0
+        metrics.incr("audit.written", len(batch))
+        metrics.incr("audit.flushes")
+        return len(batch)
+
+    def query(self, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: int = 100,
+              **filters) -> List[Dict[str, Any]]:
+        """Return the most recent audit events matching the filters.
+
+        Buffered events are written first, so they are included.
+
+        Args:
+            since (Optional[datetime]): Only events at or after this time.
+            until (Optional[datetime]): Only events before this time.
+            limit (int): The maximum number of events.
+            **filters: Required values of ``action``, ``entity``, ``entity_id``, ``owner_id``
+                or ``actor_id``; None values are ignored.
+
+        Raises:
+            ValueError: If a filter is not one of these fields.
+
+        Returns:
+            List[Dict[str, Any]]: The events, newest first.
+        """
+        unknown = set(filters).difference(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown audit filters: {', '.join(sorted(unknown))}")
+        self.flush()
+        filters = {field: value for field, value in filters.items() if value is not None}
+        return self.sink.query(filters, since, until, limit)
+
+    @contextmanager
+    def deferred(self):
+        """Hold back the events recorded in the current context, including threads it spawns.
+
+        Yields:
+            List[Dict[str, Any]]: The held events; pass them to ``submit`` to record them.
+        """
+        events: List[Dict[str, Any]] = []
+        token = _deferred_audit.set(events)
+        try:
+            yield events
+        finally:
+            _deferred_audit.reset(token)
+
+    def start(self) -> None:
+        # With an interval of 0 every event is written by its caller; no thread is needed.
+        if not self.enabled or self.flush_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer thread and write the remaining events."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @property
+    def buffered(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+
+audit_log = AuditLog()
+metrics.register_gauge("audit.buffered", lambda: audit_log.buffered)
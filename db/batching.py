@@ -0,0 +1,166 @@
+"""
+This module implements group-commit batching for task creation.
+
+When batching is enabled, concurrent ``create_task`` calls arriving within a few
+milliseconds of each other are collected into one batch and inserted in a single
+transaction, so a burst of new tasks pays for one commit instead of one per task. Each
+caller still receives its own ``Task`` row.
+
+The first caller of a batch acts as its leader: it waits until the batch is full or the
+maximum wait time has passed, then inserts the batch while the other callers wait for their
+rows. If the batch transaction fails, the rows are retried one by one so a single bad row
+only fails its own caller.
+
+Classes:
+- TaskBatcher: Collects concurrent task inserts into group commits.
+
+Metrics:
+- task_batch.batches: Number of committed batches.
+- task_batch.rows: Number of rows inserted through batches.
+
+Configuration (environment variables):
+- TASK_BATCHING_ENABLED: Set to "true" to batch task inserts (default "false").
+- TASK_BATCH_MAX_SIZE: Maximum number of tasks per batch (default 64).
+- TASK_BATCH_MAX_WAIT_MS: Maximum time the leader waits for more tasks (default 5).
+"""
+
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import Task
+from .sync import next_change_seq
+from logs.logger import logger
+from logs.metrics import metrics
+
+TASK_BATCHING_ENABLED = os.getenv("TASK_BATCHING_ENABLED", "false").lower() == "true"
+TASK_BATCH_MAX_SIZE = int(os.getenv("TASK_BATCH_MAX_SIZE", "64"))
+TASK_BATCH_MAX_WAIT_MS = float(os.getenv("TASK_BATCH_MAX_WAIT_MS", "5"))
+
+
+class _Item:
+    __slots__ = ("task", "error", "done")
+
+    def __init__(self, task: Task):
+        self.task = task
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class _Batch:
+    __slots__ = ("items", "closed")
+
+    def __init__(self):
+        self.items: List[_Item] = []
+        self.closed = False
+
+
+class TaskBatcher:
+    """Collects concurrent task inserts into group commits.
+
+    Batches are kept per database bind, so sessions on different engines never share a
+    transaction.
+
+    Args:
+        enabled (bool): Whether ``create_task`` should go through the batcher.
+        max_batch_size (int): Maximum number of tasks per batch.
+        max_wait_ms (float): Maximum time in milliseconds the leader waits for more tasks.
+    """
+
+    def __init__(self, enabled: bool = TASK_BATCHING_ENABLED, max_batch_size: int = TASK_BATCH_MAX_SIZE,
+                 max_wait_ms: float = TASK_BATCH_MAX_WAIT_MS):
+        self.enabled = enabled
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._open: Dict[int, _Batch] = {}
+        self._condition = threading.Condition()
+
+    def submit(self, db: Session, description: str, user_id: int) -> Task:
+        """Insert a task as part of the next group commit.
+
+        Args:
+            db (Session): The caller's database session; the batch uses the same bind.
+            description (str): The description of the task.
+            user_id (int): The ID of the user who owns the task.
+
+        Raises:
+            Exception: The database error raised while inserting this task.
+
+        Returns:
+            Task: The created task, detached from any session.
+        """
+        item = _Item(Task(description=description, owner_id=user_id))
+        key = id(db.bind)
+        with self._condition:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch_size:
+                self._close(key, batch)
+                self._condition.notify_all()
+
+        if leader:
+            with self._condition:
+                self._condition.wait_for(lambda: batch.closed, timeout=self.max_wait)
+                self._close(key, batch)
+            self._commit(db, batch.items)
+        else:
+            item.done.wait()
+
+        db.info["has_writes"] = True
+        if item.error is not None:
+            raise item.error
+        return item.task
+
+    def _close(self, key: int, batch: _Batch) -> None:
+        batch.closed = True
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def _new_session(self, db: Session) -> Session:
+        info = {key: db.info[key] for key in ("writer", "shard") if key in db.info}
+        return db.__class__(bind=db.bind, info=info, autoflush=False, expire_on_commit=False)
+
+    def _commit(self, db: Session, items: List[_Item]) -> None:
+        try:
+            with self._new_session(db) as batch_db:
+                for item in items:
+                    item.task.seq = next_change_seq(batch_db, item.task.owner_id)
+                batch_db.add_all([item.task for item in items])
+                try:
+                    batch_db.commit()
+                except Exception as e:
+                    batch_db.rollback()
+                    logger.error(f"Batch insert of {len(items)} tasks failed, retrying one by one: {e}")
+                else:
+                    metrics.incr("task_batch.batches")
+                    metrics.incr("task_batch.rows", len(items))
+                    # Load the column defaults of all new rows with one query instead of a refresh per row.
+                    batch_db.query(Task).filter(Task.id.in_([item.task.id for item in items])).populate_existing().all()
+                    batch_db.expunge_all()
+                    return
+
+            for item in items:
+                fresh = Task(description=item.task.description, owner_id=item.task.owner_id)
+                with self._new_session(db) as single_db:
+                    try:
+                        fresh.seq = next_change_seq(single_db, fresh.owner_id)
+                        single_db.add(fresh)
+                        single_db.commit()
+                        single_db.refresh(fresh)
+                        single_db.expunge(fresh)
+                        item.task = fresh
+                    except Exception as e:
+                        single_db.rollback()
+                        item.error = e
+        finally:
+            for item in items:
+                item.done.set()
+
+
+task_batcher = TaskBatcher()
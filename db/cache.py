@@ -0,0 +1,433 @@
+"""
+This module provides a cache shared by the workers of a deployment.
+
+``Cache`` stores JSON-compatible values under namespaced, versioned keys in a pluggable
+backend:
+
+- MemoryCacheBackend: Bounded in-process LRU with TTL. Each worker has its own copy.
+- SQLiteCacheBackend: A SQLite file shared by the workers of one host.
+- RedisCacheBackend: A networked key-value store shared by every host. Any client object
+  with the same ``get``/``set``/``delete``/``incr``/``scan_iter`` methods can stand in for
+  Redis, which is how this path is tested locally.
+
+Keys are built as ``namespace:version:generation:key``. The version is fixed in code and
+changes whenever the shape of the cached values does, so workers running old and new code
+never read each other's entries. The generation is a counter kept in the backend;
+``CacheNamespace.invalidate`` bumps it, which drops every entry of the namespace at once.
+
+Deletions and invalidations are broadcast to the other workers through a broker with the
+interface of db/events.py (in-process by default, Redis pub/sub with
+``CACHE_INVALIDATION_URL``), so the per-worker entries of the memory backend are dropped
+everywhere. Shared backends apply them once, in the worker that made the change. The
+in-process broker only reaches the caches of its own process: with several worker processes,
+the memory backend needs ``CACHE_INVALIDATION_URL``, otherwise the other workers keep
+serving stale entries (e.g. a deleted user) for up to their TTL. The sqlite and redis
+backends need no broker.
+
+Deletions and invalidations made inside ``Cache.deferred()`` are held back instead, so a
+batch transaction can apply them only once it has committed; applied earlier, a concurrent
+request could cache the old row again before the commit.
+
+Values are stored serialized, so callers never share mutable objects through the cache.
+Backend failures are logged and counted, and treated as misses: the cache never fails a
+request.
+
+Classes:
+- MemoryCacheBackend / SQLiteCacheBackend / RedisCacheBackend: Cache storage backends.
+- Cache: Serializes values, instruments backend calls and broadcasts invalidations.
+- CacheNamespace: Versioned keys of one namespace with a default TTL.
+
+Functions:
+- create_cache_backend: Return the backend selected by the configuration.
+
+Metrics:
+- cache.<backend>.<operation>.calls / .ms: Backend calls and their total latency.
+- cache.<backend>.errors: Failed backend calls.
+- cache.<namespace>.hits / .misses: Lookups per namespace.
+- cache.invalidations: Invalidations received from other workers.
+
+Configuration (environment variables):
+- CACHE_BACKEND: "memory" (default), "sqlite" or "redis".
+- CACHE_MAX_ENTRIES: Maximum number of entries of the memory backend (default 10000).
+- CACHE_SQLITE_PATH: File of the SQLite backend (default "./cache.db").
+- CACHE_URL: Redis URL of the redis backend.
+- CACHE_DEFAULT_TTL: Seconds an entry is kept unless a namespace says otherwise (default 60).
+- CACHE_INVALIDATION_URL: Redis URL broadcasting invalidations; in-process when empty.
+- CACHE_INVALIDATION_CHANNEL: Redis channel name (default "cache-invalidation").
+"""
+
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .events import LocalBroker, RedisBroker, redis
+from logs.logger import logger
+from logs.metrics import metrics
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "./cache.db")
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "60"))
+CACHE_INVALIDATION_URL = os.getenv("CACHE_INVALIDATION_URL", "")
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache-invalidation")
+
+_deferred_invalidations: ContextVar[Optional[List[Tuple[str, str]]]] = ContextVar(
+    "deferred_cache_invalidations", default=None
+)
+
+
+class MemoryCacheBackend:
+    """Bounded in-process cache with LRU eviction and TTL.
+
+    Args:
+        max_entries (int): The maximum number of entries kept.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        # Counters are never evicted: losing one would bring back invalidated entries.
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Cache stored in a SQLite file shared by the workers of one host.
+
+    Every thread uses its own connection. The file runs in WAL mode, so readers never wait
+    for the writer. Expired entries are ignored on read and deleted every ``PURGE_EVERY`` writes.
+
+    Args:
+        path (str): The database file.
+    """
+
+    name = "sqlite"
+    shared = True
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        return self._connection().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, 1, NULL) "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, expires_at = NULL "
+            "RETURNING value",
+            (key,),
+        ).fetchone()[0]
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM cache_entries")
+
+
+class RedisCacheBackend:
+    """Cache stored in Redis, shared by every host.
+
+    Args:
+        url (str): The Redis URL. Ignored when ``client`` is given.
+        client: A Redis client, or a stand-in with the same methods.
+        prefix (str): Prefix of every key, so ``clear`` only drops the cache's own keys.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = CACHE_URL, client=None, prefix: str = "cache:"):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for CACHE_BACKEND=redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_cache_backend(name: str = CACHE_BACKEND):
+    """Return the backend selected by ``CACHE_BACKEND``.
+
+    Args:
+        name (str): "memory", "sqlite" or "redis".
+
+    Raises:
+        ValueError: If the backend is unknown.
+
+    Returns:
+        MemoryCacheBackend | SQLiteCacheBackend | RedisCacheBackend: A new backend.
+    """
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sqlite":
+        return SQLiteCacheBackend()
+    if name == "redis":
+        return RedisCacheBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {name!r}, expected memory, sqlite or redis")
+
+
+class Cache:
+    """Serializes values, instruments backend calls and broadcasts invalidations.
+
+    Args:
+        backend (optional): The storage backend. Defaults to the one selected by
+            ``CACHE_BACKEND``.
+        broker (optional): The broker carrying invalidations between workers. Defaults to
+            Redis with ``CACHE_INVALIDATION_URL``, in-process otherwise.
+    """
+
+    def __init__(self, backend=None, broker=None):
+        self.backend = backend if backend is not None else create_cache_backend()
+        self.origin = uuid.uuid4().hex
+        if broker is None:
+            broker = (RedisBroker(CACHE_INVALIDATION_URL, CACHE_INVALIDATION_CHANNEL)
+                      if CACHE_INVALIDATION_URL else LocalBroker())
+        broker.start(self.dispatch)
+        self.broker = broker
+
+    def namespace(self, name: str, version: int = 1, ttl: Optional[float] = CACHE_DEFAULT_TTL) -> "CacheNamespace":
+        """Return the keys of a namespace.
+
+        Args:
+            name (str): The namespace name.
+            version (int): The format version of the cached values.
+            ttl (Optional[float]): Default seconds an entry is kept; None keeps it until evicted.
+
+        Returns:
+            CacheNamespace: The namespace.
+        """
+        return CacheNamespace(self, name, version, ttl)
+
+    def call(self, operation: str, *args) -> Any:
+        """Run a backend operation, recording its latency; failures are logged and return None."""
+        started = time.perf_counter()
+        try:
+            return getattr(self.backend, operation)(*args)
+        except Exception as e:
+            metrics.incr(f"cache.{self.backend.name}.errors")
+            logger.error(f"Cache {operation} on the {self.backend.name} backend failed: {e}")
+            return None
+        finally:
+            metrics.incr(f"cache.{self.backend.name}.{operation}.calls")
+            metrics.incr(f"cache.{self.backend.name}.{operation}.ms", (time.perf_counter() - started) * 1000)
+
+    def get(self, key: str) -> Any:
+        raw = self.call("get", key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self.call("set", key, json.dumps(value, separators=(",", ":")).encode(), ttl)
+
+    def delete(self, key: str) -> None:
+        """Delete an entry here and in every other worker."""
+        self._invalidate("delete", key)
+
+    def incr(self, key: str) -> None:
+        """Increment a counter here and in every other worker."""
+        self._invalidate("incr", key)
+
+    @contextmanager
+    def deferred(self):
+        """Hold back the deletions and increments made in the current context, including
+        threads it spawns.
+
+        Yields:
+            List[Tuple[str, str]]: The held operations; pass them to ``apply`` to run them.
+        """
+        invalidations: List[Tuple[str, str]] = []
+        token = _deferred_invalidations.set(invalidations)
+        try:
+            yield invalidations
+        finally:
+            _deferred_invalidations.reset(token)
+
+    def apply(self, invalidations: List[Tuple[str, str]]) -> None:
+        """Run operations held back by ``deferred``, here and in every other worker."""
+        for operation, key in invalidations:
+            self.call(operation, key)
+            self._broadcast({"operation": operation, "key": key})
+
+    def _invalidate(self, operation: str, key: str) -> None:
+        deferred = _deferred_invalidations.get()
+        if deferred is not None:
+            deferred.append((operation, key))
+            return
+        self.apply([(operation, key)])
+
+    def clear(self) -> None:
+        self.call("clear")
+
+    def _broadcast(self, message: Dict[str, Any]) -> None:
+        if self.backend.shared:
+            return
+        try:
+            self.broker.publish({**message, "origin": self.origin})
+        except Exception as e:
+            logger.error(f"Failed to broadcast cache invalidation: {e}")
+
+    def dispatch(self, message: Dict[str, Any]) -> None:
+        """Apply an invalidation received from another worker."""
+        if message.get("origin") == self.origin or message.get("operation") not in ("delete", "incr"):
+            return
+        metrics.incr("cache.invalidations")
+        self.call(message["operation"], message["key"])
+
+
+class CacheNamespace:
+    """Versioned keys of one namespace with a default TTL.
+
+    Args:
+        cache (Cache): The cache holding the entries.
+        name (str): The namespace name.
+        version (int): The format version of the cached values.
+        ttl (Optional[float]): Default seconds an entry is kept.
+    """
+
+    def __init__(self, cache: Cache, name: str, version: int, ttl: Optional[float]):
+        self.cache = cache
+        self.name = name
+        self.version = version
+        self.ttl = ttl
+        self._generation_key = f"{name}:{version}:generation"
+
+    def _key(self, key: Any) -> str:
+        generation = int(self.cache.call("get", self._generation_key) or 0)
+        return f"{self.name}:{self.version}:{generation}:{key}"
+
+    def get(self, key: Any) -> Any:
+        """Return the cached value of a key, or None."""
+        value = self.cache.get(self._key(key))
+        metrics.incr(f"cache.{self.name}.{'misses' if value is None else 'hits'}")
+        return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache a JSON-compatible value, for ``ttl`` seconds or the namespace default."""
+        self.cache.set(self._key(key), value, ttl if ttl is not None else self.ttl)
+
+    def delete(self, key: Any) -> None:
+        """Drop a key in every worker."""
+        self.cache.delete(self._key(key))
+
+    def invalidate(self) -> None:
+        """Drop every key of the namespace in every worker."""
+        self.cache.incr(self._generation_key)
+
+    def get_or_set(self, key: Any, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value of a key, loading and caching it on a miss.
+
+        Args:
+            key (Any): The key.
+            loader (Callable[[], Any]): Returns the value; None results are not cached.
+            ttl (Optional[float]): Seconds the value is kept; defaults to the namespace TTL.
+
+        Returns:
+            Any: The cached or loaded value.
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+
+cache = Cache()
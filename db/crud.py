@@ -4,9 +4,28 @@ This module provides functions for interacting with the user and task data model
 It includes functionality to create, read, update, and delete users and tasks in the database. 
 Additionally, it implements user authentication and password hashing.
 
+The read functions are wrapped with single-flight coalescing (see db/singleflight.py), so
+concurrent identical reads share one query. The user lookup of every authenticated request
+goes through the shared cache (see db/cache.py); updating or deleting a user drops the entry
+in every worker. Task creation can be batched into group commits
+(see db/batching.py). Task mutations publish events to the live task feed (see db/events.py).
+User and task mutations are recorded in the audit trail (see db/audit.py) without waiting
+for the audit write.
+
+Task functions are routed to the database holding the owner's tasks (see db/sharding.py);
+without sharding that is the session they are given.
+
+Deleting a task is a soft delete: the row keeps its place until the archiver (see
+db/archival.py) moves it out, and every task query only looks at active rows.
+
+The hot queries are built once at import time with bound parameters. Executing a prebuilt
+statement skips constructing the expression and reuses its memoized cache key, so each call
+goes straight to SQLAlchemy's compiled cache (see the ``sql.compiled_cache.*`` metrics).
+
 Functions:
 - get_user_by_username: Retrieve a user by their username.
 - get_user_by_user_id: Retrieve a user by their ID.
+- get_cached_user: Retrieve a detached copy of a user by their username through the cache.
 - get_all_users: Retrieve all users from the database.
 - create_user: Create a new user in the database.
 - update_user: Update an existing user in the database.
@@ -16,11 +35,12 @@ Functions:
 - get_tasks_by_user: Retrieve all tasks for a specific user.
 - get_task_by_id: Retrieve a specific task by its ID and owner ID.
 - update_task: Update an existing task in the database.
-- delete_task: Delete a specific task from the database.
+- delete_task: Soft-delete a specific task.
+- get_task_changes: Retrieve the tasks changed and deleted since a sync cursor.
 
 Dependencies:
 - SQLAlchemy: For database interactions.
-- Passlib: For password hashing.
+- Passlib: For password hashing, with the shared policy from auth/hashing.py.
 - Logging: For logging important events and errors.
 
 Usage:
@@ -29,14 +49,50 @@ and defined User and Task models.
 """
 
 
+from datetime import datetime
+
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
-from .models import User, Task
-from passlib.context import CryptContext
+from .models import User, Task, TaskTombstone
+from .cache import cache
+from .audit import audit_log
+from .sync import next_change_seq
+from .sharding import sharded, task_session
+from .singleflight import coalesced
+from .batching import task_batcher
+from .events import task_events, task_payload
+from auth.hashing import pwd_context
 from logs.logger import logger
-from typing import List, Optional
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+from logs.metrics import metrics
+from typing import Any, Dict, List, Optional
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username")).limit(1)
+USER_BY_ID = select(User).where(User.id == bindparam("user_id")).limit(1)
+ALL_USERS = select(User)
+TASKS_BY_OWNER = select(Task).where((Task.owner_id == bindparam("owner_id")) & Task.deleted_at.is_(None))
+TASK_BY_ID = (
+    select(Task)
+    .where((Task.owner_id == bindparam("owner_id")) & (Task.id == bindparam("task_id")) & Task.deleted_at.is_(None))
+    .limit(1)
+)
+TASKS_CHANGED_SINCE = (
+    select(Task)
+    .where((Task.owner_id == bindparam("owner_id")) & (Task.seq > bindparam("since")) & Task.deleted_at.is_(None))
+    .order_by(Task.seq)
+    .limit(bindparam("limit"))
+)
+TOMBSTONES_SINCE = (
+    select(TaskTombstone.task_id, TaskTombstone.seq)
+    .where((TaskTombstone.owner_id == bindparam("owner_id")) & (TaskTombstone.seq > bindparam("since")))
+    .order_by(TaskTombstone.seq)
+    .limit(bindparam("limit"))
+)
+
+# Bump the version whenever the cached user columns change.
+user_cache = cache.namespace("users", version=1)
+USER_CACHE_COLUMNS = ("id", "username", "email")
+
+@coalesced
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
     """Retrieve a user from the database by their username.
 
@@ -48,8 +104,31 @@ def get_user_by_username(db: Session, username: str) -> Optional[User]:
         Optional[User]: The user object if found, otherwise None.
     """
     logger.info(f'Searching the database for the following username: {username}')
-    return db.query(User).filter(User.username == username).first()
+    return db.execute(USER_BY_USERNAME, {"username": username}).scalars().first()
+
+def get_cached_user(db: Session, username: str) -> Optional[User]:
+    """Retrieve a user by their username through the shared cache.
+
+    The returned user is a detached copy holding only the id, username and email; use
+    ``get_user_by_username`` when the user is to be changed or its password checked. The
+    session of a transactional batch may see its own uncommitted changes, so it bypasses
+    the cache.
+
+    Args:
+        db (Session): The database session, used on a cache miss.
+        username (str): The username of the user.
+
+    Returns:
+        Optional[User]: A detached user object if found, otherwise None.
+    """
+    def load():
+        user = get_user_by_username(db, username)
+        return None if user is None else {column: getattr(user, column) for column in USER_CACHE_COLUMNS}
+
+    columns = load() if db.info.get("single_transaction") else user_cache.get_or_set(username, load)
+    return None if columns is None else User(**columns)
 
+@coalesced
 def get_user_by_user_id(db: Session, user_id: int) -> Optional[User]:
     """Retrieve a user from the database by their user ID.
 
@@ -61,8 +140,9 @@ def get_user_by_user_id(db: Session, user_id: int) -> Optional[User]:
         Optional[User]: The user object if found, otherwise None.
     """
     logger.info(f'looking for the user with following in id in database: {user_id}')
-    return db.query(User).filter(User.id == user_id).first()
+    return db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
 
+@coalesced
 def get_all_users(db: Session) -> List[User]:
     """Retrieve all users from the database.
 
@@ -73,7 +153,7 @@ def get_all_users(db: Session) -> List[User]:
         List[User]: A list of user objects.
     """
     logger.info("Function was properly called")
-    return db.query(User).all()
+    return db.execute(ALL_USERS).scalars().all()
 
 def create_user(db: Session, username: str, password: str, email: str) -> User:
     """Create a new user in the database.
@@ -96,6 +176,7 @@ def create_user(db: Session, username: str, password: str, email: str) -> User:
         db.add(user)
         db.commit()
         db.refresh(user)
+        audit_log.record("user.created", "user", user.id, user.id, username=username, email=email)
         logger.info(f'user with data: {user} was saved')
         return user
     except Exception as e:
@@ -118,9 +199,12 @@ def update_user(db: Session, user_id: int, email: str, username: str) -> Optiona
     user = get_user_by_user_id(db, user_id=user_id)
     
     if user:
+        previous_username = user.username
         user.username = username
         user.email = email
         db.commit()
+        user_cache.delete(previous_username)
+        audit_log.record("user.updated", "user", user_id, user_id, username=username, email=email)
         db.refresh(user)
         logger.info(f"Successfully updated the user: {username}")
         return user
@@ -142,6 +226,8 @@ def delete_user(db: Session, user_id: int) -> None:
     if user:
         db.delete(user)
         db.commit()
+        user_cache.delete(user.username)
+        audit_log.record("user.deleted", "user", user_id, user_id, username=user.username)
         logger.info(f"user with following user_id: {user_id} was successfully deleted")
     else:
         return None
@@ -149,6 +235,9 @@ def delete_user(db: Session, user_id: int) -> None:
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """Authenticate a user by verifying their username and password.
 
+    A stored hash that does not meet the current hashing policy (see auth/hashing.py) is
+    replaced with a new hash of the verified password.
+
     Args:
         db (Session): The database session.
         username (str): The username of the user.
@@ -158,9 +247,21 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         Optional[User]: The authenticated user object if successful, otherwise None.
     """
     user = get_user_by_username(db, username)
-    if user and pwd_context.verify(password, user.hashed_password):
-        return user
-    return None
+    if not user:
+        return None
+    valid, new_hash = pwd_context.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        try:
+            user.hashed_password = new_hash
+            db.commit()
+            metrics.incr("password_hash.rehashed")
+            logger.info(f"Upgraded the password hash of user {username} to the current policy")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to upgrade the password hash of user {username}: {e}")
+    return user
 
 def create_task(db: Session, description: str, user_id: int) -> Task:
     """Create a new task for a user in the database.
@@ -173,12 +274,21 @@ def create_task(db: Session, description: str, user_id: int) -> Task:
     Returns:
         Task: The created task object.
     """
-    task = Task(description=description, owner_id=user_id)
-    db.add(task)
-    db.commit()
-    db.refresh(task)
+    db = task_session(db, user_id)
+    if task_batcher.enabled and not db.info.get("single_transaction"):
+        task = task_batcher.submit(db, description, user_id)
+    else:
+        task = Task(description=description, owner_id=user_id)
+        task.seq = next_change_seq(db, user_id)
+        db.add(task)
+        db.commit()
+        db.refresh(task)
+    task_events.publish(user_id, "task.created", task_payload(task))
+    audit_log.record("task.created", "task", task.id, user_id, actor_id=user_id, description=description)
     return task
 
+@sharded
+@coalesced
 def get_tasks_by_user(db: Session, user_id: int) -> List[Task]:
     """Retrieve all tasks for a specific user.
 
@@ -189,8 +299,10 @@ def get_tasks_by_user(db: Session, user_id: int) -> List[Task]:
     Returns:
         List[Task]: A list of task objects associated with the user.
     """
-    return db.query(Task).filter(Task.owner_id == user_id).all()
+    return db.execute(TASKS_BY_OWNER, {"owner_id": user_id}).scalars().all()
 
+@sharded
+@coalesced
 def get_task_by_id(db: Session, owner_id: int, task_id: int) -> Optional[Task]:
     """Retrieve a specific task by its ID and owner ID.
 
@@ -202,8 +314,9 @@ def get_task_by_id(db: Session, owner_id: int, task_id: int) -> Optional[Task]:
     Returns:
         Optional[Task]: The task object if found, otherwise None.
     """
-    return db.query(Task).filter((Task.owner_id == owner_id) & (Task.id == task_id)).first() or []
+    return db.execute(TASK_BY_ID, {"owner_id": owner_id, "task_id": task_id}).scalars().first() or []
 
+@sharded
 def update_task(db: Session, owner_id: int, task_id: int, name: str, description: str, status: bool) -> Optional[Task]:
     """Update an existing task in the database.
 
@@ -218,19 +331,24 @@ def update_task(db: Session, owner_id: int, task_id: int, name: str, description
     Returns:
         Optional[Task]: The updated task object if successful, otherwise None.
     """
-    task = db.query(Task).filter((Task.owner_id == owner_id) & (Task.id == task_id)).first() or []
+    task = db.execute(TASK_BY_ID, {"owner_id": owner_id, "task_id": task_id}).scalars().first() or []
     if task:
         task.name = name
         task.description = description
         task.status = status
+        task.seq = next_change_seq(db, owner_id)
         db.commit()
         db.refresh(task)
+        task_events.publish(owner_id, "task.updated", task_payload(task))
+        audit_log.record("task.updated", "task", task_id, owner_id, actor_id=owner_id,
+                         name=name, description=description, status=status)
         return task
     else:
         return None
 
+@sharded
 def delete_task(db: Session, owner_id: int, task_id: int) -> None:
-    """Delete a specific task from the database.
+    """Soft-delete a specific task; it disappears from all reads at once.
 
     Args:
         db (Session): The database session.
@@ -240,11 +358,43 @@ def delete_task(db: Session, owner_id: int, task_id: int) -> None:
     Returns:
         None
     """
-    task = db.query(Task).filter((Task.owner_id == owner_id) & (Task.id == task_id)).first() or []
+    task = db.execute(TASK_BY_ID, {"owner_id": owner_id, "task_id": task_id}).scalars().first() or []
 
     if task:
-        db.delete(task)
+        # The task row carries the deletion's sequence number too, so copies that follow the
+        # row's seq (like a shard move's catch-up) pick up deleted_at.
+        task.seq = next_change_seq(db, owner_id)
+        task.deleted_at = datetime.utcnow()
+        db.add(TaskTombstone(task_id=task_id, owner_id=owner_id, seq=task.seq))
         db.commit()
+        task_events.publish(owner_id, "task.deleted", task_id=task_id)
+        audit_log.record("task.deleted", "task", task_id, owner_id, actor_id=owner_id)
         logger.info(f'task {task.description} was deleted successfully')
     else:
         return None
+
+@sharded
+def get_task_changes(db: Session, owner_id: int, since: int, limit: int = 500) -> Dict[str, Any]:
+    """Retrieve the tasks changed and deleted since a sync cursor.
+
+    Args:
+        db (Session): The database session.
+        owner_id (int): The ID of the task owner.
+        since (int): The cursor returned by the previous sync, 0 for a full sync.
+        limit (int): The maximum number of changes to return.
+
+    Returns:
+        Dict[str, Any]: The changed tasks, the IDs of deleted tasks, the new cursor and
+        whether more changes are waiting.
+    """
+    params = {"owner_id": owner_id, "since": since, "limit": limit + 1}
+    changed = db.execute(TASKS_CHANGED_SINCE, params).scalars().all()
+    deleted = db.execute(TOMBSTONES_SINCE, params).all()
+    merged = sorted([(task.seq, task) for task in changed] + [(row.seq, row) for row in deleted], key=lambda item: item[0])
+    page = merged[:limit]
+    return {
+        "changes": [item for _, item in page if isinstance(item, Task)],
+        "deleted": [item.task_id for _, item in page if not isinstance(item, Task)],
+        "cursor": page[-1][0] if page else since,
+        "has_more": len(merged) > limit,
+    }
@@ -4,35 +4,426 @@ Database module.
 This module sets up a connection to a SQLite database, creates a session,
 and provides functionality for interacting with the database in the application.
 
+For file-based SQLite databases a performance profile is applied: every connection gets
+WAL journaling and the pragmas in ``SQLITE_PRAGMAS``, reads use a pool of connections, and
+all writes are funneled through a single writer connection. Writers therefore queue on the
+pool instead of failing with ``database is locked``, while readers keep working
+concurrently thanks to WAL.
+
+Read traffic can be served by one or more replicas. ``get_read_db`` hands out read-only
+sessions bound to the replicas in round-robin order, skipping replicas that recently failed,
+while ``get_db`` keeps handing out read-write sessions on the primary. After a client writes
+through ``get_db``, its reads are pinned to the primary for a short window so it always
+sees its own writes despite replication lag.
+
+Every statement executed on any engine is counted against SQLAlchemy's compiled cache, so
+the ``/metrics`` endpoint shows how often statements are served without recompiling.
+
+Metrics:
+- sql.compiled_cache.hits / sql.compiled_cache.misses: Statements found / compiled anew.
+- sql.compiled_cache.uncached: Statements that cannot be cached (e.g. raw SQL strings).
+- sql.compiled_cache.hit_ratio: Hits over cacheable statements (gauge).
+
+Sub-requests of a batch (see router/router_batch.py) carry their shared session in the ASGI
+scope: ``get_db`` and ``get_read_db`` hand out that session instead of opening a new one.
+
+Classes:
+- RoutingSession: Session that sends flushes and DML statements to the writer engine.
+- ReplicaSet: Round-robin, health-aware selection of replica engines.
+- ReadYourWrites: Tracks clients whose reads are temporarily pinned to the primary.
+
 Functions:
-- get_db: Creates and returns a new database session.
+- get_db: Creates and returns a new read-write database session on the primary.
+- get_read_db: Creates and returns a new read-only session, on a replica when possible.
+- is_file_sqlite: Tells whether a database URL points to an SQLite file.
+- apply_sqlite_pragmas: Registers a listener applying pragmas on every new connection.
+- create_sqlite_engines: Creates the read pool and the single-connection writer engine.
+- has_writes: Tells whether a session or its task shard sessions wrote anything.
+- single_transaction_session: Yields a session whose commits all belong to one outer transaction.
+
+Configuration (environment variables):
+- SQLITE_TUNING: Set to "false" to use a plain engine without the profile (default "true").
+- SQLITE_MMAP_SIZE: ``mmap_size`` in bytes (default 268435456).
+- SQLITE_CACHE_SIZE: ``cache_size``; negative values are KiB (default -65536).
+- SQLITE_BUSY_TIMEOUT_MS: ``busy_timeout`` in milliseconds (default 5000).
+- SQLITE_READ_POOL_SIZE: Number of pooled read connections (default 8).
+- SQLITE_WRITER_TIMEOUT: Seconds a write waits for the writer connection (default 30).
+- DATABASE_REPLICA_URLS: Comma-separated replica URLs; reads use the primary when empty.
+- REPLICA_RETRY_SECONDS: How long a failed replica is skipped (default 30).
+- READ_YOUR_WRITES_SECONDS: How long reads stay on the primary after a write (default 5).
 """
 
-from sqlalchemy import create_engine
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, Delete, Insert, Update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Dict, List, Optional, Tuple
+from logs.logger import logger
+from logs.metrics import metrics
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "true").lower() == "true"
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+SQLITE_WRITER_TIMEOUT = float(os.getenv("SQLITE_WRITER_TIMEOUT", "30"))
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+
+class RoutingSession(Session):
+    """Session that sends flushes and DML statements to a dedicated writer engine.
+
+    The writer engine is read from ``session.info["writer"]``; without it the session
+    behaves like a plain Session. Once the current transaction has used the writer, every
+    statement goes to the writer until the transaction ends, so reads see the session's own
+    uncommitted writes. Closing the session also closes the task shard sessions opened
+    through it (see db/sharding.py).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        writer = self.info.get("writer")
+        if writer is not None and (self._flushing or isinstance(clause, (Insert, Update, Delete))
+                                   or self._transaction_uses(writer)):
+            return writer
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def _transaction_uses(self, bind) -> bool:
+        transaction = self.get_transaction()
+        return transaction is not None and bind in transaction._connections
+
+    def close(self) -> None:
+        for shard_db in self.info.pop("shard_sessions", {}).values():
+            shard_db.close()
+        super().close()
+
+
+def has_writes(db: Session) -> bool:
+    """Tell whether a session, or a task shard session opened through it, wrote anything.
+
+    Args:
+        db (Session): The session.
+
+    Returns:
+        bool: True if a flush or a batched insert went through the session.
+    """
+    return bool(db.info.get("has_writes")) or any(
+        shard_db.info.get("has_writes") for shard_db in db.info.get("shard_sessions", {}).values()
+    )
+
+
+def is_file_sqlite(url: str) -> bool:
+    """Tell whether a database URL points to an SQLite file.
+
+    Args:
+        url (str): The SQLAlchemy database URL.
+
+    Returns:
+        bool: True for file-based SQLite databases, False for other backends and ``:memory:``.
+    """
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Dict[str, object] = None) -> None:
+    """Register a listener applying pragmas to every new connection of an engine.
+
+    Args:
+        engine (Engine): The SQLite engine.
+        pragmas (Dict[str, object], optional): Pragma names and values. Defaults to
+            ``SQLITE_PRAGMAS``.
+    """
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_sqlite_engines(url: str) -> Tuple[Engine, Engine]:
+    """Create the read pool and the single-connection writer engine for an SQLite file.
+
+    Args:
+        url (str): The SQLite database URL.
+
+    Returns:
+        Tuple[Engine, Engine]: The read engine and the writer engine.
+    """
+    connect_args = {"check_same_thread": False}
+    read_engine = create_engine(url, connect_args=connect_args, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0)
+    writer_engine = create_engine(
+        url, connect_args=connect_args, pool_size=1, max_overflow=0, pool_timeout=SQLITE_WRITER_TIMEOUT
+    )
+    apply_sqlite_pragmas(read_engine)
+    apply_sqlite_pragmas(writer_engine)
+    return read_engine, writer_engine
+
+
+def create_replica_engine(url: str) -> Engine:
+    """Create an engine for a read replica.
+
+    Args:
+        url (str): The replica database URL.
+
+    Returns:
+        Engine: The replica engine, with the SQLite profile applied to SQLite files.
+    """
+    if SQLITE_TUNING and is_file_sqlite(url):
+        replica = create_engine(url, connect_args={"check_same_thread": False},
+                                pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0)
+        apply_sqlite_pragmas(replica)
+        return replica
+    return create_engine(url, pool_pre_ping=True)
+
+
+class ReplicaSet:
+    """Round-robin, health-aware selection of replica engines.
+
+    A replica whose connection fails is skipped for ``retry_after`` seconds and then tried
+    again. When every replica is down, reads fall back to the primary.
+
+    Args:
+        engines (List[Engine]): The replica engines.
+        retry_after (float): Seconds a failed replica is skipped.
+    """
+
+    def __init__(self, engines: List[Engine], retry_after: float = REPLICA_RETRY_SECONDS):
+        self.engines = engines
+        self.retry_after = retry_after
+        self._down_until: Dict[int, float] = {}
+        self._cycle = itertools.cycle(range(len(engines))) if engines else None
+        self._lock = threading.Lock()
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def choose(self) -> Optional[Engine]:
+        """Return the next healthy replica, or None if there is none."""
+        if not self.engines:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = next(self._cycle)
+                if self._down_until.get(index, 0.0) <= now:
+                    return self.engines[index]
+        return None
+
+    def mark_down(self, replica: Engine) -> None:
+        """Skip a replica for ``retry_after`` seconds."""
+        for index, candidate in enumerate(self.engines):
+            if candidate is replica:
+                logger.warning(f"Replica {replica.url!r} marked down for {self.retry_after}s")
+                with self._lock:
+                    self._down_until[index] = time.monotonic() + self.retry_after
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_down(context.engine)
+
+
+class ReadYourWrites:
+    """Tracks clients whose reads are temporarily pinned to the primary.
+
+    Args:
+        window (float): Seconds reads stay on the primary after a write.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS):
+        self.window = window
+        self._pinned: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, keys: List[str]) -> None:
+        until = time.monotonic() + self.window
+        with self._lock:
+            for key in keys:
+                self._pinned[key] = until
+            if len(self._pinned) >= self.PURGE_EVERY:
+                now = time.monotonic()
+                self._pinned = {key: value for key, value in self._pinned.items() if value > now}
+
+    def is_pinned(self, keys: List[str]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(self._pinned.get(key, 0.0) > now for key in keys)
+
+
+def client_keys(request: Request) -> List[str]:
+    """Return the keys identifying a client for read-your-writes pinning.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        List[str]: The client address and, when present, the access token.
+    """
+    keys = [f"ip:{request.client.host}"] if request.client else []
+    token = request.cookies.get("access_token")
+    if token:
+        keys.append(f"token:{token}")
+    return keys
+
+
+if SQLITE_TUNING and is_file_sqlite(SQLALCHEMY_DATABASE_URL):
+    engine, writer_engine = create_sqlite_engines(SQLALCHEMY_DATABASE_URL)
+else:
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    writer_engine = None
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine,
+    info={"writer": writer_engine} if writer_engine is not None else {},
+)
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, info={"read_only": True})
+
+replicas = ReplicaSet([create_replica_engine(url) for url in DATABASE_REPLICA_URLS])
+read_your_writes = ReadYourWrites()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is CACHE_HIT:
+        metrics.incr("sql.compiled_cache.hits")
+    elif cache_hit is CACHE_MISS:
+        metrics.incr("sql.compiled_cache.misses")
+    else:
+        metrics.incr("sql.compiled_cache.uncached")
+
+
+def _compiled_cache_hit_ratio() -> float:
+    hits = metrics.get("sql.compiled_cache.hits")
+    total = hits + metrics.get("sql.compiled_cache.misses")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.register_gauge("sql.compiled_cache.hit_ratio", _compiled_cache_hit_ratio)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_writes(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise RuntimeError("Attempted to write through a read-only session")
+    session.info["has_writes"] = True
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 Base.metadata.create_all(bind=engine)
 
-def get_db():
-    """Create a new database session and yield it.
+@contextmanager
+def single_transaction_session():
+    """Yield a session whose commits all belong to one outer transaction on the primary.
+
+    Every ``commit()`` made through the session only releases a savepoint, so the crud
+    functions keep working unchanged. The outer transaction is committed when the block
+    exits, unless ``session.info["rollback_only"]`` was set or an exception was raised.
+    pysqlite's own transaction handling does not support savepoints, so for SQLite the
+    transaction is driven explicitly on the connection.
+
+    Yields:
+        Session: The session, flagged with ``info["single_transaction"]``.
+    """
+    connection = (writer_engine or engine).connect()
+    driver_connection = connection.connection.driver_connection
+    sqlite = connection.dialect.name == "sqlite"
+    if sqlite:
+        isolation_level = driver_connection.isolation_level
+        driver_connection.isolation_level = None
+    transaction = connection.begin()
+    if sqlite:
+        connection.exec_driver_sql("BEGIN")
+    db = Session(bind=connection, join_transaction_mode="create_savepoint", autoflush=False,
+                 info={"single_transaction": True})
+    try:
+        yield db
+        if db.info.get("rollback_only"):
+            transaction.rollback()
+        else:
+            transaction.commit()
+    except BaseException:
+        transaction.rollback()
+        raise
+    finally:
+        db.close()
+        if sqlite:
+            driver_connection.isolation_level = isolation_level
+        connection.close()
+
+
+def get_db(request: Request = None):
+    """Create a new read-write database session on the primary and yield it.
 
     This function provides a database session for use in FastAPI route
     handlers. It ensures that the session is properly closed after use.
+    If the session wrote anything, the client's reads stay on the primary
+    for ``READ_YOUR_WRITES_SECONDS``.
+
+    Args:
+        request (Request, optional): The incoming request, used to identify the client.
 
     Yields:
         Session: A SQLAlchemy session for interacting with the database.
     """
+    if request is not None and "batch_db" in request.scope:
+        yield request.scope["batch_db"]
+        return
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        if request is not None and has_writes(db):
+            read_your_writes.pin(client_keys(request))
+        db.close()
+
+def get_read_db(request: Request = None):
+    """Create a new read-only database session and yield it.
+
+    The session is bound to the next healthy replica, or to the primary when no replica
+    is configured or available, or when the client (or an earlier sub-request of the same
+    batch) wrote recently.
+
+    Args:
+        request (Request, optional): The incoming request, used to identify the client.
+
+    Yields:
+        Session: A read-only SQLAlchemy session.
+    """
+    if request is not None and request.scope.get("batch_read_db") is not None:
+        yield request.scope["batch_read_db"]
+        return
+    replica = replicas.choose()
+    if replica is None or (request is not None and (request.scope.get("batch_primary_reads")
+                                                    or read_your_writes.is_pinned(client_keys(request)))):
+        db = ReadSessionLocal(bind=engine)
+    else:
+        db = ReadSessionLocal(bind=replica)
+    try:
+        yield db
+    finally:
+        db.close()
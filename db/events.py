@@ -0,0 +1,278 @@
+"""
+This module implements the live task event feed.
+
+The mutation functions in db/crud.py publish ``task.created``, ``task.updated`` and
+``task.deleted`` events for the task owner. Subscribers (the SSE and WebSocket routes) each
+get a bounded queue of events for their user.
+
+Events travel through a broker. The default ``LocalBroker`` delivers them within the
+current process; ``RedisBroker`` publishes them on a Redis channel so that subscribers in
+every worker receive them. Any object with the same ``publish``/``start`` interface can
+stand in for Redis, which is how the cross-worker path is tested locally.
+
+Events published inside ``TaskEventBus.deferred()`` are held back instead, so a batch
+transaction can publish them only once it has committed.
+
+Slow consumers never block publishers: when a subscriber's queue is full, its pending
+events are dropped and replaced by a single ``resync`` event telling the client to reload
+its task list.
+
+Classes:
+- Subscription: Bounded per-connection event queue.
+- TaskEventBus: Fans events out to the subscribers of each user.
+- LocalBroker: Delivers events within the current process.
+- RedisBroker: Delivers events to every worker through Redis pub/sub.
+
+Functions:
+- task_payload: Serialize a task for an event.
+- format_sse: Encode an event as a Server-Sent Events message.
+
+Metrics:
+- task_events.published / task_events.delivered / task_events.overflows: Event counters.
+- task_events.subscribers: Number of open subscriptions (gauge).
+
+Configuration (environment variables):
+- TASK_EVENTS_BROKER_URL: Redis URL for cross-worker delivery; in-process when empty.
+- TASK_EVENTS_CHANNEL: Redis channel name (default "task-events").
+- TASK_EVENTS_QUEUE_SIZE: Maximum queued events per subscriber (default 100).
+"""
+
+
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from logs.logger import logger
+from logs.metrics import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+TASK_EVENTS_BROKER_URL = os.getenv("TASK_EVENTS_BROKER_URL", "")
+TASK_EVENTS_CHANNEL = os.getenv("TASK_EVENTS_CHANNEL", "task-events")
+TASK_EVENTS_QUEUE_SIZE = int(os.getenv("TASK_EVENTS_QUEUE_SIZE", "100"))
+
+_deferred_events: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("deferred_task_events", default=None)
+
+
+def task_payload(task) -> Dict[str, Any]:
+    """Serialize a task for an event.
+
+    Args:
+        task (Task): The task object.
+
+    Returns:
+        Dict[str, Any]: The task's columns.
+    """
+    return {
+        "id": task.id,
+        "name": task.name,
+        "description": task.description,
+        "status": task.status,
+        "owner_id": task.owner_id,
+        "seq": task.seq,
+    }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as a Server-Sent Events message.
+
+    Args:
+        event (Dict[str, Any]): The event, with its name under "type".
+
+    Returns:
+        str: The SSE message.
+    """
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+class Subscription:
+    """Bounded per-connection event queue.
+
+    The subscription must be created inside the event loop that consumes it; events
+    published from other threads are handed over with ``call_soon_threadsafe``.
+
+    Args:
+        bus (TaskEventBus): The bus the subscription belongs to.
+        user_id (int): The user whose events are received.
+        maxsize (int): Maximum number of queued events.
+    """
+
+    def __init__(self, bus: "TaskEventBus", user_id: int, maxsize: int = TASK_EVENTS_QUEUE_SIZE):
+        self.bus = bus
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for the next event."""
+        return await self.queue.get()
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        """Queue an event; must run in the subscription's event loop."""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            metrics.incr("task_events.overflows")
+            logger.warning(f"Task event subscriber for user {self.user_id} fell behind, sent resync")
+            return
+        self.queue.put_nowait(event)
+        metrics.incr("task_events.delivered")
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class LocalBroker:
+    """Delivers events within the current process."""
+
+    def start(self, dispatch: Callable[[Dict[str, Any]], None]) -> None:
+        self._dispatch = dispatch
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self._dispatch(message)
+
+
+class RedisBroker:
+    """Delivers events to every worker through Redis pub/sub.
+
+    A daemon thread listens on the channel and dispatches every message, including the
+    ones published by this worker, to local subscribers.
+
+    Args:
+        url (str): The Redis URL.
+        channel (str): The channel name.
+    """
+
+    def __init__(self, url: str, channel: str = TASK_EVENTS_CHANNEL):
+        if redis is None:
+            raise RuntimeError("The redis package is required for TASK_EVENTS_BROKER_URL")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, dispatch: Callable[[Dict[str, Any]], None]) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def listen():
+            for message in pubsub.listen():
+                try:
+                    dispatch(json.loads(message["data"]))
+                except Exception as e:
+                    logger.error(f"Failed to dispatch task event: {e}")
+
+        threading.Thread(target=listen, name="task-events-listener", daemon=True).start()
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self.client.publish(self.channel, json.dumps(message))
+
+
+class TaskEventBus:
+    """Fans task events out to the subscribers of each user.
+
+    Args:
+        broker (LocalBroker | RedisBroker, optional): The broker carrying events. Defaults
+            to the broker selected by ``TASK_EVENTS_BROKER_URL``.
+    """
+
+    def __init__(self, broker=None):
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._broker = None
+        self.set_broker(broker)
+
+    def set_broker(self, broker) -> None:
+        """Replace the broker carrying events."""
+        if broker is None:
+            broker = RedisBroker(TASK_EVENTS_BROKER_URL) if TASK_EVENTS_BROKER_URL else LocalBroker()
+        broker.start(self.dispatch)
+        self._broker = broker
+
+    def subscribe(self, user_id: int, maxsize: int = TASK_EVENTS_QUEUE_SIZE) -> Subscription:
+        """Open a subscription to a user's events; call from the consuming event loop."""
+        subscription = Subscription(self, user_id, maxsize)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, event_type: str, task: Optional[Dict[str, Any]] = None, **fields) -> None:
+        """Publish an event for a user. Safe to call from any thread.
+
+        Args:
+            user_id (int): The owner of the task.
+            event_type (str): The event name, e.g. "task.created".
+            task (Optional[Dict[str, Any]]): The serialized task, if any.
+            **fields: Additional event fields.
+        """
+        message = {"type": event_type, "user_id": user_id, **fields}
+        if task is not None:
+            message["task"] = task
+        deferred = _deferred_events.get()
+        if deferred is not None:
+            deferred.append(message)
+            return
+        self.send(message)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Hand a complete event message to the broker."""
+        metrics.incr("task_events.published")
+        try:
+            self._broker.publish(message)
+        except Exception as e:
+            logger.error(f"Failed to publish task event {message['type']}: {e}")
+
+    @contextmanager
+    def deferred(self):
+        """Hold back the events published in the current context, including threads it spawns.
+
+        Yields:
+            List[Dict[str, Any]]: The held messages; pass them to ``send`` to publish them.
+        """
+        messages: List[Dict[str, Any]] = []
+        token = _deferred_events.set(messages)
+        try:
+            yield messages
+        finally:
+            _deferred_events.reset(token)
+
+    def dispatch(self, message: Dict[str, Any]) -> None:
+        """Hand a message from the broker to the local subscribers of its user."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(message.get("user_id"), ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's event loop has been closed.
+                self.unsubscribe(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+task_events = TaskEventBus()
+metrics.register_gauge("task_events.subscribers", lambda: task_events.subscriber_count)
@@ -0,0 +1,271 @@
+"""
+This module implements ``Idempotency-Key`` support for the create endpoints.
+
+A client that retries a request with the same ``Idempotency-Key`` header receives the
+response of the first successful attempt instead of running the handler again, so retries
+on flaky networks neither create duplicate rows nor repeat password hashing.
+
+Keys are scoped by the caller (for example per user for task creation) and bound to a
+fingerprint of the request payload: reusing a key with a different payload is rejected
+with 422, and a retry that arrives while the first attempt is still running gets 409.
+
+Stores:
+- MemoryIdempotencyStore: Bounded in-process LRU with TTL. Suitable for a single worker.
+- SQLIdempotencyStore: Shared ``idempotency_keys`` table for multi-worker deployments.
+
+Functions:
+- get_idempotency_store: Return the store selected by the configuration.
+- run_idempotent: Run a route handler at most once per idempotency key.
+
+Configuration (environment variables):
+- IDEMPOTENCY_BACKEND: "memory" (default) or "sql".
+- IDEMPOTENCY_TTL_SECONDS: How long completed responses are kept (default 86400).
+- IDEMPOTENCY_MAX_ENTRIES: Maximum number of keys in the memory store (default 10000).
+- IDEMPOTENCY_PENDING_TIMEOUT: Seconds after which an unfinished attempt is abandoned (default 60).
+"""
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import IntegrityError
+
+from .database import SessionLocal
+from .models import IdempotencyKey
+from logs.logger import logger
+
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT", "60"))
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class StoredResponse(NamedTuple):
+    """A response recorded for an idempotency key."""
+    status_code: int
+    body: Any
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, response: Optional[StoredResponse], expires_at: float):
+        self.fingerprint = fingerprint
+        self.response = response
+        self.expires_at = expires_at
+
+
+def fingerprint_payload(payload: Any) -> str:
+    """Return a stable digest of a JSON-compatible request payload.
+
+    Args:
+        payload (Any): The request payload.
+
+    Returns:
+        str: A hex SHA-256 digest of the canonical JSON encoding.
+    """
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _resolve(key: str, fingerprint: str, stored_fingerprint: str, response: Optional[StoredResponse]) -> StoredResponse:
+    if stored_fingerprint != fingerprint:
+        logger.warning(f"Idempotency key {key} reused with a different payload")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency key was already used with a different request",
+        )
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this idempotency key is still in progress",
+        )
+    return response
+
+
+class MemoryIdempotencyStore:
+    """Bounded in-process idempotency store with LRU eviction and TTL.
+
+    Args:
+        max_entries (int): The maximum number of keys kept.
+        ttl (float): Seconds a completed response is kept.
+        pending_timeout (float): Seconds after which an unfinished attempt is abandoned.
+    """
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES, ttl: float = IDEMPOTENCY_TTL_SECONDS,
+                 pending_timeout: float = IDEMPOTENCY_PENDING_TIMEOUT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Reserve a key for the caller, or return the response already stored for it.
+
+        Args:
+            key (str): The scoped idempotency key.
+            fingerprint (str): The digest of the request payload.
+
+        Raises:
+            HTTPException: 409 if the key is in flight, 422 if the payload differs.
+
+        Returns:
+            Optional[StoredResponse]: The stored response, or None if the caller now owns the key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._entries[key] = _Entry(fingerprint, None, now + self.pending_timeout)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return None
+            self._entries.move_to_end(key)
+            return _resolve(key, fingerprint, entry.fingerprint, entry.response)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.response = response
+                entry.expires_at = time.monotonic() + self.ttl
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLIdempotencyStore:
+    """Idempotency store backed by the shared ``idempotency_keys`` table.
+
+    Reservations rely on the primary key of the table, so two workers racing on the same
+    key cannot both run the handler.
+
+    Args:
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        ttl (float): Seconds a completed response is kept.
+        pending_timeout (float): Seconds after which an unfinished attempt is abandoned.
+    """
+
+    PURGE_EVERY = 100
+
+    def __init__(self, session_factory: Callable = SessionLocal, ttl: float = IDEMPOTENCY_TTL_SECONDS,
+                 pending_timeout: float = IDEMPOTENCY_PENDING_TIMEOUT):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self._completed = 0
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        now = time.time()
+        with self.session_factory() as db:
+            record = db.get(IdempotencyKey, key)
+            if record is not None and record.expires_at <= now:
+                db.delete(record)
+                db.commit()
+                record = None
+            if record is None:
+                db.add(IdempotencyKey(key=key, fingerprint=fingerprint, expires_at=now + self.pending_timeout))
+                try:
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    db.rollback()
+                    record = db.get(IdempotencyKey, key)
+                    if record is None:
+                        return self.reserve(key, fingerprint)
+            response = None
+            if record.status_code is not None:
+                response = StoredResponse(record.status_code, json.loads(record.response_body))
+            return _resolve(key, fingerprint, record.fingerprint, response)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        now = time.time()
+        with self.session_factory() as db:
+            record = db.get(IdempotencyKey, key)
+            if record is not None:
+                record.status_code = response.status_code
+                record.response_body = json.dumps(response.body)
+                record.expires_at = now + self.ttl
+            self._completed += 1
+            if self._completed % self.PURGE_EVERY == 0:
+                db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete()
+            db.commit()
+
+    def release(self, key: str) -> None:
+        with self.session_factory() as db:
+            db.query(IdempotencyKey).filter(
+                (IdempotencyKey.key == key) & (IdempotencyKey.status_code.is_(None))
+            ).delete()
+            db.commit()
+
+
+_store = None
+
+def get_idempotency_store():
+    """Return the idempotency store selected by ``IDEMPOTENCY_BACKEND``.
+
+    Returns:
+        MemoryIdempotencyStore | SQLIdempotencyStore: The process-wide store.
+    """
+    global _store
+    if _store is None:
+        _store = SQLIdempotencyStore() if IDEMPOTENCY_BACKEND == "sql" else MemoryIdempotencyStore()
+    return _store
+
+
+def run_idempotent(idempotency_key: Optional[str], scope: str, payload: Any, handler: Callable[[], Any]) -> Any:
+    """Run a route handler at most once per idempotency key.
+
+    Without a key the handler is simply called. With a key, a stored response is replayed
+    when present; otherwise the handler runs and its JSON response is recorded. If the
+    handler raises, the key is released so the client can retry.
+
+    Args:
+        idempotency_key (Optional[str]): The value of the ``Idempotency-Key`` header.
+        scope (str): Namespace for the key, e.g. the route and the current user.
+        payload (Any): The request payload the key is bound to.
+        handler (Callable[[], Any]): Zero-argument callable producing the response.
+
+    Returns:
+        Any: The handler result, or a JSONResponse replaying or recording it.
+    """
+    if not idempotency_key:
+        return handler()
+
+    store = get_idempotency_store()
+    key = f"{scope}:{idempotency_key}"
+    stored = store.reserve(key, fingerprint_payload(payload))
+    if stored is not None:
+        logger.info(f"Replaying stored response for idempotency key {key}")
+        return JSONResponse(content=stored.body, status_code=stored.status_code, headers={REPLAY_HEADER: "true"})
+
+    try:
+        result = handler()
+    except Exception:
+        store.release(key)
+        raise
+
+    if isinstance(result, Response):
+        stored = StoredResponse(result.status_code, json.loads(result.body))
+    else:
+        stored = StoredResponse(status.HTTP_200_OK, jsonable_encoder(result))
+    store.complete(key, stored)
+    return JSONResponse(content=stored.body, status_code=stored.status_code)
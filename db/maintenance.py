@@ -0,0 +1,322 @@
+"""
+This module keeps the databases healthy without an operator.
+
+A background thread, started with the application, runs maintenance jobs on the primary and
+on every task shard (see db/sharding.py):
+
+- optimize: ``PRAGMA optimize`` on SQLite, which refreshes the statistics the query planner
+  needs after the data has changed. Cheap; runs every ``MAINTENANCE_OPTIMIZE_HOURS``.
+- analyze: A full ``ANALYZE`` on SQLite and PostgreSQL. Runs every ``MAINTENANCE_ANALYZE_HOURS``.
+- vacuum: Gives the space of deleted rows back. On SQLite with incremental auto-vacuum this
+  is ``PRAGMA incremental_vacuum``. Otherwise a full ``VACUUM`` runs, but only once more than
+  ``MAINTENANCE_VACUUM_FREE_RATIO`` of the file is free pages; it also switches the file to
+  incremental auto-vacuum, so later runs no longer rewrite it. Afterwards the WAL file is
+  truncated.
+  PostgreSQL gets a plain ``VACUUM``. Runs every ``MAINTENANCE_VACUUM_HOURS``.
+
+Jobs a backend does not support are skipped. analyze and vacuum are heavy, so they only
+start inside the ``MAINTENANCE_WINDOW``. No job starts while more than
+``MAINTENANCE_MAX_ACTIVE_REQUESTS`` requests are being served (see the admission gauges in
+middleware/admission.py); it is retried at the next check. A job's first run is due one
+period after startup.
+
+When each job last ran, how long it took and what it did is available at
+GET /debug/maintenance, where a job can also be started at once.
+
+Classes:
+- MaintenanceJob: A maintenance task and its schedule.
+- MaintenanceScheduler: Background thread running the jobs when due.
+
+Functions:
+- in_window: Check whether a time lies in a daily window.
+
+Metrics:
+- maintenance.<job>.runs / .failures / .postponed: Job runs, failures and postponements.
+- maintenance.<job>.last_duration_ms: Duration of the last run (gauge).
+
+Configuration (environment variables):
+- MAINTENANCE_ENABLED: Set to "false" to disable the scheduler (default "true").
+- MAINTENANCE_CHECK_SECONDS: Time between two checks for due jobs (default 60).
+- MAINTENANCE_WINDOW: Daily UTC window for the heavy jobs, e.g. "22:00-04:00"; empty allows
+  any time (default "02:00-05:00").
+- MAINTENANCE_MAX_ACTIVE_REQUESTS: Requests in flight above which jobs wait (default 2).
+- MAINTENANCE_OPTIMIZE_HOURS / MAINTENANCE_ANALYZE_HOURS / MAINTENANCE_VACUUM_HOURS: Job
+  periods (default 1, 24 and 24).
+- MAINTENANCE_VACUUM_FREE_RATIO: Share of free pages that triggers a full SQLite VACUUM
+  (default 0.2).
+"""
+
+
+import os
+import threading
+import time
+from datetime import datetime, time as day_time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Connection, Engine
+
+from .database import engine, writer_engine
+from .sharding import shard_router
+from logs.logger import logger
+from logs.metrics import metrics
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+MAINTENANCE_CHECK_SECONDS = float(os.getenv("MAINTENANCE_CHECK_SECONDS", "60"))
+MAINTENANCE_WINDOW = os.getenv("MAINTENANCE_WINDOW", "02:00-05:00")
+MAINTENANCE_MAX_ACTIVE_REQUESTS = int(os.getenv("MAINTENANCE_MAX_ACTIVE_REQUESTS", "2"))
+MAINTENANCE_OPTIMIZE_HOURS = float(os.getenv("MAINTENANCE_OPTIMIZE_HOURS", "1"))
+MAINTENANCE_ANALYZE_HOURS = float(os.getenv("MAINTENANCE_ANALYZE_HOURS", "24"))
+MAINTENANCE_VACUUM_HOURS = float(os.getenv("MAINTENANCE_VACUUM_HOURS", "24"))
+MAINTENANCE_VACUUM_FREE_RATIO = float(os.getenv("MAINTENANCE_VACUUM_FREE_RATIO", "0.2"))
+
+ADMISSION_CLASSES = ("auth", "read", "write")
+
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """Check whether a time lies in a daily window.
+
+    Args:
+        window (str): "HH:MM-HH:MM" in UTC; the window may wrap around midnight. Empty means
+            always.
+        now (Optional[datetime]): The UTC time to check. Defaults to now.
+
+    Raises:
+        ValueError: If the window is malformed.
+
+    Returns:
+        bool: Whether the time lies in the window.
+    """
+    if not window.strip():
+        return True
+    start, separator, end = window.partition("-")
+    if not separator:
+        raise ValueError(f"Invalid maintenance window {window!r}, expected HH:MM-HH:MM")
+    start, end = day_time.fromisoformat(start.strip()), day_time.fromisoformat(end.strip())
+    current = (now or datetime.utcnow()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def _active_requests() -> int:
+    return sum(metrics.get(f"admission.{name}.active") for name in ADMISSION_CLASSES)
+
+
+def _rows(connection: Connection, sql: str) -> List[Tuple]:
+    result = connection.exec_driver_sql(sql)
+    return result.fetchall() if result.returns_rows else []
+
+
+def _pragma(connection: Connection, name: str) -> int:
+    return _rows(connection, f"PRAGMA {name}")[0][0]
+
+
+def _optimize(connection: Connection) -> Optional[Dict[str, Any]]:
+    if connection.dialect.name != "sqlite":
+        return None
+    _rows(connection, "PRAGMA optimize")
+    return {}
+
+
+def _analyze(connection: Connection) -> Optional[Dict[str, Any]]:
+    if connection.dialect.name not in ("sqlite", "postgresql"):
+        return None
+    _rows(connection, "ANALYZE")
+    return {}
+
+
+def _vacuum(connection: Connection, free_ratio: float = MAINTENANCE_VACUUM_FREE_RATIO) -> Optional[Dict[str, Any]]:
+    if connection.dialect.name == "postgresql":
+        _rows(connection, "VACUUM")
+        return {}
+    if connection.dialect.name != "sqlite":
+        return None
+    page_size = _pragma(connection, "page_size")
+    pages, free = _pragma(connection, "page_count"), _pragma(connection, "freelist_count")
+    if _pragma(connection, "auto_vacuum") == 2:
+        mode = "incremental"
+        # Drivers that step the statement only once free a single page per execution.
+        for _ in range(free):
+            _rows(connection, "PRAGMA incremental_vacuum")
+    elif pages and free / pages >= free_ratio:
+        mode = "full"
+        _rows(connection, "PRAGMA auto_vacuum = INCREMENTAL")
+        _rows(connection, "VACUUM")
+    else:
+        return {"mode": "none", "free_pages": free}
+    _rows(connection, "PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"mode": mode, "freed_bytes": (pages - _pragma(connection, "page_count")) * page_size}
+
+
+class MaintenanceJob:
+    """A maintenance task and its schedule.
+
+    Args:
+        name (str): The job name.
+        run (Callable[[Connection], Optional[Dict[str, Any]]]): Runs the task on an
+            autocommit connection; returns details, or None if the backend is not supported.
+        period (float): Seconds between two runs.
+        heavy (bool): Whether the job only starts inside the maintenance window.
+    """
+
+    def __init__(self, name: str, run: Callable[[Connection], Optional[Dict[str, Any]]], period: float,
+                 heavy: bool = False):
+        self.name = name
+        self.run = run
+        self.period = period
+        self.heavy = heavy
+        self.last_started = time.monotonic()
+        self.last_run: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_status: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_details: Dict[str, Any] = {}
+        metrics.register_gauge(f"maintenance.{name}.last_duration_ms", lambda: self.last_duration_ms or 0)
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self.last_started >= self.period
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "period_hours": self.period / 3600,
+            "heavy": self.heavy,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "last_details": self.last_details,
+            "next_due_in_seconds": max(0.0, self.period - (time.monotonic() - self.last_started)),
+        }
+
+
+def default_jobs() -> List[MaintenanceJob]:
+    """Return the optimize, analyze and vacuum jobs with the configured periods."""
+    return [
+        MaintenanceJob("optimize", _optimize, MAINTENANCE_OPTIMIZE_HOURS * 3600),
+        MaintenanceJob("analyze", _analyze, MAINTENANCE_ANALYZE_HOURS * 3600, heavy=True),
+        MaintenanceJob("vacuum", _vacuum, MAINTENANCE_VACUUM_HOURS * 3600, heavy=True),
+    ]
+
+
+def _default_targets() -> List[Tuple[str, Engine]]:
+    targets = [("primary", writer_engine or engine)]
+    for name, (read_engine, shard_writer) in shard_router.engines.items():
+        targets.append((name, shard_writer or read_engine))
+    return targets
+
+
+class MaintenanceScheduler:
+    """Background thread running the maintenance jobs when due.
+
+    Args:
+        jobs (Optional[List[MaintenanceJob]]): The jobs. Defaults to optimize, analyze and vacuum.
+        targets (Callable[[], List[Tuple[str, Engine]]]): Returns the databases to maintain,
+            by name. Defaults to the primary and every task shard.
+        enabled (bool): Whether ``start`` launches the thread.
+        check_interval (float): Seconds between two checks for due jobs.
+        window (str): Daily UTC window for the heavy jobs.
+        max_active (int): Requests in flight above which jobs wait.
+        traffic (Callable[[], int]): Returns the number of requests in flight.
+    """
+
+    def __init__(self, jobs: Optional[List[MaintenanceJob]] = None,
+                 targets: Callable[[], List[Tuple[str, Engine]]] = _default_targets,
+                 enabled: bool = MAINTENANCE_ENABLED, check_interval: float = MAINTENANCE_CHECK_SECONDS,
+                 window: str = MAINTENANCE_WINDOW, max_active: int = MAINTENANCE_MAX_ACTIVE_REQUESTS,
+                 traffic: Callable[[], int] = _active_requests):
+        in_window(window)
+        self.jobs = {job.name: job for job in (jobs if jobs is not None else default_jobs())}
+        self.targets = targets
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.window = window
+        self.max_active = max_active
+        self.traffic = traffic
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_due(self) -> List[str]:
+        """Run the jobs that are due and allowed to start now.
+
+        Returns:
+            List[str]: The names of the jobs that ran.
+        """
+        ran = []
+        for job in self.jobs.values():
+            if not job.is_due():
+                continue
+            if (job.heavy and not in_window(self.window)) or self.traffic() > self.max_active:
+                metrics.incr(f"maintenance.{job.name}.postponed")
+                continue
+            self.run_job(job.name)
+            ran.append(job.name)
+        return ran
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """Run a job on every database now, regardless of its schedule.
+
+        Args:
+            name (str): The job name.
+
+        Raises:
+            KeyError: If there is no such job.
+
+        Returns:
+            Dict[str, Any]: The job's status after the run.
+        """
+        job = self.jobs[name]
+        with self._lock:
+            job.last_started = time.monotonic()
+            job.last_run = datetime.utcnow()
+            details: Dict[str, Any] = {}
+            error = None
+            for target, target_engine in self.targets():
+                try:
+                    with target_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                        result = job.run(connection)
+                    details[target] = "skipped: not supported" if result is None else result
+                except Exception as e:
+                    error = f"{target}: {e}"
+                    details[target] = f"failed: {e}"
+                    logger.error(f"Maintenance job {name} failed on {target}: {e}")
+            job.last_duration_ms = round((time.monotonic() - job.last_started) * 1000, 3)
+            job.last_status = "failed" if error else "ok"
+            job.last_error = error
+            job.last_details = details
+        metrics.incr(f"maintenance.{name}.failures" if error else f"maintenance.{name}.runs")
+        logger.info(f"Maintenance job {name} finished in {job.last_duration_ms} ms: {details}")
+        return job.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Return the schedule and the last run of every job."""
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "in_window": in_window(self.window),
+            "active_requests": self.traffic(),
+            "jobs": {name: job.status() for name, job in self.jobs.items()},
+        }
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.run_due()
+            except Exception as e:
+                logger.error(f"Database maintenance check failed: {e}")
+
+
+maintenance_scheduler = MaintenanceScheduler()
@@ -8,17 +8,43 @@ such as name, description, completion status, and the owner of the task.
 Models:
 - User: Represents a user with attributes for ID, username, email, hashed password, and associated tasks.
 - Task: Represents a task with attributes for ID, name, description, status, and the owner user ID.
+- TaskTombstone: Records a deleted task so delta-sync clients learn about the deletion.
+- TaskArchive: Holds finished and deleted tasks moved out of the hot ``tasks`` table.
+- IdempotencyKey: Stores the outcome of a request made with an ``Idempotency-Key`` header.
+- RateLimitBucket: Stores a token bucket shared by all workers for rate limiting.
+- RevokedToken: Records an access token revoked before its expiry.
+- ShardAssignment: Pins an owner's tasks to a shard, overriding the consistent-hash ring.
+- IdBlock: Counter from which blocks of globally unique IDs are reserved.
+- AuditEvent: Append-only record of a user or task mutation (see db/audit.py).
 
 Relationships:
 - A user can have multiple tasks, represented by a one-to-many relationship between User and Task.
 
+Change tracking:
+- Every task change takes the next value of the owner's ``change_seq`` counter. Tasks and
+  tombstones store that value in ``seq``, indexed by ``(owner_id, seq)``, so clients can
+  fetch only what changed since their last cursor.
+
+Task lifecycle:
+- Deleting a task only sets ``deleted_at`` (soft delete). Reads only ever look at active
+  rows (``deleted_at IS NULL``), served by the partial index ``ix_tasks_owner_active``.
+- The archiver (see db/archival.py) moves finished and deleted tasks older than the
+  retention window to ``tasks_archive``, so ``tasks`` only grows with recent activity.
+
+Sharding (see db/sharding.py):
+- When task sharding is enabled, each shard database holds the task tables of its owners
+  and a shadow ``users`` row per owner carrying only ``change_seq``. ``ShardAssignment``
+  and ``IdBlock`` live on the primary.
+
 Usage:
 These models should be used to interact with the database, allowing for the creation, 
 retrieval, update, and deletion of users and tasks.
 """
 
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base, engine
 
@@ -30,6 +56,7 @@ class User(Base):
         username (str): The user's unique username.
         email (str): The user's unique email address.
         hashed_password (str): The hashed password for the user.
+        change_seq (int): The last change sequence number assigned to the user's tasks.
         tasks (list): The list of tasks associated with the user.
     """
     __tablename__ = "users"
@@ -38,6 +65,7 @@ class User(Base):
     username = Column(String(length=30), unique=True, index=True)
     email = Column(String(length=20), unique=True)
     hashed_password = Column(String)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
 
     tasks = relationship("Task", back_populates="owner")
 
@@ -51,6 +79,9 @@ class Task(Base):
         description (str): A detailed description of the task.
         status (bool): The completion status of the task.
         owner_id (int): The identifier of the user who owns the task.
+        updated_at (datetime): When the task was last created or modified.
+        seq (int): The owner's change sequence number of the last modification.
+        deleted_at (datetime): When the task was soft-deleted, or None while it is active.
         owner (User): The user associated with the task.
     """
     __tablename__ = "tasks"
@@ -60,7 +91,179 @@ class Task(Base):
     description = Column(String, index=True)
     status = Column(Boolean, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    seq = Column(Integer, nullable=False, default=0, server_default="0")
+    deleted_at = Column(DateTime, nullable=True, index=True)
 
     owner = relationship("User", back_populates="tasks")
 
+    # AUTOINCREMENT keeps SQLite from handing the ID of an archived task to a new one, which
+    # would clash with the archive row, its tombstone and sync cursors.
+    __table_args__ = (
+        Index("ix_tasks_owner_seq", "owner_id", "seq"),
+        Index("ix_tasks_owner_active", "owner_id", sqlite_where=deleted_at.is_(None),
+              postgresql_where=deleted_at.is_(None)),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TaskTombstone(Base):
+    """Record of a deleted task, kept so delta-sync clients learn about the deletion.
+
+    Attributes:
+        id (int): The unique identifier for the tombstone.
+        task_id (int): The identifier of the deleted task.
+        owner_id (int): The identifier of the user who owned the task.
+        seq (int): The owner's change sequence number of the deletion.
+        deleted_at (datetime): When the task was deleted.
+    """
+    __tablename__ = "task_tombstones"
+    __table_args__ = (Index("ix_task_tombstones_owner_seq", "owner_id", "seq"),)
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer)
+    owner_id = Column(Integer)
+    seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TaskArchive(Base):
+    """Finished or deleted task moved out of the ``tasks`` table by the archiver.
+
+    Attributes:
+        id (int): The identifier the task had in ``tasks``.
+        name (str): The name of the task.
+        description (str): A detailed description of the task.
+        status (bool): The completion status of the task.
+        owner_id (int): The identifier of the user who owned the task.
+        updated_at (datetime): When the task was last modified.
+        seq (int): The owner's change sequence number of the last modification.
+        deleted_at (datetime): When the task was soft-deleted, or None if it was finished.
+        archived_at (datetime): When the task was archived.
+    """
+    __tablename__ = "tasks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String)
+    description = Column(String)
+    status = Column(Boolean)
+    owner_id = Column(Integer, index=True)
+    updated_at = Column(DateTime)
+    seq = Column(Integer)
+    deleted_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored outcome of a request made with an ``Idempotency-Key`` header.
+
+    A row is inserted when the request starts (with an empty status code) and filled in
+    once the response is known, so concurrent workers see keys that are still in flight.
+
+    Attributes:
+        key (str): The scoped idempotency key.
+        fingerprint (str): A digest of the request payload the key was first used with.
+        status_code (int): The stored response status code, or None while in flight.
+        response_body (str): The stored JSON response body.
+        expires_at (float): Unix timestamp after which the record is discarded.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    expires_at = Column(Float, index=True)
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by all workers when rate limits use the SQL backend.
+
+    Attributes:
+        key (str): The bucket key, e.g. the client IP or username with its scope.
+        tokens (float): The number of tokens left at ``updated_at``.
+        updated_at (float): Unix timestamp of the last update.
+        full_at (float): Unix timestamp at which the bucket is full again under its own rule,
+            after which the row carries no information; None if it never refills.
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float)
+    updated_at = Column(Float, index=True)
+    full_at = Column(Float, nullable=True, index=True)
+
+
+class RevokedToken(Base):
+    """Access token revoked before its expiry, identified by its ``jti`` claim.
+
+    Workers mirror this table in memory and load new rows incrementally by ``id``.
+
+    Attributes:
+        id (int): Increasing identifier, used as the refresh cursor.
+        jti (str): The token's unique identifier.
+        expires_at (float): Unix timestamp of the token's expiry; the row can go afterwards.
+    """
+    __tablename__ = "revoked_tokens"
+    # AUTOINCREMENT keeps IDs increasing after expired rows are deleted, so cursors stay valid.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, index=True)
+    expires_at = Column(Float, index=True)
+
+
+class ShardAssignment(Base):
+    """Shard holding an owner's tasks, when it differs from the consistent-hash ring.
+
+    Attributes:
+        owner_id (int): The identifier of the task owner.
+        shard (str): The name of the shard holding the owner's tasks.
+        assigned_at (datetime): When the owner was moved to the shard.
+    """
+    __tablename__ = "shard_assignments"
+
+    owner_id = Column(Integer, primary_key=True, autoincrement=False)
+    shard = Column(String, nullable=False)
+    assigned_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdBlock(Base):
+    """Counter from which workers reserve blocks of globally unique IDs.
+
+    Attributes:
+        name (str): The ID sequence, e.g. "tasks".
+        next_id (int): The first ID not reserved yet.
+    """
+    __tablename__ = "id_blocks"
+
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+
+class AuditEvent(Base):
+    """Append-only record of a user or task mutation.
+
+    Attributes:
+        id (int): The unique identifier of the event.
+        occurred_at (datetime): When the mutation happened.
+        action (str): What happened, e.g. "task.updated".
+        entity (str): The kind of record changed, "task" or "user".
+        entity_id (int): The identifier of the changed record.
+        owner_id (int): The user the changed record belongs to.
+        actor_id (int): The authenticated user who made the change, when known.
+        details (str): JSON object with the changed fields.
+    """
+    __tablename__ = "audit_events"
+    __table_args__ = (Index("ix_audit_events_entity", "entity", "entity_id"),)
+
+    id = Column(Integer, primary_key=True)
+    occurred_at = Column(DateTime, index=True)
+    action = Column(String, index=True)
+    entity = Column(String)
+    entity_id = Column(Integer)
+    owner_id = Column(Integer, index=True)
+    actor_id = Column(Integer, nullable=True)
+    details = Column(Text)
+
 Base.metadata.create_all(bind=engine)
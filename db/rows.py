@@ -0,0 +1,233 @@
+"""
+This module provides an ORM-free read path for list endpoints.
+
+Loading full ``Task``/``User`` instances costs an identity-map entry, instance state and
+attribute instrumentation per row, although listings only read a few columns. The functions
+here run Core ``select()`` statements over the needed table columns and return compact
+named-tuple rows instead. The rows are plain tuples without a per-instance ``__dict__``,
+expose the same attribute names as the models, and can be passed straight to the templates
+and the JSON encoder. Being immutable, they are also shared safely between coalesced callers.
+
+Clients can ask for a sparse fieldset (``?fields=id,status``). The requested names are
+validated against the response schemas in db/schemas.py, and only those columns are
+selected, so unneeded columns such as long descriptions are never read from the database.
+The statement and row type of each distinct fieldset are built once and reused.
+
+Task rows are read from the owner's shard (see db/sharding.py).
+
+Rows are read-only snapshots: use the functions in db/crud.py for anything that is modified
+afterwards.
+
+Classes:
+- TaskRow: Columns of a task shown in listings.
+- UserRow: Columns of a user shown in listings.
+
+Functions:
+- parse_fields: Validate a ``fields`` query parameter against a response schema.
+- list_task_rows: Retrieve the tasks of a user as TaskRow tuples.
+- list_user_rows: Retrieve all users as UserRow tuples.
+- list_task_projection: Retrieve the requested columns of a user's tasks.
+- get_task_projection: Retrieve the requested columns of one task.
+- list_user_projection: Retrieve the requested columns of all users.
+- get_user_projection: Retrieve the requested columns of one user.
+- list_all_task_rows: Retrieve the tasks with the highest IDs across all users and shards.
+"""
+
+
+import functools
+import heapq
+import itertools
+from collections import namedtuple
+from typing import List, NamedTuple, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from .models import Task, User
+from .sharding import shard_router, sharded
+from .schemas import TaskResponse, UserResponse
+from .singleflight import coalesced
+
+tasks_table = Task.__table__
+users_table = User.__table__
+
+
+class TaskRow(NamedTuple):
+    """Columns of a task shown in listings."""
+    id: int
+    name: Optional[str]
+    description: Optional[str]
+    status: Optional[bool]
+    owner_id: int
+
+
+class UserRow(NamedTuple):
+    """Columns of a user shown in listings; never includes the password hash."""
+    id: int
+    username: str
+    email: str
+
+
+TASK_ROWS_BY_OWNER = (
+    select(*(tasks_table.c[name] for name in TaskRow._fields))
+    .where((tasks_table.c.owner_id == bindparam("owner_id")) & tasks_table.c.deleted_at.is_(None))
+)
+USER_ROWS = select(*(users_table.c[name] for name in UserRow._fields))
+RECENT_TASK_ROWS = (
+    select(*(tasks_table.c[name] for name in TaskRow._fields))
+    .where(tasks_table.c.deleted_at.is_(None))
+    .order_by(tasks_table.c.id.desc())
+    .limit(bindparam("limit"))
+)
+
+
+@sharded
+@coalesced
+def list_task_rows(db: Session, user_id: int) -> List[TaskRow]:
+    """Retrieve the tasks of a user as TaskRow tuples.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        List[TaskRow]: The user's tasks.
+    """
+    return [TaskRow._make(row) for row in db.execute(TASK_ROWS_BY_OWNER, {"owner_id": user_id})]
+
+
+@coalesced
+def list_user_rows(db: Session) -> List[UserRow]:
+    """Retrieve all users as UserRow tuples.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        List[UserRow]: All users.
+    """
+    return [UserRow._make(row) for row in db.execute(USER_ROWS)]
+
+
+def parse_fields(value: Optional[str], schema: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Validate a ``fields`` query parameter against a response schema.
+
+    Args:
+        value (Optional[str]): Comma-separated field names, or None for all fields.
+        schema (Type[BaseModel]): The response schema listing the selectable fields.
+
+    Raises:
+        HTTPException: If a field is not part of the schema.
+
+    Returns:
+        Optional[Tuple[str, ...]]: The requested fields in schema order, or None.
+    """
+    if value is None:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    allowed = tuple(schema.model_fields)
+    unknown = requested.difference(allowed)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown)) or '(none given)'}. Allowed: {', '.join(allowed)}",
+        )
+    return tuple(name for name in allowed if name in requested)
+
+
+@functools.lru_cache(maxsize=None)
+def _projection(table_name: str, fields: Tuple[str, ...], by_id: bool):
+    table = tasks_table if table_name == "tasks" else users_table
+    statement = select(*(table.c[name] for name in fields))
+    if table is tasks_table:
+        statement = statement.where((table.c.owner_id == bindparam("owner_id")) & table.c.deleted_at.is_(None))
+    if by_id:
+        statement = statement.where(table.c.id == bindparam("id")).limit(1)
+    return namedtuple(f"{table_name.title()}Projection", fields), statement
+
+
+@sharded
+@coalesced
+def list_task_projection(db: Session, user_id: int, fields: Tuple[str, ...]) -> List[tuple]:
+    """Retrieve the requested columns of a user's tasks.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        fields (Tuple[str, ...]): The fields returned by ``parse_fields``.
+
+    Returns:
+        List[tuple]: One named tuple with the requested fields per task.
+    """
+    row_type, statement = _projection("tasks", fields, False)
+    return [row_type._make(row) for row in db.execute(statement, {"owner_id": user_id})]
+
+
+@sharded
+@coalesced
+def get_task_projection(db: Session, user_id: int, task_id: int, fields: Tuple[str, ...]) -> Optional[tuple]:
+    """Retrieve the requested columns of one of a user's tasks.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the task owner.
+        task_id (int): The ID of the task.
+        fields (Tuple[str, ...]): The fields returned by ``parse_fields``.
+
+    Returns:
+        Optional[tuple]: A named tuple with the requested fields, or None if the task does not exist.
+    """
+    row_type, statement = _projection("tasks", fields, True)
+    row = db.execute(statement, {"owner_id": user_id, "id": task_id}).first()
+    return row_type._make(row) if row is not None else None
+
+
+@coalesced
+def list_user_projection(db: Session, fields: Tuple[str, ...]) -> List[tuple]:
+    """Retrieve the requested columns of all users.
+
+    Args:
+        db (Session): The database session.
+        fields (Tuple[str, ...]): The fields returned by ``parse_fields``.
+
+    Returns:
+        List[tuple]: One named tuple with the requested fields per user.
+    """
+    row_type, statement = _projection("users", fields, False)
+    return [row_type._make(row) for row in db.execute(statement)]
+
+
+@coalesced
+def get_user_projection(db: Session, user_id: int, fields: Tuple[str, ...]) -> Optional[tuple]:
+    """Retrieve the requested columns of one user.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        fields (Tuple[str, ...]): The fields returned by ``parse_fields``.
+
+    Returns:
+        Optional[tuple]: A named tuple with the requested fields, or None if the user does not exist.
+    """
+    row_type, statement = _projection("users", fields, True)
+    row = db.execute(statement, {"id": user_id}).first()
+    return row_type._make(row) if row is not None else None
+
+
+def list_all_task_rows(limit: int = 100) -> List[TaskRow]:
+    """Retrieve the tasks with the highest IDs across all users and shards.
+
+    Every shard returns its own top rows concurrently, and the results are merged.
+
+    Args:
+        limit (int): The maximum number of tasks to return.
+
+    Returns:
+        List[TaskRow]: The tasks, highest ID first.
+    """
+    results = shard_router.scatter(
+        lambda db: [TaskRow._make(row) for row in db.execute(RECENT_TASK_ROWS, {"limit": limit})]
+    )
+    return heapq.nlargest(limit, itertools.chain.from_iterable(results.values()), key=lambda row: row.id)
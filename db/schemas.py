@@ -9,6 +9,10 @@ Models:
   and status.
 - UserResponse: A model for representing a user's information in responses, providing the 
   user's ID, username, and email.
+- TaskResponse: A model for representing a task in responses. Its fields are also the ones
+  clients may select with the ``fields`` query parameter.
+- BatchOperation: A model for one API request executed as part of a batch.
+- BatchRequest: A model for the body of POST /batch.
 
 Usage:
 These models are used for validating and serializing data in API requests and responses, 
@@ -17,7 +21,8 @@ ensuring that input data meets the required specifications and formats.
 
 
 from pydantic import BaseModel, EmailStr, constr
-from typing import Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 class StatusEnum(str, Enum):
@@ -73,3 +78,50 @@ class UserResponse(BaseModel):
     class Config:
         orm_mode = True
         from_attributes = True
+
+class TaskResponse(BaseModel):
+    """Model for representing a task response.
+
+    Attributes:
+        id (int): The unique identifier of the task.
+        name (Optional[str]): The name of the task.
+        description (Optional[str]): A detailed description of the task.
+        status (Optional[bool]): The completion status of the task.
+        owner_id (int): The identifier of the user who owns the task.
+        updated_at (Optional[datetime]): When the task was last created or modified.
+        seq (int): The owner's change sequence number of the last modification.
+    """
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[bool] = None
+    owner_id: int
+    updated_at: Optional[datetime] = None
+    seq: int = 0
+
+    class Config:
+        from_attributes = True
+
+class BatchOperation(BaseModel):
+    """Model for one API request executed as part of a batch.
+
+    Attributes:
+        method (str): The HTTP method, e.g. "GET" or "POST".
+        path (str): The request path, optionally with a query string.
+        body (Optional[Any]): The JSON body, if any.
+        headers (Optional[Dict[str, str]]): Additional request headers.
+    """
+    method: str
+    path: str
+    body: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+class BatchRequest(BaseModel):
+    """Model for the body of POST /batch.
+
+    Attributes:
+        requests (List[BatchOperation]): The requests to execute, in order.
+        transaction (bool): Whether to apply all requests atomically.
+    """
+    requests: List[BatchOperation]
+    transaction: bool = False
@@ -0,0 +1,359 @@
+"""
+This module spreads task storage across several databases by owner.
+
+Each shard is a separate database holding the task tables (``tasks``, ``task_tombstones``
+and ``tasks_archive``) of the owners mapped to it. The owner's delta-sync counter lives on
+the shard too, in a shadow ``users`` row carrying only ``id`` and ``change_seq``, so a task
+change only ever touches one database. Users, the shard directory and the task ID counter
+stay on the primary.
+
+Owners are mapped to shards through a consistent-hash ring with ``TASK_SHARD_VNODES``
+virtual nodes per shard, so changing the ring only remaps a proportional share of owners.
+Owners moved by the rebalancing tool (scripts/rebalance_shards.py) are recorded in the
+``shard_assignments`` directory on the primary, which overrides the ring; every worker
+reloads it at most once every ``TASK_SHARD_DIRECTORY_TTL`` seconds. While an owner is being
+moved, its shadow counter row on the old shard is frozen: writes routed there fail with 503
+and ``Retry-After`` instead of being lost.
+
+Task IDs stay unique across shards, so tasks keep their ID when they move. When sharding is
+on they are handed out in blocks of ``TASK_ID_BLOCK_SIZE`` from a counter on the primary.
+
+Task functions in db/crud.py and db/rows.py take the request session and are routed with
+``@sharded`` (or ``task_session``) to a session on the owner's shard. Shard sessions are
+opened lazily, at most one per shard and request session, and closed with it. With
+``TASK_SHARD_URLS`` unset, sharding is off and the request session is used unchanged.
+
+Classes:
+- HashRing: Consistent-hash ring mapping keys to node names.
+- ShardRouter: Maps owners to shard engines and opens sessions on them.
+- OwnerMovingError: Raised when writing to the shard an owner is being moved away from.
+
+Functions:
+- parse_shard_urls: Parse the ``TASK_SHARD_URLS`` setting.
+- task_session: Return the session holding an owner's tasks.
+- sharded: Decorator routing a task function to the owner's shard.
+
+Metrics:
+- sharding.directory_refreshes: Reloads of the shard directory.
+- sharding.id_blocks: Task ID blocks reserved by this worker.
+
+Configuration (environment variables):
+- TASK_SHARD_URLS: Comma-separated ``name=url`` pairs, e.g.
+  ``a=sqlite:///./shard_a.db,b=sqlite:///./shard_b.db`` (default empty: sharding off).
+- TASK_SHARD_RING: Comma-separated shard names on the ring (default: all shards). Shards
+  outside the ring only receive owners assigned through the directory.
+- TASK_SHARD_VNODES: Virtual nodes per shard on the ring (default 64).
+- TASK_SHARD_DIRECTORY_TTL: Seconds a worker caches the shard directory (default 1).
+- TASK_ID_BLOCK_SIZE: Task IDs reserved per round trip to the primary (default 1000).
+"""
+
+
+import bisect
+import functools
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, create_engine, event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import Base, RoutingSession, SQLITE_TUNING, SessionLocal, create_sqlite_engines, is_file_sqlite
+from .models import IdBlock, ShardAssignment, Task, TaskArchive
+from logs.metrics import metrics
+
+TASK_SHARD_URLS = os.getenv("TASK_SHARD_URLS", "")
+TASK_SHARD_RING = [name.strip() for name in os.getenv("TASK_SHARD_RING", "").split(",") if name.strip()]
+TASK_SHARD_VNODES = int(os.getenv("TASK_SHARD_VNODES", "64"))
+TASK_SHARD_DIRECTORY_TTL = float(os.getenv("TASK_SHARD_DIRECTORY_TTL", "1"))
+TASK_ID_BLOCK_SIZE = int(os.getenv("TASK_ID_BLOCK_SIZE", "1000"))
+
+RESERVE_IDS = (
+    update(IdBlock)
+    .where(IdBlock.name == bindparam("block_name"))
+    .values(next_id=IdBlock.next_id + bindparam("size"))
+    .returning(IdBlock.next_id)
+    .execution_options(synchronize_session=False)
+)
+
+
+class OwnerMovingError(HTTPException):
+    """Raised when writing to the shard an owner is being moved away from."""
+
+    def __init__(self, owner_id: int):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail=f"The tasks of user {owner_id} are being moved, retry shortly",
+                         headers={"Retry-After": "1"})
+
+
+def parse_shard_urls(value: str) -> Dict[str, str]:
+    """Parse the ``TASK_SHARD_URLS`` setting.
+
+    Args:
+        value (str): Comma-separated ``name=url`` pairs.
+
+    Raises:
+        ValueError: If a pair has no name.
+
+    Returns:
+        Dict[str, str]: The shard URLs keyed by shard name.
+    """
+    shards = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        name, separator, url = pair.partition("=")
+        if not separator or not name.strip():
+            raise ValueError(f"Invalid TASK_SHARD_URLS entry {pair!r}, expected name=url")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to node names.
+
+    Args:
+        nodes (List[str]): The node names.
+        vnodes (int): Virtual nodes per node; more even out the distribution.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = TASK_SHARD_VNODES):
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(vnodes))
+        self.nodes = list(nodes)
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def lookup(self, key: Any) -> str:
+        """Return the node owning a key: the first virtual node clockwise of its hash."""
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[index]
+
+
+class ShardRouter:
+    """Maps owners to shard engines and opens sessions on them.
+
+    Args:
+        urls (Dict[str, str]): The shard URLs keyed by shard name; empty disables sharding.
+        ring (Optional[List[str]]): The shard names on the ring. Defaults to all shards.
+        vnodes (int): Virtual nodes per shard on the ring.
+        directory_ttl (float): Seconds the shard directory is cached.
+        id_block_size (int): Task IDs reserved per round trip to the primary.
+        session_factory (Callable): Factory returning a session on the primary.
+    """
+
+    def __init__(self, urls: Dict[str, str], ring: Optional[List[str]] = None, vnodes: int = TASK_SHARD_VNODES,
+                 directory_ttl: float = TASK_SHARD_DIRECTORY_TTL, id_block_size: int = TASK_ID_BLOCK_SIZE,
+                 session_factory: Callable = SessionLocal):
+        self.engines: Dict[str, Tuple[Engine, Optional[Engine]]] = {}
+        for name, url in urls.items():
+            if SQLITE_TUNING and is_file_sqlite(url):
+                read_engine, writer_engine = create_sqlite_engines(url)
+            else:
+                read_engine, writer_engine = create_engine(url, pool_pre_ping=True), None
+            Base.metadata.create_all(bind=writer_engine or read_engine)
+            self.engines[name] = (read_engine, writer_engine)
+        ring = ring or list(urls)
+        unknown = set(ring).difference(urls)
+        if unknown:
+            raise ValueError(f"Unknown shards on the ring: {', '.join(sorted(unknown))}")
+        self.ring = HashRing(ring, vnodes) if urls else None
+        self.vnodes = vnodes
+        self.directory_ttl = directory_ttl
+        self.id_block_size = id_block_size
+        self.session_factory = session_factory
+        self._shard_engines = {id(engine) for pair in self.engines.values() for engine in pair if engine is not None}
+        self._directory: Dict[int, str] = {}
+        self._directory_expires = 0.0
+        self._directory_lock = threading.Lock()
+        self._next_id = 0
+        self._id_end = 0
+        self._id_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.engines)
+
+    def shard_for(self, owner_id: int) -> str:
+        """Return the name of the shard holding an owner's tasks.
+
+        Args:
+            owner_id (int): The ID of the task owner.
+
+        Returns:
+            str: The shard from the directory, or else from the hash ring.
+        """
+        if time.monotonic() >= self._directory_expires:
+            self.refresh_directory()
+        shard = self._directory.get(owner_id)
+        return shard if shard in self.engines else self.ring.lookup(owner_id)
+
+    def refresh_directory(self) -> None:
+        """Reload the owners pinned to a shard from the primary."""
+        with self._directory_lock:
+            with self.session_factory() as db:
+                rows = db.execute(select(ShardAssignment.owner_id, ShardAssignment.shard)).all()
+            self._directory = {owner_id: shard for owner_id, shard in rows}
+            self._directory_expires = time.monotonic() + self.directory_ttl
+        metrics.incr("sharding.directory_refreshes")
+
+    def pinned_owners(self) -> int:
+        """Return the number of owners assigned to a shard through the directory."""
+        self.refresh_directory()
+        return len(self._directory)
+
+    def session(self, name: str, read_only: bool = False) -> Session:
+        """Open a new session on a shard.
+
+        Args:
+            name (str): The shard name.
+            read_only (bool): Whether the session must refuse to flush.
+
+        Returns:
+            Session: A session whose writes go to the shard's writer engine.
+        """
+        read_engine, writer_engine = self.engines[name]
+        info: Dict[str, Any] = {"shard": name}
+        if writer_engine is not None:
+            info["writer"] = writer_engine
+        if read_only:
+            info["read_only"] = True
+        return RoutingSession(bind=read_engine, autoflush=False, info=info)
+
+    def session_for(self, db: Session, owner_id: int) -> Session:
+        """Return the shard session of a request session for an owner, opening it if needed.
+
+        Args:
+            db (Session): The request session.
+            owner_id (int): The ID of the task owner.
+
+        Returns:
+            Session: A session on the owner's shard, closed together with ``db``.
+        """
+        name = self.shard_for(owner_id)
+        sessions = db.info.setdefault("shard_sessions", {})
+        shard_db = sessions.get(name)
+        if shard_db is None:
+            shard_db = sessions[name] = self.session(name, read_only=bool(db.info.get("read_only")))
+        return shard_db
+
+    def scatter(self, func: Callable[[Session], Any]) -> Dict[str, Any]:
+        """Run a function on every shard concurrently and gather the results.
+
+        Without sharding, the function runs once on the primary under the name "primary".
+
+        Args:
+            func (Callable[[Session], Any]): Receives a read-only session on one shard.
+
+        Returns:
+            Dict[str, Any]: The results keyed by shard name.
+        """
+        if not self.enabled:
+            with self.session_factory() as db:
+                return {"primary": func(db)}
+
+        def run(name):
+            with self.session(name, read_only=True) as shard_db:
+                return func(shard_db)
+
+        with ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard-scatter") as pool:
+            return dict(zip(self.names, pool.map(run, self.names)))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of active tasks, owners and archived tasks of every shard."""
+        return self.scatter(_shard_stats)
+
+    def is_shard_engine(self, engine: Engine) -> bool:
+        return id(engine) in self._shard_engines
+
+    def next_task_id(self) -> int:
+        """Return a task ID that is unique across all shards."""
+        with self._id_lock:
+            if self._next_id >= self._id_end:
+                self._id_end = self._reserve_ids()
+                self._next_id = self._id_end - self.id_block_size
+            self._next_id += 1
+            return self._next_id - 1
+
+    def _reserve_ids(self) -> int:
+        with self.session_factory() as db:
+            end = db.execute(RESERVE_IDS, {"block_name": "tasks", "size": self.id_block_size}).scalar_one_or_none()
+            if end is None:
+                # First block ever: start above every task ID already stored anywhere.
+                start = max([0, *self.scatter(_max_task_id).values()]) + 1
+                end = start + self.id_block_size
+                db.add(IdBlock(name="tasks", next_id=end))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return self._reserve_ids()
+        metrics.incr("sharding.id_blocks")
+        return end
+
+
+def _shard_stats(db: Session) -> Dict[str, int]:
+    return {
+        "tasks": db.execute(select(func.count()).select_from(Task).where(Task.deleted_at.is_(None))).scalar(),
+        "owners": db.execute(select(func.count(func.distinct(Task.owner_id)))).scalar(),
+        "archived": db.execute(select(func.count()).select_from(TaskArchive)).scalar(),
+    }
+
+
+def _max_task_id(db: Session) -> int:
+    return max(db.execute(select(func.max(Task.id))).scalar() or 0,
+               db.execute(select(func.max(TaskArchive.id))).scalar() or 0)
+
+
+shard_router = ShardRouter(parse_shard_urls(TASK_SHARD_URLS), ring=TASK_SHARD_RING or None)
+
+
+def task_session(db: Session, owner_id: int) -> Session:
+    """Return the session holding an owner's tasks.
+
+    Args:
+        db (Session): The request session.
+        owner_id (int): The ID of the task owner.
+
+    Returns:
+        Session: A session on the owner's shard, or ``db`` itself when sharding is off.
+    """
+    if not shard_router.enabled:
+        return db
+    return shard_router.session_for(db, owner_id)
+
+
+def sharded(func: Callable) -> Callable:
+    """Route a task function taking ``(db, owner_id, ...)`` to the owner's shard.
+
+    Args:
+        func (Callable): The task function.
+
+    Returns:
+        Callable: The wrapped function.
+    """
+    @functools.wraps(func)
+    def wrapper(db: Session, owner_id: int, *args, **kwargs):
+        return func(task_session(db, owner_id), owner_id, *args, **kwargs)
+
+    return wrapper
+
+
+@event.listens_for(Task, "before_insert")
+def _assign_task_id(mapper, connection, target):
+    if target.id is None and shard_router.enabled and shard_router.is_shard_engine(connection.engine):
+        target.id = shard_router.next_task_id()
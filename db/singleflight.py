@@ -0,0 +1,165 @@
+"""
+This module implements request coalescing (single-flight) for read functions in db/crud.py.
+
+When several threads call the same read function with the same arguments at the same time,
+only the first one (the leader) runs the query; the others wait for it and share its result.
+The leader runs the query on its own session, so an uncontended call costs nothing extra.
+Only when other callers are waiting does the leader snapshot the loaded objects into
+detached copies, which each waiting caller merges into its own session without another
+round trip. This keeps request sessions independent: a route that later modifies the object
+it received does not affect any other request.
+
+Calls are keyed by function, database engine and arguments. A call made on a session with
+pending changes, or inside a batch transaction, bypasses coalescing, since it may depend on
+state other sessions cannot see.
+
+Classes:
+- SingleFlight: Deduplicates concurrent calls that share a key.
+
+Functions:
+- coalesced: Decorator applying single-flight to a crud read function.
+
+Metrics:
+- singleflight.calls: Number of coalescing-eligible calls.
+- singleflight.coalesced: Number of calls served by another caller's query.
+- singleflight.in_flight: Number of queries currently in flight (gauge).
+
+Configuration (environment variables):
+- SINGLEFLIGHT_ENABLED: Set to "false" to disable coalescing (default "true").
+"""
+
+
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .database import Base
+from logs.metrics import metrics
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any], share: Callable[[Any], Any] = None) -> Tuple[Any, bool]:
+        """Run ``func`` unless a call with the same key is already in flight.
+
+        Args:
+            key (Hashable): Identifies equivalent calls.
+            func (Callable[[], Any]): The function to run.
+            share (Callable[[Any], Any], optional): Turns the leader's result into the value
+                handed to the waiting callers. Only called when some are waiting.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether it was shared from another caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        result = None
+        try:
+            result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters and call.error is None:
+                try:
+                    call.result = share(result) if share is not None else result
+                except Exception as e:
+                    call.error = e
+            call.done.set()
+        return result, False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+flight = SingleFlight()
+metrics.register_gauge("singleflight.in_flight", lambda: flight.in_flight)
+
+
+def _detached_copy(instance: Base) -> Base:
+    state = inspect(instance)
+    copy = state.mapper.class_manager.new_instance()
+    for attribute in state.mapper.column_attrs:
+        if attribute.key in state.dict:
+            set_committed_value(copy, attribute.key, state.dict[attribute.key])
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _share(result: Any) -> Any:
+    if isinstance(result, Base):
+        return _detached_copy(result)
+    if isinstance(result, list):
+        return [_detached_copy(item) if isinstance(item, Base) else item for item in result]
+    return result
+
+
+def _attach(db: Session, result: Any) -> Any:
+    if isinstance(result, Base):
+        return db.merge(result, load=False)
+    if isinstance(result, list):
+        return [db.merge(item, load=False) if isinstance(item, Base) else item for item in result]
+    return result
+
+
+def coalesced(func: Callable) -> Callable:
+    """Apply single-flight to a crud read function taking a session as first argument.
+
+    Args:
+        func (Callable): The read function to wrap.
+
+    Returns:
+        Callable: The wrapped function.
+    """
+    @functools.wraps(func)
+    def wrapper(db: Session, *args, **kwargs):
+        if not SINGLEFLIGHT_ENABLED or db.new or db.dirty or db.deleted or db.info.get("single_transaction"):
+            return func(db, *args, **kwargs)
+
+        key = (func.__qualname__, id(db.get_bind()), args, tuple(sorted(kwargs.items())))
+        result, shared = flight.do(key, lambda: func(db, *args, **kwargs), _share)
+        metrics.incr("singleflight.calls")
+        if not shared:
+            return result
+        metrics.incr("singleflight.coalesced")
+        return _attach(db, result)
+
+    return wrapper
@@ -0,0 +1,53 @@
+"""
+This module provides change sequence numbers for delta sync.
+
+Each user carries a ``change_seq`` counter. Every task change made on behalf of the user
+increments it inside the change's own transaction and stamps the new value on the task or
+tombstone. The counter row stays locked until the transaction commits, so values become
+visible in increasing order and a client cursor never skips a change.
+
+On a task shard (see db/sharding.py) the counter lives in a shadow ``users`` row created by
+the owner's first change there. The rebalancing tool freezes that row with a negative value
+while the owner is moved away, and every change routed to the old shard is then refused.
+
+Functions:
+- next_change_seq: Increment and return a user's change sequence number.
+"""
+
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import User
+from .sharding import OwnerMovingError
+
+NEXT_CHANGE_SEQ = (
+    update(User)
+    .where((User.id == bindparam("owner_id")) & (User.change_seq >= 0))
+    .values(change_seq=User.change_seq + 1)
+    .returning(User.change_seq)
+    .execution_options(synchronize_session=False)
+)
+OWNER_EXISTS = select(User.id).where(User.id == bindparam("owner_id"))
+
+
+def next_change_seq(db: Session, owner_id: int) -> int:
+    """Increment and return a user's change sequence number.
+
+    Args:
+        db (Session): The database session of the change.
+        owner_id (int): The ID of the task owner.
+
+    Raises:
+        OwnerMovingError: If the owner is being moved away from this shard.
+
+    Returns:
+        int: The new sequence number, or 0 if the user does not exist.
+    """
+    seq = db.execute(NEXT_CHANGE_SEQ, {"owner_id": owner_id}).scalar_one_or_none()
+    if seq is not None or "shard" not in db.info:
+        return seq or 0
+    if db.execute(OWNER_EXISTS, {"owner_id": owner_id}).first() is not None:
+        raise OwnerMovingError(owner_id)
+    db.execute(insert(User).values(id=owner_id, change_seq=1))
+    return 1
@@ -0,0 +1,200 @@
+"""
+This module provides memory diagnostics for a running worker.
+
+Allocation tracing with ``tracemalloc`` is off by default, since it slows every allocation
+down; operators start it, take snapshots a while apart, and diff them to find the code
+paths whose allocations keep growing. Snapshots are kept in memory under increasing IDs,
+and only the newest ``MEMORY_MAX_SNAPSHOTS`` are retained. Frames of tracemalloc itself and
+of the import machinery are filtered out of every report.
+
+Garbage collector statistics and per-type object counts are available without tracing.
+
+Classes:
+- MemoryDiagnostics: Controls tracing and keeps snapshots of one worker.
+
+Configuration (environment variables):
+- MEMORY_MAX_SNAPSHOTS: Number of snapshots kept (default 5).
+- MEMORY_TRACE_FRAMES: Default traceback depth recorded per allocation (default 10).
+"""
+
+
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "5"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _format_stat(stat) -> Dict[str, Any]:
+    return {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size": stat.size,
+        "count": stat.count,
+    }
+
+
+def _format_diff(stat) -> Dict[str, Any]:
+    return {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size": stat.size,
+        "size_diff": stat.size_diff,
+        "count": stat.count,
+        "count_diff": stat.count_diff,
+    }
+
+
+class MemoryDiagnostics:
+    """Controls allocation tracing and keeps snapshots of one worker.
+
+    Args:
+        max_snapshots (int): Number of snapshots kept.
+    """
+
+    def __init__(self, max_snapshots: int = MEMORY_MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def status(self) -> Dict[str, Any]:
+        """Return whether tracing is on and how much memory it currently sees."""
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+        }
+
+    def start(self, frames: int = MEMORY_TRACE_FRAMES) -> Dict[str, Any]:
+        """Start tracing allocations, recording ``frames`` frames per allocation."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing; the snapshots taken so far are kept."""
+        tracemalloc.stop()
+        return self.status()
+
+    def take_snapshot(self) -> Dict[str, Any]:
+        """Take a snapshot of the traced allocations.
+
+        Raises:
+            RuntimeError: If tracing is not running.
+
+        Returns:
+            Dict[str, Any]: The snapshot's ID, creation time and total traced size.
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = {
+                "snapshot": snapshot,
+                "created_at": time.time(),
+                "size": sum(stat.size for stat in snapshot.statistics("filename")),
+            }
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+            return self._entry(snapshot_id, self._snapshots[snapshot_id])
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Return the ID, creation time and total size of every kept snapshot."""
+        with self._lock:
+            return [self._entry(snapshot_id, entry) for snapshot_id, entry in self._snapshots.items()]
+
+    def top(self, snapshot_id: int, key_type: str = "lineno", limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the allocation sites holding the most memory in a snapshot.
+
+        Args:
+            snapshot_id (int): The snapshot ID.
+            key_type (str): Group allocations by "lineno", "filename" or "traceback".
+            limit (int): The maximum number of sites to return.
+
+        Raises:
+            KeyError: If the snapshot does not exist.
+
+        Returns:
+            List[Dict[str, Any]]: Location, size and allocation count per site, largest first.
+        """
+        stats = self._get(snapshot_id).statistics(key_type)
+        return [_format_stat(stat) for stat in stats[:limit]]
+
+    def diff(self, base_id: int, target_id: int, key_type: str = "lineno", limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the allocation sites that changed most between two snapshots.
+
+        Args:
+            base_id (int): The earlier snapshot ID.
+            target_id (int): The later snapshot ID.
+            key_type (str): Group allocations by "lineno", "filename" or "traceback".
+            limit (int): The maximum number of sites to return.
+
+        Raises:
+            KeyError: If either snapshot does not exist.
+
+        Returns:
+            List[Dict[str, Any]]: Sizes, counts and their differences, largest growth first.
+        """
+        stats = self._get(target_id).compare_to(self._get(base_id), key_type)
+        return [_format_diff(stat) for stat in stats[:limit]]
+
+    @staticmethod
+    def gc_stats() -> Dict[str, Any]:
+        """Return per-generation collector statistics, counts and thresholds."""
+        return {
+            "enabled": gc.isenabled(),
+            "counts": list(gc.get_count()),
+            "thresholds": list(gc.get_threshold()),
+            "generations": gc.get_stats(),
+            "uncollectable": len(gc.garbage),
+        }
+
+    @staticmethod
+    def object_counts(limit: int = 30, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Count the objects tracked by the garbage collector per type.
+
+        Args:
+            limit (int): The maximum number of types to return.
+            prefix (Optional[str]): Only count types whose qualified name starts with it,
+                e.g. "sqlalchemy." or "db.models.".
+
+        Returns:
+            List[Dict[str, Any]]: Type names and object counts, most frequent first.
+        """
+        counts = Counter()
+        for obj in gc.get_objects():
+            cls = type(obj)
+            counts[f"{cls.__module__}.{cls.__qualname__}"] += 1
+        if prefix:
+            counts = Counter({name: count for name, count in counts.items() if name.startswith(prefix)})
+        return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            return self._snapshots[snapshot_id]["snapshot"]
+
+    @staticmethod
+    def _entry(snapshot_id: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": snapshot_id, "created_at": entry["created_at"], "size": entry["size"]}
+
+
+memory_diagnostics = MemoryDiagnostics()
@@ -0,0 +1,81 @@
+"""
+This module provides a small in-process metrics registry.
+
+Counters are incremented by the subsystems that own them, and gauges are either set
+directly or computed on demand by a registered callback. The whole registry can be read
+as a flat snapshot, which the /metrics endpoint returns as JSON.
+
+Usage:
+    from logs.metrics import metrics
+
+    metrics.incr("singleflight.calls")
+    metrics.register_gauge("admission.reads.queued", lambda: limiter.queued)
+"""
+
+
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Union
+
+Number = Union[int, float]
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters and gauges."""
+
+    def __init__(self):
+        self._counters: Dict[str, Number] = defaultdict(int)
+        self._gauges: Dict[str, Number] = {}
+        self._callbacks: Dict[str, Callable[[], Number]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: Number = 1) -> None:
+        """Increment a counter.
+
+        Args:
+            name (str): The counter name.
+            value (Number): The amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: Number) -> None:
+        """Set a gauge to the given value.
+
+        Args:
+            name (str): The gauge name.
+            value (Number): The current value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], Number]) -> None:
+        """Register a gauge whose value is computed when a snapshot is taken.
+
+        Args:
+            name (str): The gauge name.
+            callback (Callable[[], Number]): Returns the current value.
+        """
+        with self._lock:
+            self._callbacks[name] = callback
+
+    def get(self, name: str) -> Number:
+        """Return the current value of a counter or gauge, or 0 if unknown."""
+        with self._lock:
+            callback = self._callbacks.get(name)
+            if callback is None:
+                return self._gauges.get(name, self._counters.get(name, 0))
+        return callback()
+
+    def snapshot(self) -> Dict[str, Number]:
+        """Return all counters and gauges as a flat, sorted dictionary."""
+        with self._lock:
+            values = dict(self._counters)
+            values.update(self._gauges)
+            callbacks = dict(self._callbacks)
+        for name, callback in callbacks.items():
+            values[name] = callback()
+        return dict(sorted(values.items()))
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,202 @@
+"""
+This module provides admission control and load shedding for the application.
+
+Every HTTP request is assigned to a route class and must obtain a slot from that class's
+limiter before it reaches the routers:
+
+- auth: CPU-heavy password hashing routes (POST /login, POST /token, POST /users).
+- read: GET, HEAD and OPTIONS requests.
+- write: all other mutations.
+
+When all slots of a class are busy, requests wait in a bounded queue. A request is rejected
+with 503 and a ``Retry-After`` header when the queue is full, or when it could not get a
+slot before the deadline, so latency stays bounded under overload instead of growing with
+the backlog of the threadpool.
+
+Classes:
+- AdmissionLimiter: Concurrency limiter with a bounded wait queue and a deadline.
+- AdmissionMiddleware: ASGI middleware applying the limiters to incoming requests.
+
+Functions:
+- classify_request: Return the route class for a request method and path.
+
+Metrics (per route class):
+- admission.<class>.active / admission.<class>.queued: Current slot and queue usage (gauges).
+- admission.<class>.admitted / .rejected / .timed_out: Request counters.
+
+Configuration (environment variables):
+- ADMISSION_ENABLED: Set to "false" to disable admission control (default "true").
+- ADMISSION_AUTH_LIMIT, ADMISSION_READ_LIMIT, ADMISSION_WRITE_LIMIT: Concurrent requests per
+  class (defaults: number of CPUs, 32, 16).
+- ADMISSION_AUTH_QUEUE, ADMISSION_READ_QUEUE, ADMISSION_WRITE_QUEUE: Maximum queued requests
+  per class (defaults: 4 x the limit).
+- ADMISSION_TIMEOUT_SECONDS: Maximum time a request may wait for a slot (default 2).
+- ADMISSION_RETRY_AFTER: Value of the ``Retry-After`` header on rejection (default 1).
+"""
+
+
+import asyncio
+import os
+from collections import deque
+from typing import Deque, Dict
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from logs.logger import logger
+from logs.metrics import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+DEFAULT_LIMITS = {"auth": os.cpu_count() or 1, "read": 32, "write": 16}
+
+AUTH_ROUTES = {("POST", "/login"), ("POST", "/token"), ("POST", "/users")}
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Requests to these paths are never queued or rejected. Long-lived streams would otherwise
+# hold a read slot for their whole lifetime.
+EXEMPT_PATHS = {"/metrics", "/docs", "/redoc", "/openapi.json", "/tasks/stream"}
+
+
+def classify_request(method: str, path: str) -> str:
+    """Return the route class for a request.
+
+    Args:
+        method (str): The HTTP method.
+        path (str): The request path.
+
+    Returns:
+        str: One of "auth", "read" or "write".
+    """
+    if (method, path.rstrip("/") or "/") in AUTH_ROUTES:
+        return "auth"
+    if method in READ_METHODS:
+        return "read"
+    return "write"
+
+
+class AdmissionLimiter:
+    """Concurrency limiter with a bounded wait queue and a deadline.
+
+    The limiter is used from the event loop only, so it needs no locking. Slots released
+    while requests are queued are handed directly to the oldest waiter.
+
+    Args:
+        name (str): The route class name, used for metrics.
+        limit (int): Maximum number of concurrently admitted requests.
+        max_queue (int): Maximum number of waiting requests.
+        timeout (float): Maximum time in seconds a request may wait.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float = ADMISSION_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        metrics.register_gauge(f"admission.{name}.active", lambda: self.active)
+        metrics.register_gauge(f"admission.{name}.queued", lambda: self.queued)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Wait for a slot.
+
+        Returns:
+            bool: True if the request was admitted, False if it must be rejected.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            metrics.incr(f"admission.{self.name}.admitted")
+            return True
+        if len(self._waiters) >= self.max_queue:
+            metrics.incr(f"admission.{self.name}.rejected")
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._abandon(waiter)
+            raise
+
+        if waiter.done():
+            metrics.incr(f"admission.{self.name}.admitted")
+            return True
+        self._abandon(waiter)
+        metrics.incr(f"admission.{self.name}.timed_out")
+        return False
+
+    def release(self) -> None:
+        """Release a slot, handing it to the oldest waiter if there is one."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+def _limiter_from_env(name: str) -> AdmissionLimiter:
+    limit = int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", str(DEFAULT_LIMITS[name])))
+    max_queue = int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(limit * 4)))
+    return AdmissionLimiter(name, limit, max_queue)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying per-route-class admission control.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        limiters (Dict[str, AdmissionLimiter], optional): Limiters keyed by route class.
+            Defaults to limiters configured from the environment.
+        retry_after (int): Value of the ``Retry-After`` header on rejection.
+        enabled (bool): Whether admission control is applied.
+    """
+
+    def __init__(self, app: ASGIApp, limiters: Dict[str, AdmissionLimiter] = None,
+                 retry_after: int = ADMISSION_RETRY_AFTER, enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.limiters = limiters or {name: _limiter_from_env(name) for name in DEFAULT_LIMITS}
+        self.retry_after = retry_after
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_request(scope["method"], scope["path"])
+        limiter = self.limiters[route_class]
+        if not await limiter.acquire():
+            logger.warning(f"Shedding {scope['method']} {scope['path']}: {route_class} capacity exhausted")
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is overloaded, please retry later"},
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
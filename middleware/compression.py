@@ -0,0 +1,346 @@
+"""
+This module provides response compression for the application.
+
+The middleware negotiates a content coding with the client through the ``Accept-Encoding``
+request header and compresses response bodies with zstd, brotli or gzip. Brotli and zstd are
+only offered when the optional ``brotli`` and ``zstandard`` packages are installed; gzip is
+always available through the standard library.
+
+Buffered responses smaller than the configured minimum size are sent unchanged. Streaming
+responses are compressed chunk by chunk and flushed after every chunk, so clients receive
+data as soon as the application produces it.
+
+Compressed variants of buffered bodies are kept in a bounded LRU cache keyed by the encoding
+and a digest of the payload, so a response that is served repeatedly (or kept in a response
+cache) is only compressed once per encoding.
+
+Classes:
+- CompressedVariantCache: Bounded LRU cache of compressed response bodies.
+- CompressionMiddleware: ASGI middleware that compresses eligible responses.
+
+Functions:
+- negotiate_encoding: Select the best supported encoding for an ``Accept-Encoding`` header.
+- compress_body: Compress a complete payload with the given encoding.
+
+Configuration (environment variables):
+- COMPRESSION_MIN_SIZE: Minimum body size in bytes to compress (default 500).
+- COMPRESSION_GZIP_LEVEL: gzip compression level, 1-9 (default 6).
+- COMPRESSION_BROTLI_QUALITY: brotli quality, 0-11 (default 5).
+- COMPRESSION_ZSTD_LEVEL: zstd compression level, 1-22 (default 3).
+- COMPRESSION_CACHE_SIZE: Number of compressed variants to keep (default 256, 0 disables).
+"""
+
+
+import gzip
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from logs.logger import logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "256"))
+
+# Bodies larger than this are compressed but not kept in the variant cache.
+MAX_CACHED_BODY_SIZE = 1024 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+# Preferred order when the client weights several encodings equally.
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Return the encodings supported by the installed libraries, in preference order.
+
+    Returns:
+        Tuple[str, ...]: The supported content codings.
+    """
+    supported = {"gzip"}
+    if brotli is not None:
+        supported.add("br")
+    if zstandard is not None:
+        supported.add("zstd")
+    return tuple(encoding for encoding in PREFERENCE if encoding in supported)
+
+
+def negotiate_encoding(accept_encoding: str, supported: Tuple[str, ...] = None) -> Optional[str]:
+    """Select the best supported encoding for an ``Accept-Encoding`` header.
+
+    Args:
+        accept_encoding (str): The raw ``Accept-Encoding`` header value.
+        supported (Tuple[str, ...], optional): Encodings to choose from, in preference order.
+            Defaults to the encodings available in this process.
+
+    Returns:
+        Optional[str]: The chosen encoding, or None if the response should not be compressed.
+    """
+    if supported is None:
+        supported = available_encodings()
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        coding = parts[0].lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        weights[coding] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = GZIP_LEVEL,
+                  brotli_quality: int = BROTLI_QUALITY, zstd_level: int = ZSTD_LEVEL) -> bytes:
+    """Compress a complete payload with the given encoding.
+
+    Args:
+        body (bytes): The payload to compress.
+        encoding (str): One of "gzip", "br" or "zstd".
+        gzip_level (int): gzip compression level.
+        brotli_quality (int): brotli quality.
+        zstd_level (int): zstd compression level.
+
+    Returns:
+        bytes: The compressed payload.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=zstd_level).compress(body)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor that flushes after every chunk."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedVariantCache:
+    """Bounded LRU cache of compressed response bodies.
+
+    Entries are keyed by the encoding and a SHA-1 digest of the uncompressed body, so the
+    same payload is compressed at most once per encoding while it stays in the cache. A
+    response cache can store the returned variants next to its own entries by calling
+    ``get`` and ``put`` with the same body.
+
+    Attributes:
+        max_entries (int): The maximum number of variants kept.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that required compression.
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+
+    @staticmethod
+    def key(body: bytes, encoding: str) -> Tuple[str, bytes]:
+        return encoding, hashlib.sha1(body).digest()
+
+    def get(self, body: bytes, encoding: str) -> Optional[bytes]:
+        key = self.key(body, encoding)
+        compressed = self._entries.get(key)
+        if compressed is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return compressed
+
+    def put(self, body: bytes, encoding: str, compressed: bytes) -> None:
+        if self.max_entries <= 0 or len(body) > MAX_CACHED_BODY_SIZE:
+            return
+        key = self.key(body, encoding)
+        self._entries[key] = compressed
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+variant_cache = CompressedVariantCache()
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses eligible responses.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        minimum_size (int): Buffered bodies smaller than this are sent unchanged.
+        gzip_level (int): gzip compression level.
+        brotli_quality (int): brotli quality.
+        zstd_level (int): zstd compression level.
+        cache (CompressedVariantCache, optional): Cache for compressed variants.
+            Defaults to the module-level cache.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY, zstd_level: int = ZSTD_LEVEL,
+                 cache: CompressedVariantCache = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.cache = cache if cache is not None else variant_cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        compressed = self.cache.get(body, encoding)
+        if compressed is None:
+            compressed = compress_body(body, encoding, self.gzip_level, self.brotli_quality, self.zstd_level)
+            self.cache.put(body, encoding, compressed)
+        return compressed
+
+    def stream_compressor(self, encoding: str) -> _StreamCompressor:
+        return _StreamCompressor(encoding, self.gzip_level, self.brotli_quality, self.zstd_level)
+
+
+class _CompressionResponder:
+    """Per-request ``send`` wrapper that decides whether and how to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] < 200
+                or message["status"] in (204, 304)
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if self.passthrough:
+                await self.downstream(message)
+                self.start_message = None
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is not None:
+            chunk = self.compressor.compress(body)
+            if not more_body:
+                chunk += self.compressor.finish()
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+
+        if not more_body:
+            if len(body) < self.middleware.minimum_size:
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                return
+            compressed = self.middleware.compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(compressed))
+            await self.downstream(self.start_message)
+            await self.downstream({"type": "http.response.body", "body": compressed, "more_body": False})
+            return
+
+        declared_length = headers.get("content-length")
+        if declared_length is not None and int(declared_length) < self.middleware.minimum_size:
+            self.passthrough = True
+            await self.downstream(self.start_message)
+            await self.downstream(message)
+            return
+
+        logger.debug(f"Compressing streaming response with {self.encoding}")
+        self.compressor = self.middleware.stream_compressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        await self.downstream(self.start_message)
+        await self.downstream({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body),
+            "more_body": True,
+        })
@@ -0,0 +1,278 @@
+"""
+This module provides opt-in per-request CPU profiling.
+
+A request is profiled when it carries a valid signed ``X-Profile-Token`` header, or when it
+is picked by the configured sampling rate. Tokens are ``<expires>.<signature>``, where the
+signature is an HMAC-SHA256 of the expiry timestamp keyed with ``SECRET_KEY``; they are
+created with ``sign_profile_token``. Clients cannot trigger profiling without the key, and
+leaked tokens stop working when they expire.
+
+Two profilers are available:
+
+- sample: A stack sampler that wakes up every ``PROFILING_INTERVAL_MS`` and records the
+  Python stack of every thread of the worker, so time spent in threadpool handlers is
+  included. Idle event loops and idle threadpool workers are skipped. The output is in the
+  collapsed-stack format (``frame;frame;frame count``) read by flamegraph.pl, speedscope and
+  inferno. Other requests running concurrently in the same worker appear in the samples too.
+- cprofile: Deterministic profiling of the event loop thread with cProfile, written as a
+  pstats ``.prof`` file (flameprof and snakeviz render it as a flame graph). It is the
+  fallback when the interpreter cannot inspect the stacks of other threads. Only one request
+  per worker is profiled with cProfile at a time.
+
+Profiles are written to ``PROFILING_DIR``; only the newest ``PROFILING_MAX_FILES`` are kept.
+The response of a profiled request carries the profile's file name in ``X-Profile-Id``.
+When profiling is disabled the middleware costs a single attribute check per request.
+
+Classes:
+- StackSampler: Samples the stacks of all threads into collapsed-stack counts.
+- ProfilingMiddleware: ASGI middleware profiling selected requests.
+
+Functions:
+- sign_profile_token: Create a token that enables profiling for a limited time.
+- verify_profile_token: Check a profiling token's signature and expiry.
+- list_profiles: List the most recent profiles in a directory.
+
+Configuration (environment variables):
+- PROFILING_ENABLED: Set to "true" to allow profiling (default "false").
+- PROFILING_SAMPLE_RATE: Fraction of requests profiled without a token (default 0).
+- PROFILING_MODE: "sample", "cprofile" or "auto" (default "auto": sample when possible).
+- PROFILING_INTERVAL_MS: Stack sampling interval (default 5).
+- PROFILING_DIR: Directory the profiles are written to (default "./profiles").
+- PROFILING_MAX_FILES: Number of profiles kept (default 50).
+"""
+
+
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth.jwt_gen import SECRET_KEY
+from logs.logger import logger
+from logs.metrics import metrics
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_MODE = os.getenv("PROFILING_MODE", "auto")
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "./profiles")
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "50"))
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_EXTENSIONS = (".collapsed", ".prof")
+
+# (file name, function name) of innermost frames that mean a thread is waiting for work.
+IDLE_FRAMES = {("selectors.py", "select"), ("queue.py", "get"), ("threading.py", "wait")}
+
+
+def _signature(expires: int) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def sign_profile_token(ttl_seconds: int = 3600) -> str:
+    """Create a token that enables profiling for a limited time.
+
+    Args:
+        ttl_seconds (int): How long the token stays valid.
+
+    Returns:
+        str: The value for the ``X-Profile-Token`` header.
+    """
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_signature(expires)}"
+
+
+def verify_profile_token(token: str) -> bool:
+    """Check a profiling token's signature and expiry.
+
+    Args:
+        token (str): The ``X-Profile-Token`` header value.
+
+    Returns:
+        bool: True if the token is authentic and not expired.
+    """
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(int(expires)))
+
+
+class StackSampler:
+    """Samples the stacks of all threads into collapsed-stack counts.
+
+    Args:
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, interval: float = PROFILING_INTERVAL_MS / 1000.0):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._collapse(frame)
+                if stack is None:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.counts[f"{names.get(ident, ident)};{stack}"] += 1
+
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append((os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        if (frames[0][0], frames[0][1]) in IDLE_FRAMES:
+            return None
+        return ";".join(f"{name} ({filename}:{lineno})" for filename, name, lineno in reversed(frames))
+
+    def collapsed(self) -> str:
+        """Return the samples in the collapsed-stack format."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def list_profiles(directory: str = PROFILING_DIR, limit: int = PROFILING_MAX_FILES) -> List[Dict[str, object]]:
+    """List the most recent profiles in a directory.
+
+    Args:
+        directory (str): The profile directory.
+        limit (int): The maximum number of profiles to return.
+
+    Returns:
+        List[Dict[str, object]]: Name, size in bytes and creation time of each profile,
+        newest first.
+    """
+    try:
+        entries = [entry for entry in os.scandir(directory)
+                   if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS)]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [
+        {"name": entry.name, "size": entry.stat().st_size, "created_at": entry.stat().st_mtime}
+        for entry in entries[:limit]
+    ]
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        enabled (bool): Whether profiling is allowed at all.
+        sample_rate (float): Fraction of requests profiled without a token.
+        mode (str): "sample", "cprofile" or "auto".
+        directory (str): Directory the profiles are written to.
+        max_files (int): Number of profiles kept.
+        interval (float): Seconds between stack samples.
+    """
+
+    def __init__(self, app: ASGIApp, enabled: bool = PROFILING_ENABLED, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 mode: str = PROFILING_MODE, directory: str = PROFILING_DIR, max_files: int = PROFILING_MAX_FILES,
+                 interval: float = PROFILING_INTERVAL_MS / 1000.0):
+        self.app = app
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        if mode == "auto":
+            mode = "sample" if hasattr(sys, "_current_frames") else "cprofile"
+        self.mode = mode
+        self.directory = directory
+        self.max_files = max_files
+        self.interval = interval
+        self._cprofile_lock = threading.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{int(time.time() * 1000)}-{scope['method']}-{_slug(scope['path'])}"
+        name += ".collapsed" if self.mode == "sample" else ".prof"
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", name)
+            await send(message)
+
+        if self.mode == "sample":
+            sampler = StackSampler(self.interval)
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                sampler.stop()
+                await run_in_threadpool(self._write, name, sampler.collapsed())
+            return
+
+        if not self._cprofile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profile.disable()
+        finally:
+            self._cprofile_lock.release()
+        await run_in_threadpool(self._write_stats, name, profile)
+
+    def _selected(self, scope: Scope) -> bool:
+        for key, value in scope["headers"]:
+            if key == PROFILE_TOKEN_HEADER:
+                return verify_profile_token(value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _write(self, name: str, data: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w") as output:
+            output.write(data)
+        self._finish(name)
+
+    def _write_stats(self, name: str, profile: cProfile.Profile) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._finish(name)
+
+    def _finish(self, name: str) -> None:
+        metrics.incr("profiling.profiles")
+        logger.info(f"Wrote request profile {name}")
+        for stale in list_profiles(self.directory, limit=sys.maxsize)[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, stale["name"]))
+            except FileNotFoundError:
+                pass
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
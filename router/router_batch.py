@@ -0,0 +1,248 @@
+"""
+This module defines the API route executing many API operations in one round trip.
+
+POST /batch takes a list of requests (method, path, optional JSON body and headers) and
+returns the status, headers and body of each, in order. Sub-requests are dispatched
+in-process straight to the application's routes, so they skip the middleware stack the
+batch itself already went through, and they share one authentication: the access token
+is resolved once per batch.
+
+Two modes are available:
+
+- Independent (default): consecutive reads run concurrently, each with its own read
+  session. Writes run one after the other on one shared session, which is rolled back after
+  a failed write; reads following a write go to the primary so they see it. A failing
+  sub-request does not affect the others.
+- Transactional (``"transaction": true``): all sub-requests run in order inside one
+  database transaction. If a sub-request fails with a status of 400 or above, the remaining
+  ones are not executed (status 424) and every change is rolled back. Task events, audit
+  events and cache invalidations are only published once the transaction has committed.
+  The batch's user is resolved before the transaction starts, so no sub-request needs a
+  database connection of its own to authenticate while the writer is held.
+
+Streaming routes, nested batches and, in transactional mode, requests that commit outside
+of the batch transaction (``Idempotency-Key`` headers, /logout) are rejected. With the
+``sql`` rate limiter backend, the rate-limited routes (POST /users, /login, /token) are
+rejected in transactional mode too: the limiter writes its buckets through a session of its
+own, which would wait on the single writer connection held by the batch transaction.
+Transactional batches are refused altogether when task sharding is enabled, since one
+transaction cannot span the primary and the task shards.
+
+Metrics:
+- batch.batches / batch.subrequests: Executed batches and sub-requests.
+- batch.rolled_back: Transactional batches rolled back.
+
+Configuration (environment variables):
+- BATCH_MAX_REQUESTS: Maximum number of sub-requests per batch (default 20).
+"""
+
+
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, List
+
+from fastapi import HTTPException, Request, status
+from fastapi.routing import APIRouter
+from starlette.concurrency import run_in_threadpool
+
+from auth.rate_limit import SQLBucketStore, auth_rate_limit
+from auth.user_auth import preload_batch_user
+from db.audit import audit_log
+from db.cache import cache
+from db.database import SessionLocal, client_keys, has_writes, read_your_writes, single_transaction_session
+from db.events import task_events
+from db.sharding import shard_router
+from db.schemas import BatchOperation, BatchRequest
+from logs.logger import logger
+from logs.metrics import metrics
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+ALLOWED_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"}
+READ_METHODS = {"GET", "HEAD"}
+EXCLUDED_PATHS = {"/batch", "/tasks/stream", "/tasks/ws"}
+TRANSACTION_EXCLUDED_PATHS = {"/logout"}
+RATE_LIMITED_ROUTES = {("POST", "/users"), ("POST", "/login"), ("POST", "/token")}
+
+# Headers of the batch request passed on to every sub-request.
+FORWARDED_HEADERS = {b"cookie", b"authorization", b"user-agent"}
+
+# Scope entries of the batch request the routes need to handle a sub-request.
+INHERITED_SCOPE_KEYS = ("type", "asgi", "http_version", "scheme", "server", "client", "root_path", "app", "state",
+                        "starlette.exception_handlers")
+
+router = APIRouter()
+
+
+def _validate(operations: List[BatchOperation], transaction: bool) -> None:
+    if transaction and shard_router.enabled:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Transactional batches are not available with task sharding")
+    if len(operations) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"A batch may contain at most {BATCH_MAX_REQUESTS} requests")
+    for index, operation in enumerate(operations):
+        operation.method = operation.method.upper()
+        path = operation.path.partition("?")[0].rstrip("/") or "/"
+        if operation.method not in ALLOWED_METHODS or not operation.path.startswith("/"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Request {index}: unsupported method or path")
+        if path in EXCLUDED_PATHS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Request {index}: {path} cannot be batched")
+        if transaction and (path in TRANSACTION_EXCLUDED_PATHS
+                            or any(name.lower() == "idempotency-key" for name in operation.headers or {})):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Request {index}: not allowed in a transactional batch")
+        if (transaction and isinstance(auth_rate_limit.store, SQLBucketStore)
+                and (operation.method, path) in RATE_LIMITED_ROUTES):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Request {index}: rate-limited routes cannot run in a transactional batch")
+
+
+async def _dispatch(request: Request, operation: BatchOperation, batch_scope: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one sub-request through the application's routes and capture its response."""
+    path, _, query = operation.path.partition("?")
+    headers = [(name, value) for name, value in request.scope["headers"] if name in FORWARDED_HEADERS]
+    body = b""
+    if operation.body is not None:
+        body = json.dumps(operation.body).encode()
+        headers.append((b"content-type", b"application/json"))
+    headers.append((b"content-length", str(len(body)).encode()))
+    for name, value in (operation.headers or {}).items():
+        headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+
+    scope = {key: request.scope[key] for key in INHERITED_SCOPE_KEYS if key in request.scope}
+    scope.update(batch_scope, method=operation.method, path=path, raw_path=path.encode(),
+                 query_string=query.encode(), headers=headers)
+
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response: Dict[str, Any] = {"status": 500, "headers": {}}
+    chunks = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode("latin-1"): value.decode("latin-1")
+                                   for name, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    metrics.incr("batch.subrequests")
+    try:
+        await request.app.router(scope, receive, send)
+    except Exception as e:
+        logger.error(f"Batch sub-request {operation.method} {operation.path} failed: {e}")
+        return {"status": 500, "headers": {}, "body": {"detail": "Internal Server Error"}}
+
+    content = b"".join(chunks)
+    if response["headers"].get("content-type", "").startswith("application/json"):
+        response["body"] = json.loads(content) if content else None
+    else:
+        response["body"] = content.decode("utf-8", errors="replace")
+    return response
+
+
+async def _run_independent(request: Request, operations: List[BatchOperation],
+                           batch_auth: Dict[str, Any]) -> List[Dict[str, Any]]:
+    responses: List[Dict[str, Any]] = []
+    db = SessionLocal()
+    try:
+        index = 0
+        while index < len(operations):
+            if operations[index].method in READ_METHODS:
+                end = index
+                while end < len(operations) and operations[end].method in READ_METHODS:
+                    end += 1
+                batch_scope = {"batch_auth": batch_auth, "batch_primary_reads": has_writes(db)}
+                responses.extend(await asyncio.gather(
+                    *(_dispatch(request, operation, batch_scope) for operation in operations[index:end])
+                ))
+                index = end
+            else:
+                batch_scope = {"batch_auth": batch_auth, "batch_db": db}
+                response = await _dispatch(request, operations[index], batch_scope)
+                if response["status"] >= 400:
+                    # A write failing in its flush or commit leaves the session unusable
+                    # until it is rolled back; the writes before it are already committed.
+                    await run_in_threadpool(db.rollback)
+                responses.append(response)
+                index += 1
+    finally:
+        wrote = has_writes(db)
+        db.close()
+    if wrote:
+        read_your_writes.pin(client_keys(request))
+    return responses
+
+
+def _authenticate(request: Request, batch_auth: Dict[str, Any]) -> None:
+    access_token = request.cookies.get("access_token")
+    if access_token:
+        with SessionLocal() as db:
+            preload_batch_user(batch_auth, access_token, db)
+
+
+async def _run_transaction(request: Request, operations: List[BatchOperation],
+                           batch_auth: Dict[str, Any]) -> Dict[str, Any]:
+    responses: List[Dict[str, Any]] = []
+    # Authenticate before the transaction holds the writer connection.
+    await run_in_threadpool(_authenticate, request, batch_auth)
+    with task_events.deferred() as events, audit_log.deferred() as audit_events, cache.deferred() as invalidations:
+        transaction = single_transaction_session()
+        db = await run_in_threadpool(transaction.__enter__)
+        try:
+            batch_scope = {"batch_auth": batch_auth, "batch_db": db, "batch_read_db": db}
+            for operation in operations:
+                if responses and responses[-1]["status"] >= 400:
+                    responses.append({"status": status.HTTP_424_FAILED_DEPENDENCY, "headers": {},
+                                      "body": {"detail": "Not executed: an earlier request in the transaction failed"}})
+                    continue
+                responses.append(await _dispatch(request, operation, batch_scope))
+        except BaseException as e:
+            await run_in_threadpool(transaction.__exit__, type(e), e, e.__traceback__)
+            raise
+        committed = all(response["status"] < 400 for response in responses)
+        db.info["rollback_only"] = not committed
+        wrote = has_writes(db)
+        await run_in_threadpool(transaction.__exit__, None, None, None)
+
+    if committed:
+        for message in events:
+            task_events.send(message)
+        audit_log.submit(audit_events)
+        cache.apply(invalidations)
+        if wrote:
+            read_your_writes.pin(client_keys(request))
+    else:
+        metrics.incr("batch.rolled_back")
+        logger.info(f"Rolled back a transactional batch of {len(operations)} requests")
+    return {"responses": responses, "committed": committed}
+
+
+@router.post("/batch")
+async def run_batch(request: Request, batch: BatchRequest):
+    """Execute many API requests in one round trip.
+
+    Args:
+        request (Request): The incoming request; its cookies authenticate the sub-requests.
+        batch (BatchRequest): The sub-requests and the execution mode.
+
+    Raises:
+        HTTPException: If the batch is too large or contains a request that cannot be batched.
+
+    Returns:
+        dict: The status, headers and body of every sub-request, in order, and in
+        transactional mode whether the changes were committed.
+    """
+    _validate(batch.requests, batch.transaction)
+    metrics.incr("batch.batches")
+    batch_auth = {"lock": threading.Lock(), "users": {}}
+    if batch.transaction:
+        return await _run_transaction(request, batch.requests, batch_auth)
+    return {"responses": await _run_independent(request, batch.requests, batch_auth)}
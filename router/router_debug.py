@@ -0,0 +1,275 @@
+"""
+This module defines the protected diagnostics routes.
+
+It includes routes for:
+- Listing the most recent request profiles written by the profiling middleware.
+- Downloading a request profile.
+- Starting and stopping allocation tracing with tracemalloc.
+- Taking, listing and diffing allocation snapshots and showing their top allocation sites.
+- Reporting garbage collector statistics and per-type object counts.
+- Reporting the task shards and listing tasks across all shards (scatter-gather).
+- Querying the audit trail of user and task mutations.
+- Reporting the database maintenance jobs and running one at once.
+
+All routes require the ``X-Admin-Token`` header to match ``ADMIN_TOKEN`` and are hidden
+(404) when ``ADMIN_TOKEN`` is not set.
+
+Usage:
+- The routes are registered with the FastAPI application under the /debug prefix.
+"""
+
+
+import os
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from fastapi.routing import APIRouter
+
+from auth.user_auth import require_admin
+from db.audit import audit_log
+from db.maintenance import maintenance_scheduler
+from db.rows import list_all_task_rows
+from db.sharding import shard_router
+from logs.memory import KEY_TYPES, MEMORY_TRACE_FRAMES, memory_diagnostics
+from middleware.profiling import PROFILING_DIR, PROFILING_MAX_FILES, list_profiles
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+def read_profiles(limit: int = Query(20, ge=1, le=PROFILING_MAX_FILES)):
+    """List the most recent request profiles.
+
+    Args:
+        limit (int): The maximum number of profiles to return.
+
+    Returns:
+        dict: The profiles, newest first.
+    """
+    return {"profiles": list_profiles(PROFILING_DIR, limit)}
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    """Download a request profile.
+
+    Args:
+        name (str): The profile's file name, as listed by /debug/profiles.
+
+    Returns:
+        FileResponse: The profile file.
+
+    Raises:
+        HTTPException: If no profile with that name exists.
+    """
+    if name not in {profile["name"] for profile in list_profiles(PROFILING_DIR, PROFILING_MAX_FILES)}:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(PROFILING_DIR, name), media_type="text/plain", filename=name)
+
+def snapshot_not_found(snapshot_id):
+    raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} not found")
+
+KEY_TYPE_PATTERN = f"^({'|'.join(KEY_TYPES)})$"
+
+@router.get("/memory")
+def memory_status():
+    """Return whether allocation tracing is on and how much memory it sees.
+
+    Returns:
+        dict: Tracing state, traced and peak bytes, and tracemalloc's own overhead.
+    """
+    return memory_diagnostics.status()
+
+@router.post("/memory/start")
+def start_tracing(frames: int = Query(MEMORY_TRACE_FRAMES, ge=1, le=100)):
+    """Start tracing allocations.
+
+    Args:
+        frames (int): Traceback depth recorded per allocation; defaults to MEMORY_TRACE_FRAMES.
+
+    Returns:
+        dict: The tracing status.
+    """
+    return memory_diagnostics.start(frames)
+
+@router.post("/memory/stop")
+def stop_tracing():
+    """Stop tracing allocations; snapshots taken so far are kept.
+
+    Returns:
+        dict: The tracing status.
+    """
+    return memory_diagnostics.stop()
+
+@router.post("/memory/snapshots")
+def take_snapshot():
+    """Take a snapshot of the traced allocations.
+
+    Returns:
+        dict: The snapshot's ID, creation time and total traced size.
+
+    Raises:
+        HTTPException: If tracing has not been started.
+    """
+    try:
+        return memory_diagnostics.take_snapshot()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/memory/snapshots")
+def list_snapshots():
+    """List the kept snapshots, oldest first.
+
+    Returns:
+        dict: The snapshots.
+    """
+    return {"snapshots": memory_diagnostics.list_snapshots()}
+
+@router.get("/memory/snapshots/{snapshot_id}/top")
+def snapshot_top(
+    snapshot_id: int,
+    key_type: str = Query("lineno", pattern=KEY_TYPE_PATTERN),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Show the allocation sites holding the most memory in a snapshot.
+
+    Args:
+        snapshot_id (int): The snapshot ID.
+        key_type (str): Group allocations by "lineno", "filename" or "traceback".
+        limit (int): The maximum number of sites to return.
+
+    Returns:
+        dict: The allocation sites, largest first.
+    """
+    try:
+        return {"stats": memory_diagnostics.top(snapshot_id, key_type, limit)}
+    except KeyError:
+        snapshot_not_found(snapshot_id)
+
+@router.get("/memory/diff")
+def snapshot_diff(
+    base: int,
+    target: int,
+    key_type: str = Query("lineno", pattern=KEY_TYPE_PATTERN),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Show the allocation sites that changed most between two snapshots.
+
+    Args:
+        base (int): The earlier snapshot ID.
+        target (int): The later snapshot ID.
+        key_type (str): Group allocations by "lineno", "filename" or "traceback".
+        limit (int): The maximum number of sites to return.
+
+    Returns:
+        dict: The allocation sites with size and count differences, largest growth first.
+    """
+    try:
+        return {"stats": memory_diagnostics.diff(base, target, key_type, limit)}
+    except KeyError as e:
+        snapshot_not_found(e.args[0])
+
+@router.get("/memory/gc")
+def gc_stats():
+    """Return garbage collector statistics per generation.
+
+    Returns:
+        dict: Collector counts, thresholds, per-generation stats and uncollectable objects.
+    """
+    return memory_diagnostics.gc_stats()
+
+@router.get("/memory/objects")
+def object_counts(limit: int = Query(30, ge=1, le=500), prefix: Optional[str] = None):
+    """Count the live objects tracked by the garbage collector per type.
+
+    Args:
+        limit (int): The maximum number of types to return.
+        prefix (Optional[str]): Only count types whose qualified name starts with it.
+
+    Returns:
+        dict: Type names and object counts, most frequent first.
+    """
+    return {"objects": memory_diagnostics.object_counts(limit, prefix)}
+
+@router.get("/shards")
+def shard_status():
+    """Report the number of tasks, owners and archived tasks on every task shard.
+
+    Returns:
+        dict: The statistics keyed by shard name ("primary" without sharding) and the
+        number of owners pinned through the shard directory.
+    """
+    return {
+        "enabled": shard_router.enabled,
+        "ring": shard_router.ring.nodes if shard_router.enabled else [],
+        "pinned_owners": shard_router.pinned_owners() if shard_router.enabled else 0,
+        "shards": shard_router.stats(),
+    }
+
+@router.get("/tasks")
+def all_tasks(limit: int = Query(100, ge=1, le=1000)):
+    """List the tasks with the highest IDs across all users and shards.
+
+    Args:
+        limit (int): The maximum number of tasks to return.
+
+    Returns:
+        dict: The tasks, highest ID first.
+    """
+    return {"tasks": [row._asdict() for row in list_all_task_rows(limit)]}
+
+@router.get("/audit")
+def audit_events(
+    action: Optional[str] = None,
+    entity: Optional[str] = Query(None, pattern="^(task|user)$"),
+    entity_id: Optional[int] = None,
+    owner_id: Optional[int] = None,
+    actor_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Query the audit trail of user and task mutations.
+
+    Args:
+        action (Optional[str]): Only events of this action, e.g. "task.deleted".
+        entity (Optional[str]): Only events about tasks or users.
+        entity_id (Optional[int]): Only events about this task or user.
+        owner_id (Optional[int]): Only events about records of this user.
+        actor_id (Optional[int]): Only changes made by this user.
+        since (Optional[datetime]): Only events at or after this UTC time.
+        until (Optional[datetime]): Only events before this UTC time.
+        limit (int): The maximum number of events to return.
+
+    Returns:
+        dict: The matching events, newest first.
+    """
+    return {"events": audit_log.query(since=since, until=until, limit=limit, action=action, entity=entity,
+                                      entity_id=entity_id, owner_id=owner_id, actor_id=actor_id)}
+
+@router.get("/maintenance")
+def maintenance_status():
+    """Report when each database maintenance job last ran, how long it took and what it did.
+
+    Returns:
+        dict: The maintenance window, the current traffic and the status of every job.
+    """
+    return maintenance_scheduler.status()
+
+@router.post("/maintenance/{job}")
+def run_maintenance_job(job: str):
+    """Run a database maintenance job on every database now, ignoring its schedule.
+
+    Args:
+        job (str): The job name: "optimize", "analyze" or "vacuum".
+
+    Raises:
+        HTTPException: If there is no such job.
+
+    Returns:
+        dict: The job's status after the run.
+    """
+    if job not in maintenance_scheduler.jobs:
+        raise HTTPException(status_code=404, detail=f"Maintenance job {job} not found")
+    return maintenance_scheduler.run_job(job)
@@ -0,0 +1,25 @@
+"""
+This module defines the API route exposing in-process metrics.
+
+It includes routes for:
+- Reading a snapshot of all counters and gauges collected by the application.
+
+Usage:
+- The route is registered with the FastAPI application and returns the metrics as JSON.
+"""
+
+
+from fastapi.routing import APIRouter
+
+from logs.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+def read_metrics():
+    """Return a snapshot of all counters and gauges.
+
+    Returns:
+        dict: The metric values keyed by name.
+    """
+    return metrics.snapshot()
@@ -4,6 +4,8 @@ This module defines the API routes for managing tasks in the application.
 It includes routes for:
 - Retrieving all tasks for the current user.
 - Retrieving a specific task by its ID.
+- Retrieving the tasks changed and deleted since a delta-sync cursor.
+- Streaming task create, update and delete events via Server-Sent Events or WebSocket.
 - Creating a new task for the current user.
 - Updating an existing task for the current user.
 - Deleting a task for the current user.
@@ -20,22 +22,31 @@ Usage:
 """
 
 
+import asyncio
+
 from fastapi.routing import APIRouter
-from fastapi import Request, Form, Response
+from fastapi import Request, Form, Response, Header, Query, WebSocket, WebSocketDisconnect
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from typing import Optional
 
 from db.crud import (
-    authenticate_user, get_tasks_by_user, create_task, get_task_by_id, update_task, delete_task
+    authenticate_user, create_task, get_task_by_id, update_task, delete_task,
+    get_task_changes
 )
 from auth.jwt_gen import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
-from db.database import get_db
-from db.schemas import TaskCreate
+from db.database import get_db, get_read_db
+from db.idempotency import run_idempotent
+from db.rows import list_task_rows, list_task_projection, get_task_projection, parse_fields
+from db.events import task_events, format_sse, task_payload
+from auth.rate_limit import auth_rate_limit
+from db.schemas import StatusEnum, TaskCreate, TaskResponse
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from auth.user_auth import get_current_user
@@ -48,57 +59,180 @@ router = APIRouter()
 BASE_DIR = Path(__file__).resolve().parent.parent
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
+STREAM_HEARTBEAT_SECONDS = 15
+SYNC_MAX_LIMIT = 1000
+
 def task_not_found(task):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
 @router.get("/tasks")
-async def tasks(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def tasks(
+    request: Request,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
     """Retrieve all tasks for the current user.
 
     Args:
         request (Request): The incoming request.
-        db (Session): The database session.
+        fields (Optional[str]): Comma-separated ``TaskResponse`` fields to return as JSON.
+        db (Session): The read-only database session.
         current_user (User): The currently authenticated user.
 
     Returns:
-        TemplateResponse: Renders the 'tasks.html' template with user tasks.
+        TemplateResponse | list: Renders the 'tasks.html' template with user tasks, or
+        returns only the requested fields of every task when ``fields`` is given.
     """
-    data = get_tasks_by_user(db, current_user.id)
+    selected = parse_fields(fields, TaskResponse)
+    if selected:
+        return [row._asdict() for row in list_task_projection(db, current_user.id, selected)]
+    data = list_task_rows(db, current_user.id)
     task_not_found(data)
     return templates.TemplateResponse(request, 'tasks.html', {"data": data})
 
+@router.get("/tasks/changes")
+def task_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=SYNC_MAX_LIMIT),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Retrieve the tasks changed and deleted since a delta-sync cursor.
+
+    Clients start with ``since=0`` and pass the returned ``cursor`` on the next call.
+    While ``has_more`` is true, further pages are waiting.
+
+    Args:
+        since (int): The cursor returned by the previous sync.
+        limit (int): The maximum number of changes to return.
+        db (Session): The read-only database session.
+        current_user (User): The currently authenticated user.
+
+    Returns:
+        dict: The changed tasks, the IDs of deleted tasks, the new cursor and ``has_more``.
+    """
+    result = get_task_changes(db, current_user.id, since, limit)
+    result["changes"] = [task_payload(task) for task in result["changes"]]
+    return result
+
+@router.get("/tasks/stream")
+async def stream_tasks(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """Stream task events for the current user as Server-Sent Events.
+
+    Args:
+        request (Request): The incoming request.
+        db (Session): The read-only database session used for authentication.
+        current_user (User): The currently authenticated user.
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` of task events with periodic keepalives.
+    """
+    user_id = current_user.id
+    # The stream stays open for a long time; give the pooled connection back right away.
+    db.close()
+
+    async def event_stream():
+        with task_events.subscribe(user_id) as subscription:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.websocket("/tasks/ws")
+async def tasks_websocket(websocket: WebSocket, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """Push task events for the current user over a WebSocket.
+
+    Args:
+        websocket (WebSocket): The WebSocket connection.
+        db (Session): The read-only database session used for authentication.
+        current_user (User): The currently authenticated user.
+    """
+    user_id = current_user.id
+    db.close()
+    await websocket.accept()
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    with task_events.subscribe(user_id) as subscription:
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            while not disconnected.done():
+                next_event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event not in done:
+                    next_event.cancel()
+                    break
+                await websocket.send_json(next_event.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
+
 @router.get("/tasks/{task_id}", response_class=HTMLResponse)
-def get_task(request: Request, task_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_task(
+    request: Request,
+    task_id: int,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
     """Retrieve a specific task by its ID for the current user.
 
     Args:
         request (Request): The incoming request.
         task_id (int): The ID of the task to retrieve.
-        db (Session): The database session.
+        fields (Optional[str]): Comma-separated ``TaskResponse`` fields to return as JSON.
+        db (Session): The read-only database session.
         current_user (User): The currently authenticated user.
 
     Returns:
-        TemplateResponse: Renders the 'tasks.html' template with the specific task.
+        TemplateResponse | JSONResponse: Renders the 'tasks.html' template with the specific
+        task, or returns only the requested fields when ``fields`` is given.
     """
+    selected = parse_fields(fields, TaskResponse)
+    if selected:
+        row = get_task_projection(db, current_user.id, task_id, selected)
+        task_not_found(row)
+        return JSONResponse(content=jsonable_encoder(row._asdict()))
     data = get_task_by_id(db, current_user.id, task_id)
     task_not_found(data)
     return templates.TemplateResponse(request, 'tasks.html', {"data": data})
 
 @router.post("/tasks")
-def create_new_task(task: TaskCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_new_task(
+    task: TaskCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     """Create a new task for the current user.
 
+    Retries sent with the same ``Idempotency-Key`` header replay the first response
+    instead of creating another task.
+
     Args:
         task (TaskCreate): The task creation data.
+        idempotency_key (Optional[str]): The optional ``Idempotency-Key`` header.
         db (Session): The database session.
         current_user (User): The currently authenticated user.
 
     Returns:
         dict: A message indicating the success of task creation.
     """
-    task = create_task(db, task.description, current_user.id)
-    return {"task": task}
+    def create():
+        return {"task": create_task(db, task.description, current_user.id)}
+
+    return run_idempotent(idempotency_key, f"tasks:{current_user.id}", task, create)
 
 @router.put("/tasks/{task_id}")
 def update_existing_task(task: TaskCreate, task_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -116,7 +250,8 @@ def update_existing_task(task: TaskCreate, task_id: int, db: Session = Depends(g
     Returns:
         RedirectResponse: Redirects to the '/tasks' URL after updating the task.
     """
-    task = update_task(db, current_user.id, task_id, task.title, task.description, task.status)
+    task = update_task(db, current_user.id, task_id, task.title, task.description,
+                       task.status == StatusEnum.finished)
     task_not_found(task)
     return RedirectResponse(url='/tasks', status_code=303)
 
@@ -137,7 +272,7 @@ def delete_existing_task(request: Request, task_id: int, db: Session = Depends(g
     task_not_found(task)
     return RedirectResponse(url='/tasks', status_code=303)
 
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(auth_rate_limit)])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Authenticate a user and return an access token.
 
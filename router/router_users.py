@@ -5,6 +5,7 @@ It includes routes for:
 - Retrieving all users.
 - Retrieving a specific user by their ID.
 - Creating a new user or authenticating an existing user.
+- Logging out by revoking the current access token.
 - Updating user information.
 - Deleting a user by their ID.
 - Reading and setting cookies for session management.
@@ -26,15 +27,21 @@ from fastapi import Request, Form, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 
-from fastapi import Depends
+from fastapi import Depends, Header
+from typing import Optional
 
 from db.crud import (
-    authenticate_user, get_all_users, get_user_by_username,
+    authenticate_user, get_user_by_username,
     create_user, get_user_by_user_id,
     update_user, delete_user
 )
-from auth.jwt_gen import create_access_token
-from db.database import get_db
+from auth.jwt_gen import create_access_token, SECRET_KEY, ALGORITHM
+from auth.revocation import revocation_list
+from jose import JWTError, jwt
+from db.database import get_db, get_read_db
+from db.idempotency import run_idempotent
+from db.rows import list_user_rows, list_user_projection, get_user_projection, parse_fields
+from auth.rate_limit import auth_rate_limit
 from db.schemas import UserResponse, UserCreate
 from sqlalchemy.orm import Session 
 from fastapi import HTTPException, status  
@@ -53,71 +60,91 @@ def user_not_found(task):
         raise HTTPException(status_code=404, detail="User not found")
 
 @router.get("/users", response_class=HTMLResponse)
-def users(request: Request, db: Session = Depends(get_db)):
+def users(request: Request, fields: Optional[str] = None, db: Session = Depends(get_read_db)):
     """Retrieve all users.
 
     Args:
         request (Request): The incoming request.
-        db (Session): The database session.
+        fields (Optional[str]): Comma-separated ``UserResponse`` fields to return as JSON.
+        db (Session): The read-only database session.
 
     Returns:
-        TemplateResponse: Renders the 'index.html' template with user data.
+        TemplateResponse | JSONResponse: Renders the 'index.html' template with user data, or
+        returns only the requested fields of every user when ``fields`` is given.
     """
-    data = get_all_users(db)
+    selected = parse_fields(fields, UserResponse)
+    if selected:
+        return JSONResponse(content=[row._asdict() for row in list_user_projection(db, selected)])
+    data = list_user_rows(db)
     logger.info(f'data available {data}')
     return templates.TemplateResponse(request, 'index.html', {"data": data})
 
 @router.get("/users/{user_id}")
-def get_user(request: Request, user_id: int, db: Session = Depends(get_db)):
+def get_user(request: Request, user_id: int, fields: Optional[str] = None, db: Session = Depends(get_read_db)):
     """Retrieve a specific user by their ID.
 
     Args:
         request (Request): The incoming request.
         user_id (int): The ID of the user to retrieve.
-        db (Session): The database session.
+        fields (Optional[str]): Comma-separated ``UserResponse`` fields to return.
+        db (Session): The read-only database session.
 
     Returns:
-        User: The user data if found.
+        User | dict: The user data if found, restricted to the requested fields when
+        ``fields`` is given.
     """
+    selected = parse_fields(fields, UserResponse)
+    if selected:
+        row = get_user_projection(db, user_id, selected)
+        user_not_found(row)
+        return row._asdict()
     data = get_user_by_user_id(db, user_id)
     user_not_found(data)
     return data
 
-@router.post("/users")
+@router.post("/users", dependencies=[Depends(auth_rate_limit)])
 def register_user(
     response: Response,
     user: UserCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """Create a new user.
 
+    Retries sent with the same ``Idempotency-Key`` header replay the first response
+    without touching the database or hashing the password again.
+
     Args:
         response (Response): The response object.
         user (UserCreate): The user data for registration.
+        idempotency_key (Optional[str]): The optional ``Idempotency-Key`` header.
         db (Session): The database session.
 
     Returns:
         JSONResponse: A response containing a message and user data.
     """
-    try:
-        existing_user = get_user_by_username(db, user.username)
-        if existing_user:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists")
-        
-        new_user = create_user(db, user.username, user.password, user.email)
+    def register():
+        try:
+            existing_user = get_user_by_username(db, user.username)
+            if existing_user:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists")
+
+            new_user = create_user(db, user.username, user.password, user.email)
 
-        logger.info(f'User {new_user.username} created successfully.')
+            logger.info(f'User {new_user.username} created successfully.')
 
-        return JSONResponse(content={
-            "message": "User created successfully",
-            "user_data": UserResponse.from_orm(new_user).dict()
-        })
+            return JSONResponse(content={
+                "message": "User created successfully",
+                "user_data": UserResponse.from_orm(new_user).dict()
+            })
 
-    except Exception as e:
-        logger.error(f"User creation failed: {e}")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User creation failed")
+        except Exception as e:
+            logger.error(f"User creation failed: {e}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User creation failed")
 
-@router.post("/login")
+    return run_idempotent(idempotency_key, "users", user.model_dump(exclude={"password"}), register)
+
+@router.post("/login", dependencies=[Depends(auth_rate_limit)])
 def login_user(
     response: Response,
     user: UserCreate,
@@ -156,6 +183,38 @@ def login_user(
     )
     return response
 
+@router.post("/logout")
+def logout_user(access_token: str = Cookie(None)):
+    """Revoke the current access token and clear its cookie.
+
+    The token is rejected by every worker from now on, even though it has not expired.
+
+    Args:
+        access_token (str): The JWT access token provided via cookies.
+
+    Returns:
+        JSONResponse: A confirmation message, with the cookie removed.
+
+    Raises:
+        HTTPException: If the access token is missing or invalid.
+    """
+    if not access_token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token not found")
+    try:
+        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logger.info(f"Logout with an invalid token: {e}")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+    if payload.get("jti"):
+        revocation_list.revoke(payload["jti"], float(payload["exp"]))
+    else:
+        logger.warning(f"Token of {payload.get('sub')} has no jti and stays valid until it expires")
+
+    response = JSONResponse(content={"message": "Logout successful"})
+    response.delete_cookie(key="access_token", httponly=True, samesite="Lax")
+    return response
+
 @router.get("/read-cookie")
 def read_cookie(access_token: str = Cookie(None)):
     """Read the access token from the cookie.
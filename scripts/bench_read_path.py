@@ -0,0 +1,87 @@
+"""
+Benchmark of the task listing read path.
+
+Compares loading a user's tasks as ORM instances (``db.query(Task)...all()``) with the
+ORM-free read path in db/rows.py. For each variant it reports rows per second and the
+memory allocated per row while the result list is alive, measured with tracemalloc.
+
+The benchmark runs against a temporary SQLite file and never touches the application
+database.
+
+Usage:
+    python -m scripts.bench_read_path [--rows 20000] [--repeat 5]
+"""
+
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("SINGLEFLIGHT_ENABLED", "false")
+
+from db.database import Base
+from db.models import Task, User
+from db.rows import list_task_rows
+
+
+def orm_tasks(db, user_id):
+    return db.query(Task).filter(Task.owner_id == user_id).all()
+
+
+def row_tasks(db, user_id):
+    return list_task_rows(db, user_id)
+
+
+def measure(session_factory, load, user_id, repeat):
+    """Return the best rows/sec over ``repeat`` runs and the bytes allocated per row."""
+    best = 0.0
+    for _ in range(repeat):
+        with session_factory() as db:
+            start = time.perf_counter()
+            result = load(db, user_id)
+            elapsed = time.perf_counter() - start
+        best = max(best, len(result) / elapsed)
+        del result
+
+    gc.collect()
+    with session_factory() as db:
+        tracemalloc.start()
+        result = load(db, user_id)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        count = len(result)
+    return best, current / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(insert(User), [{"id": 1, "username": "bench", "email": "bench@example.com"}])
+            connection.execute(insert(Task), [
+                {"name": f"task {index}", "description": f"description {index}", "status": False, "owner_id": 1}
+                for index in range(args.rows)
+            ])
+        session_factory = sessionmaker(bind=engine)
+
+        print(f"{'variant':<8} {'rows/sec':>12} {'bytes/row':>10}")
+        for name, load in (("orm", orm_tasks), ("rows", row_tasks)):
+            rate, per_row = measure(session_factory, load, 1, args.repeat)
+            print(f"{name:<8} {rate:>12,.0f} {per_row:>10,.0f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Bulk user provisioning.
+
+Creates many users at once from a CSV file (with ``username,email,password`` columns) or an
+NDJSON file (one JSON object with the same keys per line), bypassing the request path:
+
+1. Every row is validated with the ``UserCreate`` schema; duplicates within the file are
+   rejected.
+2. Usernames and emails that already exist are found with a few set-based ``IN`` queries
+   instead of one lookup per row.
+3. Passwords are hashed in a process pool across all cores, with exactly the policy of the
+   running application (see auth/hashing.py).
+4. Users are inserted in batches of ``--batch-size`` rows, one transaction per batch. When
+   a batch fails (e.g. a user registered concurrently), its rows are retried one by one so
+   only the conflicting rows fail.
+
+Progress is reported on stderr, and rejected rows are written as NDJSON records with their
+line number and reason to ``--errors`` (stderr by default).
+
+Usage:
+    python -m scripts.provision_users users.csv [--workers 8] [--batch-size 1000] [--dry-run]
+"""
+
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from passlib.context import CryptContext
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from auth.hashing import pwd_context
+from db.database import SessionLocal
+from db.models import User
+from db.schemas import UserCreate
+from logs.logger import logger
+
+LOOKUP_CHUNK_SIZE = 500
+
+_worker_context: Optional[CryptContext] = None
+
+
+def _init_worker(context_config: str) -> None:
+    global _worker_context
+    _worker_context = CryptContext.from_string(context_config)
+
+
+def _hash_password(password: str) -> str:
+    return _worker_context.hash(password)
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield the line number and fields of every user in a CSV or NDJSON file.
+
+    Args:
+        path (str): The input file; ``.ndjson`` and ``.jsonl`` files are read as NDJSON.
+
+    Yields:
+        Tuple[int, Dict[str, str]]: The line number and the raw fields.
+    """
+    with open(path, newline="") as source:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line_number, line in enumerate(source, start=1):
+                if line.strip():
+                    try:
+                        fields = json.loads(line)
+                    except ValueError as e:
+                        yield line_number, {"_error": f"Invalid JSON: {e}"}
+                        continue
+                    if isinstance(fields, dict):
+                        yield line_number, fields
+                    else:
+                        yield line_number, {"_error": "Expected a JSON object"}
+        else:
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+
+
+class ProvisionReport:
+    """Outcome of a provisioning run.
+
+    Attributes:
+        total (int): Number of rows read.
+        created (int): Number of users inserted.
+        errors (List[Dict]): Line number, username and reason of every rejected row.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.errors: List[Dict] = []
+
+    def reject(self, line: int, username: Optional[str], reason: str) -> None:
+        self.errors.append({"line": line, "username": username, "error": reason})
+
+
+def _existing(db, column, values: List[str]) -> Set[str]:
+    found = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(db.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def provision_users(rows: Iterable[Tuple[int, Dict[str, str]]], session_factory: Callable = SessionLocal,
+                    workers: int = os.cpu_count() or 1, batch_size: int = 1000, dry_run: bool = False,
+                    context: CryptContext = pwd_context,
+                    progress: Callable[[str], None] = lambda message: None) -> ProvisionReport:
+    """Validate, hash and insert users in bulk.
+
+    Args:
+        rows (Iterable[Tuple[int, Dict[str, str]]]): Line numbers and raw user fields.
+        session_factory (Callable): Factory returning a new SQLAlchemy session.
+        workers (int): Number of hashing processes.
+        batch_size (int): Number of users inserted per transaction.
+        dry_run (bool): Only validate and check conflicts; insert nothing.
+        context (CryptContext): The hashing policy.
+        progress (Callable[[str], None]): Receives progress messages.
+
+    Returns:
+        ProvisionReport: Counts and the rejected rows.
+    """
+    report = ProvisionReport()
+    accepted: List[Tuple[int, UserCreate]] = []
+    seen_usernames, seen_emails = set(), set()
+    for line, fields in rows:
+        report.total += 1
+        username = fields.get("username")
+        if "_error" in fields:
+            report.reject(line, None, fields["_error"])
+            continue
+        try:
+            user = UserCreate(**fields)
+        except ValidationError as e:
+            report.reject(line, username, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                                                    for error in e.errors()))
+            continue
+        if user.username in seen_usernames or user.email in seen_emails:
+            report.reject(line, user.username, "Duplicate username or email in the input")
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        accepted.append((line, user))
+    progress(f"Validated {report.total} rows, {len(accepted)} accepted")
+
+    with session_factory() as db:
+        taken_usernames = _existing(db, User.username, [user.username for _, user in accepted])
+        taken_emails = _existing(db, User.email, [user.email for _, user in accepted])
+    new_users = []
+    for line, user in accepted:
+        if user.username in taken_usernames:
+            report.reject(line, user.username, "Username already exists")
+        elif user.email in taken_emails:
+            report.reject(line, user.username, "Email already exists")
+        else:
+            new_users.append((line, user))
+    progress(f"{len(new_users)} users to create after conflict checks")
+    if dry_run or not new_users:
+        return report
+
+    chunksize = max(1, min(64, len(new_users) // (workers * 4) or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(context.to_string(),)) as pool:
+        hashes = pool.map(_hash_password, [user.password for _, user in new_users], chunksize=chunksize)
+        batch = []
+        for (line, user), hashed_password in zip(new_users, hashes):
+            batch.append((line, {"username": user.username, "email": user.email, "hashed_password": hashed_password}))
+            if len(batch) >= batch_size:
+                _insert_batch(session_factory, batch, report)
+                progress(f"Created {report.created}/{len(new_users)} users")
+                batch = []
+        if batch:
+            _insert_batch(session_factory, batch, report)
+            progress(f"Created {report.created}/{len(new_users)} users")
+    return report
+
+
+def _insert_batch(session_factory: Callable, batch: List[Tuple[int, Dict[str, str]]], report: ProvisionReport) -> None:
+    with session_factory() as db:
+        try:
+            db.execute(insert(User), [values for _, values in batch])
+            db.commit()
+            report.created += len(batch)
+            return
+        except IntegrityError as e:
+            db.rollback()
+            logger.warning(f"Batch of {len(batch)} users conflicted, retrying one by one: {e.orig}")
+
+        for line, values in batch:
+            try:
+                db.execute(insert(User), [values])
+                db.commit()
+                report.created += 1
+            except IntegrityError as e:
+                db.rollback()
+                report.reject(line, values["username"], f"Conflict on insert: {e.orig}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create users in bulk from a CSV or NDJSON file.")
+    parser.add_argument("path", help="CSV file with username,email,password columns, or .ndjson/.jsonl file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="users inserted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="validate and check conflicts only")
+    parser.add_argument("--errors", help="write rejected rows as NDJSON to this file instead of stderr")
+    args = parser.parse_args()
+
+    def progress(message):
+        print(message, file=sys.stderr, flush=True)
+
+    report = provision_users(read_rows(args.path), workers=args.workers, batch_size=args.batch_size,
+                             dry_run=args.dry_run, progress=progress)
+
+    errors = open(args.errors, "w") if args.errors else sys.stderr
+    try:
+        for error in report.errors:
+            errors.write(json.dumps(error) + "\n")
+    finally:
+        if args.errors:
+            errors.close()
+    print(json.dumps({"total": report.total, "created": report.created, "rejected": len(report.errors)}))
+    sys.exit(1 if report.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
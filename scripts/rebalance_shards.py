@@ -0,0 +1,257 @@
+"""
+Online rebalancing of task shards.
+
+Moves the tasks of one owner, or of every owner the consistent-hash ring would place
+elsewhere, between the shards configured in ``TASK_SHARD_URLS`` while the application keeps
+serving requests (see db/sharding.py). A move runs in five steps:
+
+1. Bulk copy: the owner's tasks, tombstones and archived tasks are copied to the target in
+   batches of ``--batch-size`` rows, one short transaction each. Reads and writes continue
+   on the source shard meanwhile.
+2. Freeze: the owner's change counter on the source is frozen in one atomic update. From
+   then on, writes routed to the source are refused with 503 instead of being lost.
+3. Catch-up: the changes made during the bulk copy (tasks and tombstones whose change
+   sequence number is above the counter read before step 1, and tasks archived meanwhile)
+   are applied to the target, and the owner's counter is carried over.
+4. Switch: the owner is pinned to the target in the shard directory on the primary.
+5. Cleanup: once every worker has reloaded the directory, the owner's rows are deleted from
+   the source. The frozen counter row stays, so writes from stale routing keep failing.
+
+Adding a shard online:
+1. Deploy with the new shard in ``TASK_SHARD_URLS`` but not in ``TASK_SHARD_RING``.
+2. Run ``rebalance --ring`` with the new ring; owners it remaps are moved and pinned.
+3. Deploy with the new ``TASK_SHARD_RING``, then run ``compact`` to drop the pins that now
+   match the ring.
+
+Usage:
+    python -m scripts.rebalance_shards move OWNER_ID SHARD
+    python -m scripts.rebalance_shards rebalance --ring a,b,c [--dry-run]
+    python -m scripts.rebalance_shards compact
+"""
+
+
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from db.models import ShardAssignment, Task, TaskArchive, TaskTombstone, User
+from db.sharding import HashRing, ShardRouter, shard_router
+from logs.logger import logger
+
+tasks_table: Table = Task.__table__
+tombstones_table: Table = TaskTombstone.__table__
+archive_table: Table = TaskArchive.__table__
+
+
+def _copy(source: Session, target: Session, table: Table, condition, batch_size: int, keep_ids: bool = True) -> int:
+    copied, last_id = 0, 0
+    while True:
+        rows = source.execute(
+            select(table).where(condition & (table.c.id > last_id)).order_by(table.c.id).limit(batch_size)
+        ).mappings().all()
+        source.rollback()
+        if not rows:
+            return copied
+        values = [dict(row) for row in rows]
+        if keep_ids:
+            target.execute(delete(table).where(table.c.id.in_([row["id"] for row in values])))
+        else:
+            for row in values:
+                del row["id"]
+        target.execute(insert(table), values)
+        target.commit()
+        copied += len(values)
+        last_id = rows[-1]["id"]
+
+
+def _ids(db: Session, table: Table, owner_id: int) -> set:
+    ids = set(db.execute(select(table.c.id).where(table.c.owner_id == owner_id)).scalars())
+    db.rollback()
+    return ids
+
+
+def _counter(db: Session, owner_id: int) -> int:
+    value = db.execute(select(User.change_seq).where(User.id == owner_id)).scalar()
+    db.rollback()
+    if value is not None and value < 0:
+        raise RuntimeError(f"The counter of user {owner_id} is frozen; a previous move did not finish")
+    return value or 0
+
+
+def _freeze(db: Session, owner_id: int) -> int:
+    frozen = db.execute(
+        update(User).where((User.id == owner_id) & (User.change_seq >= 0))
+        .values(change_seq=-1 - User.change_seq).returning(User.change_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if frozen is None:
+        db.execute(insert(User).values(id=owner_id, change_seq=-1))
+        frozen = -1
+    db.commit()
+    return -1 - frozen
+
+
+def _set_counter(db: Session, owner_id: int, value: int) -> None:
+    updated = db.execute(
+        update(User).where(User.id == owner_id).values(change_seq=value).execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.execute(insert(User).values(id=owner_id, change_seq=value))
+    db.commit()
+
+
+def _purge(db: Session, table: Table, owner_id: int, batch_size: int) -> None:
+    while True:
+        ids = db.execute(select(table.c.id).where(table.c.owner_id == owner_id).limit(batch_size)).scalars().all()
+        if not ids:
+            return
+        db.execute(delete(table).where(table.c.id.in_(ids)))
+        db.commit()
+
+
+def move_owner(owner_id: int, target: str, router: ShardRouter = shard_router, batch_size: int = 500,
+               settle: Optional[float] = None, progress: Callable[[str], None] = lambda message: None) -> Dict[str, int]:
+    """Move an owner's tasks to another shard while the application keeps running.
+
+    Args:
+        owner_id (int): The ID of the task owner.
+        target (str): The name of the target shard.
+        router (ShardRouter): The shard router.
+        batch_size (int): Rows copied or deleted per transaction.
+        settle (Optional[float]): Seconds to wait between the switch and the cleanup, so every
+            worker reloads the directory. Defaults to the router's directory TTL plus one.
+        progress (Callable[[str], None]): Receives progress messages.
+
+    Raises:
+        ValueError: If the target shard does not exist.
+        RuntimeError: If the owner's counter is still frozen from an unfinished move.
+
+    Returns:
+        Dict[str, int]: The number of tasks, tombstones and archived tasks moved, and the
+        owner's change counter.
+    """
+    if target not in router.engines:
+        raise ValueError(f"Unknown shard {target!r}")
+    router.refresh_directory()
+    source = router.shard_for(owner_id)
+    if source == target:
+        return {"tasks": 0, "tombstones": 0, "archived": 0, "seq": 0}
+
+    with router.session(source) as src, router.session(target) as dst:
+        start_seq = _counter(src, owner_id)
+        owned = tasks_table.c.owner_id == owner_id
+        tasks = _copy(src, dst, tasks_table, owned, batch_size)
+        tombstones = _copy(src, dst, tombstones_table, (tombstones_table.c.owner_id == owner_id)
+              & (tombstones_table.c.seq <= start_seq), batch_size, keep_ids=False)
+        archived = _copy(src, dst, archive_table, archive_table.c.owner_id == owner_id, batch_size)
+        progress(f"Copied user {owner_id} from {source} to {target}, freezing")
+
+        final_seq = _freeze(src, owner_id)
+        _copy(src, dst, tasks_table, owned & (tasks_table.c.seq > start_seq), batch_size)
+        tombstones += _copy(src, dst, tombstones_table, (tombstones_table.c.owner_id == owner_id)
+                            & (tombstones_table.c.seq > start_seq), batch_size, keep_ids=False)
+        source_tasks = _ids(src, tasks_table, owner_id)
+        gone = _ids(dst, tasks_table, owner_id) - source_tasks
+        if gone:
+            dst.execute(delete(tasks_table).where(tasks_table.c.id.in_(gone)))
+            dst.commit()
+        missing = _ids(src, archive_table, owner_id) - _ids(dst, archive_table, owner_id)
+        if missing:
+            archived += _copy(src, dst, archive_table, archive_table.c.id.in_(missing), batch_size)
+        _set_counter(dst, owner_id, final_seq)
+
+        with router.session_factory() as db:
+            db.merge(ShardAssignment(owner_id=owner_id, shard=target))
+            db.commit()
+        router.refresh_directory()
+        progress(f"User {owner_id} now served by {target}, cleaning up {source}")
+
+        time.sleep(router.directory_ttl + 1 if settle is None else settle)
+        for table in (tasks_table, tombstones_table, archive_table):
+            _purge(src, table, owner_id, batch_size)
+
+    result = {"tasks": len(source_tasks), "tombstones": tombstones, "archived": archived, "seq": final_seq}
+    logger.info(f"Moved the tasks of user {owner_id} from shard {source} to {target}: {result}")
+    return result
+
+
+def plan_rebalance(ring: List[str], router: ShardRouter = shard_router) -> List[Tuple[int, str, str]]:
+    """List the owners whose shard differs from the one a new ring would pick.
+
+    Args:
+        ring (List[str]): The shard names of the new ring.
+        router (ShardRouter): The shard router.
+
+    Returns:
+        List[Tuple[int, str, str]]: Owner ID, current shard and new shard of every owner to move.
+    """
+    new_ring = HashRing(ring, router.vnodes)
+    router.refresh_directory()
+    with router.session_factory() as db:
+        owners = db.execute(select(User.id).order_by(User.id)).scalars().all()
+    moves = []
+    for owner_id in owners:
+        current, desired = router.shard_for(owner_id), new_ring.lookup(owner_id)
+        if current != desired:
+            moves.append((owner_id, current, desired))
+    return moves
+
+
+def compact_directory(router: ShardRouter = shard_router) -> int:
+    """Drop the directory entries that match the current ring.
+
+    Args:
+        router (ShardRouter): The shard router.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    with router.session_factory() as db:
+        assignments = db.execute(select(ShardAssignment.owner_id, ShardAssignment.shard)).all()
+        redundant = [owner_id for owner_id, shard in assignments if router.ring.lookup(owner_id) == shard]
+        if redundant:
+            db.execute(delete(ShardAssignment).where(ShardAssignment.owner_id.in_(redundant)))
+            db.commit()
+    router.refresh_directory()
+    return len(redundant)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move task owners between shards online.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move = commands.add_parser("move", help="move one owner to a shard")
+    move.add_argument("owner_id", type=int)
+    move.add_argument("shard")
+    rebalance = commands.add_parser("rebalance", help="move every owner a new ring places elsewhere")
+    rebalance.add_argument("--ring", required=True, help="comma-separated shard names of the new ring")
+    rebalance.add_argument("--dry-run", action="store_true", help="only list the moves")
+    commands.add_parser("compact", help="drop directory entries that match the current ring")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows copied per transaction")
+    args = parser.parse_args()
+
+    if not shard_router.enabled:
+        sys.exit("TASK_SHARD_URLS is not set")
+
+    def progress(message):
+        print(message, file=sys.stderr, flush=True)
+
+    if args.command == "move":
+        print(json.dumps(move_owner(args.owner_id, args.shard, batch_size=args.batch_size, progress=progress)))
+    elif args.command == "rebalance":
+        moves = plan_rebalance([name.strip() for name in args.ring.split(",") if name.strip()])
+        for owner_id, source, target in moves:
+            progress(f"user {owner_id}: {source} -> {target}")
+            if not args.dry_run:
+                move_owner(owner_id, target, batch_size=args.batch_size, progress=progress)
+        print(json.dumps({"moves": len(moves), "dry_run": args.dry_run}))
+    else:
+        print(json.dumps({"removed": compact_directory()}))
+
+
+if __name__ == "__main__":
+    main()
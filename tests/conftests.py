@@ -7,7 +7,7 @@ components are included:
 
 - A test database engine created using SQLAlchemy.
 - A session local for interacting with the test database.
-- An overridden dependency for FastAPI to use the test database session.
+- Overridden dependencies for FastAPI to use the test database session for reads and writes.
 - Creation of the database tables defined in the application's models.
 - A TestClient instance for making HTTP requests to the FastAPI app during tests.
 
@@ -21,7 +21,9 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app import app
-from db.database import Base, get_db
+from db.database import Base, get_db, get_read_db
+from auth.rate_limit import auth_rate_limit
+from db.cache import cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -35,9 +37,12 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 @pytest.fixture(scope="function")
 def client():
     Base.metadata.create_all(bind=engine)
+    auth_rate_limit.store.clear()
+    cache.clear()
     yield TestClient(app)
     Base.metadata.drop_all(bind=engine)
\ No newline at end of file
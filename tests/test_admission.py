@@ -0,0 +1,62 @@
+"""
+Test Module for Admission Control
+
+This module contains tests for the admission limiter and middleware. It covers:
+
+1. Classification of requests into route classes.
+2. Handing released slots to queued requests.
+3. Rejecting requests when the queue is full or the deadline passes.
+4. The 503 response with a Retry-After header.
+"""
+
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware.admission import AdmissionLimiter, AdmissionMiddleware, classify_request
+
+def test_classify_request():
+    assert classify_request("POST", "/login") == "auth"
+    assert classify_request("POST", "/users") == "auth"
+    assert classify_request("GET", "/users/1") == "read"
+    assert classify_request("PUT", "/tasks/1") == "write"
+
+def test_queued_request_gets_released_slot():
+    async def scenario():
+        limiter = AdmissionLimiter("test_queue", limit=1, max_queue=1, timeout=1)
+        assert await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert not await limiter.acquire()
+        limiter.release()
+        assert await waiting
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+def test_request_times_out_in_queue():
+    async def scenario():
+        limiter = AdmissionLimiter("test_timeout", limit=1, max_queue=5, timeout=0.01)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+def test_middleware_sheds_with_retry_after():
+    app = FastAPI()
+    limiters = {name: AdmissionLimiter(f"test_{name}", limit=0, max_queue=0) for name in ("auth", "read", "write")}
+    app.add_middleware(AdmissionMiddleware, limiters=limiters, retry_after=3, enabled=True)
+
+    @app.get("/tasks")
+    def tasks():
+        return {"tasks": []}
+
+    response = TestClient(app).get("/tasks")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
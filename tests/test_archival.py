@@ -0,0 +1,113 @@
+"""
+Test Module for Soft Delete and Archival
+
+This module contains tests for the task lifecycle. It covers:
+
+1. Hiding soft-deleted tasks from every read while keeping the delta-sync tombstone.
+2. Serving the owner's active tasks from the partial index.
+3. Moving old finished and deleted tasks to the archive in batches, tombstoning the
+   finished ones, and purging it.
+4. Never reusing the ID of an archived task.
+5. Storing the status sent to PUT /tasks/{task_id} as a boolean.
+"""
+
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from db.archival import archive_tasks, purge_archive
+from db.crud import create_task, delete_task, get_task_by_id, get_task_changes, get_tasks_by_user, update_task
+from db.database import Base
+from db.models import Task, TaskArchive, User
+from db.rows import TASK_ROWS_BY_OWNER, list_task_rows
+from tests.conftests import client
+
+def make_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with factory() as db:
+        db.add(User(id=1, username="archive_user", email="archive@example.com", hashed_password="x"))
+        db.commit()
+    return factory
+
+def test_deleted_tasks_are_hidden(tmp_path):
+    db = make_factory(tmp_path)()
+    kept = create_task(db, "kept", 1)
+    deleted = create_task(db, "deleted", 1)
+    delete_task(db, 1, deleted.id)
+
+    assert db.get(Task, deleted.id).deleted_at is not None
+    assert [task.id for task in get_tasks_by_user(db, 1)] == [kept.id]
+    assert [row.id for row in list_task_rows(db, 1)] == [kept.id]
+    assert not get_task_by_id(db, 1, deleted.id)
+    assert update_task(db, 1, deleted.id, "name", "description", True) is None
+    assert get_task_changes(db, 1, 0)["deleted"] == [deleted.id]
+
+def test_active_tasks_use_partial_index(tmp_path):
+    db = make_factory(tmp_path)()
+    compiled = TASK_ROWS_BY_OWNER.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"), {"owner_id": 1}).all()
+    assert "ix_tasks_owner_active" in " ".join(str(row) for row in plan)
+
+def test_archive_and_purge(tmp_path):
+    factory = make_factory(tmp_path)
+    old = datetime.utcnow() - timedelta(days=90)
+    with factory() as db:
+        db.add_all([
+            Task(id=1, description="active", owner_id=1, status=False, updated_at=old),
+            Task(id=2, description="old finished", owner_id=1, status=True, updated_at=old),
+            Task(id=3, description="old deleted", owner_id=1, status=False, updated_at=old, deleted_at=old),
+            Task(id=4, description="recent finished", owner_id=1, status=True),
+            Task(id=5, description="recent deleted", owner_id=1, deleted_at=datetime.utcnow()),
+        ])
+        db.commit()
+
+    cutoff = datetime.utcnow() - timedelta(days=30)
+    assert archive_tasks(factory, older_than=cutoff, batch_size=1, pause=0) == 2
+
+    with factory() as db:
+        assert db.execute(select(Task.id).order_by(Task.id)).scalars().all() == [1, 4, 5]
+        archived = db.execute(select(TaskArchive).order_by(TaskArchive.id)).scalars().all()
+        assert [(task.id, task.description) for task in archived] == [(2, "old finished"), (3, "old deleted")]
+        assert archived[1].deleted_at == old
+    with factory() as db:
+        assert get_task_changes(db, 1, 0)["deleted"] == [2]
+
+    assert purge_archive(factory, older_than=datetime.utcnow() - timedelta(days=1)) == 0
+    assert purge_archive(factory, older_than=datetime.utcnow() + timedelta(seconds=1), batch_size=1, pause=0) == 2
+    with factory() as db:
+        assert db.execute(select(func.count()).select_from(TaskArchive)).scalar() == 0
+
+def test_archived_ids_are_not_reused(tmp_path):
+    factory = make_factory(tmp_path)
+    old = datetime.utcnow() - timedelta(days=90)
+    cutoff = datetime.utcnow() - timedelta(days=30)
+    archived_ids = []
+    for _ in range(2):
+        with factory() as db:
+            task = create_task(db, "top task", 1)
+            archived_ids.append(task.id)
+            delete_task(db, 1, task.id)
+            db.get(Task, task.id).deleted_at = old
+            db.commit()
+        assert archive_tasks(factory, older_than=cutoff, pause=0) == 1
+
+    assert archived_ids[1] > archived_ids[0]
+    with factory() as db:
+        assert db.execute(select(TaskArchive.id).order_by(TaskArchive.id)).scalars().all() == archived_ids
+
+def test_update_stores_status_as_boolean(client):
+    user = {"username": "archive_route", "email": "archive_route@example.com", "password": "password123"}
+    client.post("/users", json=user)
+    login = client.post("/login", json=user)
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+    task = {"title": "title", "description": "finish me", "status": "in process"}
+    task_id = client.post("/tasks", json=task).json()["task"]["id"]
+
+    response = client.put(f"/tasks/{task_id}", json={**task, "status": "finished"}, follow_redirects=False)
+
+    assert response.status_code == 303
+    assert client.get(f"/tasks/{task_id}?fields=status").json() == {"status": True}
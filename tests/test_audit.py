@@ -0,0 +1,103 @@
+"""
+Test Module for the Audit Trail
+
+This module contains tests for the asynchronous audit log. It covers:
+
+1. Buffering events and flushing them by size, by interval, or at once.
+2. Keeping events buffered while the sink fails, dropping only what exceeds the buffer.
+3. Rotating compressed NDJSON files and querying them with filters.
+4. Writing events to the audit table and querying them through /debug/audit.
+"""
+
+
+import time
+from datetime import datetime, timedelta
+
+import auth.user_auth
+from db.audit import AuditLog, FileAuditSink
+from tests.conftests import client
+
+class RecordingSink:
+    """Stand-in sink keeping the written batches, optionally failing."""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def write(self, events):
+        if self.failing:
+            raise OSError("sink unavailable")
+        self.batches.append(events)
+
+def test_events_are_flushed_in_batches():
+    sink = RecordingSink()
+    log = AuditLog(sink, enabled=True, buffer_size=100, flush_size=3, flush_interval=60)
+    log.record("task.created", "task", 1, 7, actor_id=7, description="a")
+    log.record("task.created", "task", 2, 7, actor_id=7, description="b")
+    assert sink.batches == [] and log.buffered == 2
+
+    log.record("task.deleted", "task", 1, 7, actor_id=7)
+    assert [len(batch) for batch in sink.batches] == [3]
+    assert sink.batches[0][2]["action"] == "task.deleted"
+
+    log.flush_interval = 0.01
+    log.start()
+    try:
+        log.record("user.updated", "user", 7, 7, email="new@example.com")
+        deadline = time.monotonic() + 2
+        while len(sink.batches) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sink.batches[1][0]["details"] == {"email": "new@example.com"}
+    finally:
+        log.stop()
+
+    immediate = AuditLog(sink, enabled=True, flush_interval=0)
+    immediate.record("user.deleted", "user", 7, 7, username="gone")
+    assert sink.batches[-1][0]["action"] == "user.deleted"
+
+def test_failed_flushes_keep_events():
+    sink = RecordingSink()
+    sink.failing = True
+    log = AuditLog(sink, enabled=True, buffer_size=3, flush_size=100, flush_interval=60)
+    for task_id in range(4):
+        log.record("task.created", "task", task_id, 1)
+    assert log.buffered == 3
+
+    sink.failing = False
+    assert log.flush() == 3
+    assert [event["entity_id"] for event in sink.batches[0]] == [1, 2, 3]
+
+def test_file_sink_rotates_and_queries(tmp_path):
+    sink = FileAuditSink(str(tmp_path), max_bytes=1, backups=2)
+    log = AuditLog(sink, enabled=True, flush_interval=0)
+    for task_id in range(4):
+        log.record("task.updated", "task", task_id, task_id % 2, actor_id=task_id % 2, status=True)
+        time.sleep(0.001)
+
+    assert len(list(tmp_path.iterdir())) == 2
+    events = log.query(owner_id=1)
+    assert [event["entity_id"] for event in events] == [3]
+    assert [event["entity_id"] for event in log.query(limit=1)] == [3]
+    assert log.query(since=datetime.utcnow() + timedelta(seconds=1)) == []
+
+def test_audit_endpoint_lists_task_mutations(client, monkeypatch):
+    monkeypatch.setattr(auth.user_auth, "ADMIN_TOKEN", "secret")
+    started = datetime.utcnow().isoformat()
+    user = {"username": "audit_user", "email": "audit_user@example.com", "password": "password123"}
+    user_id = client.post("/users", json=user).json()["user_data"]["id"]
+    login = client.post("/login", json=user)
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+    task = {"title": "title", "description": "audited", "status": "in process"}
+    task_id = client.post("/tasks", json=task).json()["task"]["id"]
+    client.delete(f"/tasks/{task_id}")
+
+    admin = {"X-Admin-Token": "secret"}
+    response = client.get(f"/debug/audit?entity=task&owner_id={user_id}&since={started}", headers=admin)
+
+    assert response.status_code == 200
+    events = response.json()["events"]
+    assert [event["action"] for event in events] == ["task.deleted", "task.created"]
+    assert events[1]["details"] == {"description": "audited"}
+    assert events[1]["actor_id"] == user_id
+    user_events = client.get(f"/debug/audit?entity=user&entity_id={user_id}&since={started}", headers=admin)
+    assert [event["action"] for event in user_events.json()["events"]] == ["user.created"]
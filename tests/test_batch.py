@@ -0,0 +1,143 @@
+"""
+Test Module for Batch Requests
+
+This module contains tests for the POST /batch route. It covers:
+
+1. Returning the response of every sub-request in order, failures included, and running
+   the writes after a failed one on a clean session.
+2. Committing a transactional batch whose requests all succeed.
+3. Rolling back a transactional batch and skipping the requests after a failure.
+4. Rejecting oversized batches, nested batches and idempotency keys in transactions.
+5. Rejecting rate-limited routes in transactions when the limiter stores its buckets in SQL.
+6. Authenticating a transactional batch before it holds the writer connection.
+"""
+
+
+import time
+
+import pytest
+
+from app import app
+from auth.rate_limit import SQLBucketStore, auth_rate_limit
+from auth.revocation import revocation_list
+from db import database
+from db.database import get_db, get_read_db
+from tests.conftests import client
+
+TASK = {"title": "batched", "description": "batched task", "status": "in process"}
+
+def login(client, username):
+    user = {"username": username, "email": f"{username}@example.com", "password": "password123"}
+    client.post("/users", json=user)
+    response = client.post("/login", json=user)
+    client.cookies.set("access_token", response.cookies.get("access_token"))
+
+@pytest.fixture
+def real_sessions(monkeypatch):
+    # The transaction is driven by the application's own session dependencies.
+    monkeypatch.delitem(app.dependency_overrides, get_db)
+    monkeypatch.delitem(app.dependency_overrides, get_read_db)
+
+def task_ids(client):
+    response = client.get("/tasks?fields=id")
+    return [task["id"] for task in response.json()]
+
+def test_independent_batch(client):
+    login(client, "batch_user")
+    response = client.post("/batch", json={"requests": [
+        {"method": "POST", "path": "/tasks", "body": TASK},
+        {"method": "GET", "path": "/tasks?fields=description"},
+        {"method": "GET", "path": "/tasks/999999?fields=id"},
+        {"method": "GET", "path": "/users?fields=username"},
+    ]})
+
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [sub["status"] for sub in responses] == [200, 200, 404, 200]
+    assert responses[0]["body"]["task"]["description"] == "batched task"
+    assert responses[1]["body"] == [{"description": "batched task"}]
+    assert {"username": "batch_user"} in responses[3]["body"]
+    assert "committed" not in response.json()
+
+def test_failed_write_does_not_break_later_writes(client, real_sessions):
+    taken = {"username": "batch_taken", "email": "batch_taken@example.com", "password": "password123"}
+    client.post("/users", json=taken)
+    user = {"username": "batch_renamer", "email": "batch_renamer@example.com", "password": "password123"}
+    user_id = client.post("/users", json=user).json()["user_data"]["id"]
+    client.cookies.set("access_token", client.post("/login", json=user).cookies.get("access_token"))
+
+    response = client.post("/batch", json={"requests": [
+        {"method": "PUT", "path": f"/users/{user_id}", "body": taken},
+        {"method": "POST", "path": "/tasks", "body": TASK},
+    ]})
+
+    assert [item["status"] for item in response.json()["responses"]] == [500, 200]
+    assert len(task_ids(client)) == 1
+
+def test_transactional_batch_commits(client, real_sessions):
+    login(client, "batch_commit")
+    response = client.post("/batch", json={"transaction": True, "requests": [
+        {"method": "POST", "path": "/tasks", "body": TASK},
+        {"method": "POST", "path": "/tasks", "body": TASK},
+        {"method": "GET", "path": "/tasks?fields=id"},
+    ]})
+
+    body = response.json()
+    assert body["committed"] is True
+    assert [sub["status"] for sub in body["responses"]] == [200, 200, 200]
+    assert len(body["responses"][2]["body"]) == 2
+    assert len(task_ids(client)) == 2
+
+def test_transactional_batch_rolls_back(client, real_sessions):
+    login(client, "batch_rollback")
+    response = client.post("/batch", json={"transaction": True, "requests": [
+        {"method": "POST", "path": "/tasks", "body": TASK},
+        {"method": "PUT", "path": "/tasks/999999", "body": TASK},
+        {"method": "POST", "path": "/tasks", "body": TASK},
+    ]})
+
+    body = response.json()
+    assert body["committed"] is False
+    assert [sub["status"] for sub in body["responses"]] == [200, 404, 424]
+    assert task_ids(client) == []
+
+def test_invalid_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr("router.router_batch.BATCH_MAX_REQUESTS", 2)
+    get = {"method": "GET", "path": "/tasks"}
+    assert client.post("/batch", json={"requests": [get, get, get]}).status_code == 400
+    assert client.post("/batch", json={"requests": [{"method": "POST", "path": "/batch"}]}).status_code == 400
+    keyed = {"method": "POST", "path": "/tasks", "body": TASK, "headers": {"Idempotency-Key": "k"}}
+    assert client.post("/batch", json={"transaction": True, "requests": [keyed]}).status_code == 400
+
+def test_rate_limited_routes_need_an_independent_batch(client, monkeypatch):
+    monkeypatch.setattr(auth_rate_limit, "store", SQLBucketStore())
+    user = {"username": "batch_signup", "email": "batch_signup@example.com", "password": "password123"}
+    signup = {"method": "POST", "path": "/users", "body": user}
+
+    response = client.post("/batch", json={"transaction": True, "requests": [signup]})
+    assert response.status_code == 400
+    assert "rate-limited" in response.json()["detail"]
+    response = client.post("/batch", json={"requests": [signup]})
+    assert [item["status"] for item in response.json()["responses"]] == [200]
+
+def test_transactional_batch_authenticates_before_taking_the_writer(client, real_sessions, monkeypatch):
+    login(client, "batch_prune")
+    writer = database.writer_engine or database.engine
+    refresh = revocation_list.refresh
+    checked_out = []
+
+    def recording_refresh():
+        checked_out.append(writer.pool.checkedout())
+        refresh()
+
+    monkeypatch.setattr(revocation_list, "refresh", recording_refresh)
+    monkeypatch.setattr(revocation_list, "_next_refresh", 0)
+    monkeypatch.setattr(revocation_list, "_next_reload", 0)
+    started = time.monotonic()
+    response = client.post("/batch", json={"transaction": True, "requests": [
+        {"method": "POST", "path": "/tasks", "body": TASK},
+    ]})
+
+    assert response.json()["committed"] is True
+    assert time.monotonic() - started < 2
+    assert checked_out == [0]
@@ -0,0 +1,80 @@
+"""
+Test Module for Group-Commit Batching
+
+This module contains tests for batched task creation. It covers:
+
+1. Inserting concurrent tasks in fewer transactions than tasks.
+2. Returning each caller its own row.
+3. Failing only the caller whose row cannot be inserted.
+"""
+
+
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from db.batching import TaskBatcher
+from db.database import Base
+from db.models import Task
+
+def make_sessionmaker(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+def test_concurrent_creates_share_commits(tmp_path):
+    engine, Session = make_sessionmaker(tmp_path)
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(1))
+    batcher = TaskBatcher(enabled=True, max_batch_size=5, max_wait_ms=200)
+
+    results = []
+    barrier = threading.Barrier(10)
+
+    def create(index):
+        with Session() as db:
+            barrier.wait()
+            results.append(batcher.submit(db, f"task {index}", 1))
+
+    threads = [threading.Thread(target=create, args=(index,)) for index in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(task.description for task in results) == sorted(f"task {index}" for index in range(10))
+    assert len({task.id for task in results}) == 10
+    assert len(commits) < 10
+    with Session() as db:
+        assert db.query(Task).count() == 10
+
+def test_failed_row_only_fails_its_caller(tmp_path):
+    engine, Session = make_sessionmaker(tmp_path)
+    batcher = TaskBatcher(enabled=True, max_batch_size=2, max_wait_ms=200)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def reject_bad_rows(connection, cursor, statement, parameters, context, executemany):
+        if "INSERT INTO tasks" in statement and "bad" in str(parameters):
+            raise ValueError("bad row")
+        return statement, parameters
+
+    outcomes = {}
+    barrier = threading.Barrier(2)
+
+    def create(description):
+        with Session() as db:
+            barrier.wait()
+            try:
+                outcomes[description] = batcher.submit(db, description, 1).id
+            except Exception as e:
+                outcomes[description] = e
+
+    threads = [threading.Thread(target=create, args=(description,)) for description in ("good", "bad")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert isinstance(outcomes["good"], int)
+    assert isinstance(outcomes["bad"], Exception)
@@ -0,0 +1,152 @@
+"""
+Test Module for the Shared Cache
+
+This module contains tests for the cache backends and invalidation. It covers:
+
+1. Evicting the least recently used and expired entries of the memory backend.
+2. Sharing entries and namespace invalidations between workers through a SQLite file.
+3. Storing entries in a stand-in for the networked key-value backend.
+4. Broadcasting deletions to the memory backends of other workers, with latency metrics.
+5. Serving authenticated requests from the user cache and dropping it on user updates.
+6. Holding back the invalidations of a transactional batch until it commits.
+"""
+
+
+import time
+
+from app import app
+from db.cache import Cache, MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend, cache
+from db.crud import get_cached_user, update_user, user_cache
+from db.database import get_db, get_read_db
+from logs.metrics import metrics
+from tests.conftests import TestingSessionLocal, client
+
+class SharedBroker:
+    """Stand-in for a cross-worker broker: every started cache receives every message."""
+
+    def __init__(self):
+        self.dispatchers = []
+
+    def start(self, dispatch):
+        self.dispatchers.append(dispatch)
+
+    def publish(self, message):
+        for dispatch in self.dispatchers:
+            dispatch(message)
+
+class FakeRedis:
+    """Stand-in for a Redis client keeping keys in a dictionary."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        return None if expires_at is not None and expires_at <= time.monotonic() else value
+
+    def set(self, key, value, px=None):
+        self.data[key] = (value, time.monotonic() + px / 1000 if px else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = (str(value).encode(), None)
+        return value
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip("*"))]
+
+def test_memory_backend_evicts_lru_and_expired_entries():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.incr("generation")
+    backend.set("a", b"1", None)
+    backend.set("b", b"2", None)
+    backend.get("a")
+    backend.set("c", b"3", None)
+    backend.set("short", b"4", 0.01)
+    time.sleep(0.02)
+
+    assert backend.get("a") is None and backend.get("b") is None
+    assert backend.get("c") == b"3" and backend.get("short") is None
+    assert backend.get("generation") == 1
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = Cache(SQLiteCacheBackend(path), broker=SharedBroker()).namespace("items", ttl=60)
+    second = Cache(SQLiteCacheBackend(path), broker=SharedBroker()).namespace("items", ttl=60)
+
+    first.set(1, {"name": "one"})
+    first.set(2, {"name": "two"}, ttl=0.01)
+    time.sleep(0.02)
+    assert second.get(1) == {"name": "one"}
+    assert second.get(2) is None
+
+    second.invalidate()
+    assert first.get(1) is None
+    assert Cache(SQLiteCacheBackend(path), broker=SharedBroker()).namespace("items", version=2).get(1) is None
+
+def test_redis_backend_with_stand_in():
+    client = FakeRedis()
+    items = Cache(RedisCacheBackend(client=client), broker=SharedBroker()).namespace("items")
+
+    assert items.get_or_set("a", lambda: [1, 2]) == [1, 2]
+    assert items.get_or_set("a", lambda: [3]) == [1, 2]
+    assert list(client.data) == ["cache:items:1:0:a"]
+    items.delete("a")
+    assert items.get("a") is None
+
+def test_deletions_are_broadcast_to_memory_backends():
+    broker = SharedBroker()
+    workers = [Cache(MemoryCacheBackend(), broker=broker).namespace("items") for _ in range(2)]
+    for worker in workers:
+        worker.set("a", "value")
+        worker.set("b", "value")
+    calls = metrics.get("cache.memory.get.calls")
+
+    workers[0].delete("a")
+    assert [worker.get("a") for worker in workers] == [None, None]
+    assert workers[1].get("b") == "value"
+    workers[1].invalidate()
+    assert [worker.get("b") for worker in workers] == [None, None]
+
+    assert metrics.get("cache.memory.get.calls") > calls
+    assert metrics.get("cache.memory.get.ms") > 0
+
+def test_user_lookups_are_cached(client):
+    user = {"username": "cache_user", "email": "cache_user@example.com", "password": "password123"}
+    user_id = client.post("/users", json=user).json()["user_data"]["id"]
+    login = client.post("/login", json=user)
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+
+    assert client.get("/tasks?fields=id").status_code == 200
+    assert user_cache.get("cache_user")["id"] == user_id
+    hits = metrics.get("cache.users.hits")
+    assert client.get("/tasks?fields=id").status_code == 200
+    assert metrics.get("cache.users.hits") == hits + 1
+
+    with TestingSessionLocal() as db:
+        update_user(db, user_id, "renamed@example.com", "cache_user")
+        assert user_cache.get("cache_user") is None
+        assert get_cached_user(db, "cache_user").email == "renamed@example.com"
+
+def test_batch_invalidations_wait_for_the_commit(client, monkeypatch):
+    monkeypatch.delitem(app.dependency_overrides, get_db)
+    monkeypatch.delitem(app.dependency_overrides, get_read_db)
+    user = {"username": "cache_batch", "email": "cache_batch@example.com", "password": "password123"}
+    user_id = client.post("/users", json=user).json()["user_data"]["id"]
+    client.cookies.set("access_token", client.post("/login", json=user).cookies.get("access_token"))
+    client.get("/tasks?fields=id")
+    update = {"method": "PUT", "path": f"/users/{user_id}", "body": {**user, "email": "batch_new@example.com"}}
+    failing = {"method": "PUT", "path": "/tasks/999999", "body": {"title": "t", "description": "d", "status": "finished"}}
+
+    with cache.deferred() as invalidations:
+        user_cache.delete("cache_batch")
+    assert len(invalidations) == 1
+
+    assert client.post("/batch", json={"transaction": True, "requests": [update, failing]}).json()["committed"] is False
+    assert user_cache.get("cache_batch")["email"] == "cache_batch@example.com"
+    assert client.post("/batch", json={"transaction": True, "requests": [update]}).json()["committed"] is True
+    assert user_cache.get("cache_batch") is None
@@ -0,0 +1,76 @@
+"""
+Test Module for Response Compression
+
+This module contains tests for the compression middleware. It covers:
+
+1. Encoding negotiation from the Accept-Encoding header.
+2. Compression of buffered responses above the minimum size, and passthrough below it.
+3. Incremental compression of streaming responses.
+4. Reuse of cached compressed variants.
+"""
+
+
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from middleware.compression import CompressedVariantCache, CompressionMiddleware, negotiate_encoding
+
+LARGE_BODY = "task description " * 200
+
+def make_client(cache):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse(LARGE_BODY)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((LARGE_BODY for _ in range(3)), media_type="text/plain")
+
+    return TestClient(app)
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert negotiate_encoding("gzip;q=0.5, br", ("br", "gzip")) == "br"
+    assert negotiate_encoding("br;q=0, gzip;q=0", ("br", "gzip")) is None
+    assert negotiate_encoding("*", ("br", "gzip")) == "br"
+    assert negotiate_encoding("", ("br", "gzip")) is None
+
+def test_compresses_large_and_skips_small_responses():
+    client = make_client(CompressedVariantCache())
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == LARGE_BODY
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
+
+def test_compresses_streaming_responses():
+    client = make_client(CompressedVariantCache())
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw).decode() == LARGE_BODY * 3
+
+def test_reuses_compressed_variants():
+    cache = CompressedVariantCache()
+    client = make_client(cache)
+
+    client.get("/large", headers={"Accept-Encoding": "gzip"})
+    client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert len(cache) == 1
+    assert cache.hits == 1
@@ -0,0 +1,90 @@
+"""
+Test Module for the SQLite Performance Profile
+
+This module contains tests for the SQLite engine setup in db/database.py. It covers:
+
+1. Applying WAL journaling and the configured pragmas to new connections.
+2. Routing flushes to the writer engine while reads use the read pool, and keeping a
+   transaction that wrote on the writer.
+3. Round-robin replica selection that skips failed replicas.
+4. The read-your-writes window and read-only sessions.
+"""
+
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from db.database import (
+    Base, ReadSessionLocal, ReadYourWrites, ReplicaSet, RoutingSession,
+    create_replica_engine, create_sqlite_engines, is_file_sqlite
+)
+from db.models import User
+
+def test_is_file_sqlite():
+    assert is_file_sqlite("sqlite:///./test.db")
+    assert not is_file_sqlite("sqlite://")
+    assert not is_file_sqlite("postgresql://user:password@db/dbname")
+
+def test_pragmas_are_applied(tmp_path):
+    read_engine, writer_engine = create_sqlite_engines(f"sqlite:///{tmp_path / 'tuned.db'}")
+    with read_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert connection.execute(text("PRAGMA temp_store")).scalar() == 2
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    assert writer_engine.pool.size() == 1
+
+def test_flushes_use_the_writer_engine(tmp_path):
+    read_engine, writer_engine = create_sqlite_engines(f"sqlite:///{tmp_path / 'routed.db'}")
+    Base.metadata.create_all(bind=writer_engine)
+    Session = sessionmaker(class_=RoutingSession, bind=read_engine, info={"writer": writer_engine})
+
+    statements = []
+    event.listen(writer_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with Session() as db:
+        assert db.get_bind() is read_engine
+        db.add(User(username="writer", email="w@example.com", hashed_password="x"))
+        db.commit()
+        assert db.query(User).filter(User.username == "writer").one().email == "w@example.com"
+
+    assert any(statement.startswith("INSERT INTO users") for statement in statements)
+    assert not any(statement.startswith("SELECT") for statement in statements)
+
+    with Session() as db:
+        db.add(User(username="pending", email="p@example.com", hashed_password="x"))
+        db.flush()
+        assert db.execute(text("SELECT email FROM users WHERE username = 'pending'")).scalar() == "p@example.com"
+        assert db.get_bind() is writer_engine
+        db.rollback()
+        assert db.get_bind() is read_engine
+
+def test_replica_set_round_robin_skips_failed_replicas(tmp_path):
+    first = create_replica_engine(f"sqlite:///{tmp_path / 'replica1.db'}")
+    second = create_replica_engine(f"sqlite:///{tmp_path / 'replica2.db'}")
+    replica_set = ReplicaSet([first, second], retry_after=60)
+
+    assert [replica_set.choose() for _ in range(4)] == [first, second, first, second]
+
+    replica_set.mark_down(first)
+    assert [replica_set.choose() for _ in range(2)] == [second, second]
+
+    replica_set.mark_down(second)
+    assert replica_set.choose() is None
+
+def test_read_your_writes_window():
+    tracker = ReadYourWrites(window=60)
+    assert not tracker.is_pinned(["ip:1.2.3.4"])
+    tracker.pin(["ip:1.2.3.4", "token:abc"])
+    assert tracker.is_pinned(["token:abc"])
+    assert not tracker.is_pinned(["ip:5.6.7.8"])
+
+def test_read_only_sessions_reject_writes(tmp_path):
+    replica = create_replica_engine(f"sqlite:///{tmp_path / 'readonly.db'}")
+    Base.metadata.create_all(bind=replica)
+
+    with ReadSessionLocal(bind=replica) as db:
+        db.add(User(username="reader", email="r@example.com", hashed_password="x"))
+        with pytest.raises(RuntimeError):
+            db.flush()
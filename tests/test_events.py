@@ -0,0 +1,82 @@
+"""
+Test Module for the Live Task Feed
+
+This module contains tests for task event fan-out and the WebSocket feed. It covers:
+
+1. Delivering events published from another thread to a user's subscribers.
+2. Replacing the backlog of a slow subscriber with a resync event.
+3. Delivering events across buses through a shared stand-in broker.
+4. Pushing task creation events over the WebSocket route.
+"""
+
+
+import asyncio
+import threading
+
+from db.events import TaskEventBus
+from db.schemas import StatusEnum
+from tests.conftests import client
+
+class SharedBroker:
+    """Stand-in for a cross-worker broker: every started bus receives every message."""
+
+    def __init__(self):
+        self.dispatchers = []
+
+    def start(self, dispatch):
+        self.dispatchers.append(dispatch)
+
+    def publish(self, message):
+        for dispatch in self.dispatchers:
+            dispatch(message)
+
+def test_events_reach_only_the_owners_subscribers():
+    async def scenario():
+        bus = TaskEventBus()
+        with bus.subscribe(1) as mine, bus.subscribe(2) as other:
+            publisher = threading.Thread(target=bus.publish, args=(1, "task.created", {"id": 7}))
+            publisher.start()
+            event = await asyncio.wait_for(mine.get(), 1)
+            publisher.join()
+            assert event["type"] == "task.created"
+            assert event["task"] == {"id": 7}
+            assert other.queue.empty()
+        assert bus.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+def test_slow_subscriber_gets_resync():
+    async def scenario():
+        bus = TaskEventBus()
+        with bus.subscribe(1, maxsize=2) as subscription:
+            for task_id in range(3):
+                bus.publish(1, "task.deleted", task_id=task_id)
+            await asyncio.sleep(0)
+            assert await subscription.get() == {"type": "resync"}
+            assert subscription.queue.empty()
+
+    asyncio.run(scenario())
+
+def test_shared_broker_delivers_across_buses():
+    async def scenario():
+        broker = SharedBroker()
+        worker_a, worker_b = TaskEventBus(broker), TaskEventBus(broker)
+        with worker_b.subscribe(1) as subscription:
+            worker_a.publish(1, "task.updated", {"id": 3})
+            event = await asyncio.wait_for(subscription.get(), 1)
+            assert event["task"]["id"] == 3
+
+    asyncio.run(scenario())
+
+def test_websocket_pushes_created_tasks(client):
+    client.post("/users", json={"username": "feed_user", "email": "feed@example.com", "password": "password123"})
+    login = client.post("/login", json={"username": "feed_user", "email": "feed@example.com", "password": "password123"})
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+
+    with client.websocket_connect("/tasks/ws") as websocket:
+        client.post("/tasks", json={"title": "live", "description": "pushed", "status": StatusEnum.in_process.value})
+        event = websocket.receive_json()
+
+    client.cookies.clear()
+    assert event["type"] == "task.created"
+    assert event["task"]["description"] == "pushed"
@@ -0,0 +1,63 @@
+"""
+Test Module for Sparse Fieldsets
+
+This module contains tests for the ``fields`` query parameter. It covers:
+
+1. Validating requested fields against the response schemas.
+2. Selecting only the requested columns from the database.
+3. Returning the projected tasks and users from the read endpoints.
+"""
+
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from db.rows import get_task_projection, parse_fields
+from db.schemas import StatusEnum, TaskResponse, UserResponse
+from tests.conftests import TestingSessionLocal, client, engine
+
+def login(client, username):
+    payload = {"username": username, "email": f"{username}@example.com", "password": "password123"}
+    client.post("/users", json=payload)
+    client.cookies.set("access_token", client.post("/login", json=payload).cookies.get("access_token"))
+
+def test_parse_fields_validates_against_schema():
+    assert parse_fields(None, TaskResponse) is None
+    assert parse_fields("status, id", TaskResponse) == ("id", "status")
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("id,hashed_password", UserResponse)
+    assert exc.value.status_code == 400
+    assert "hashed_password" in exc.value.detail
+
+def test_projection_selects_only_requested_columns(client):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        with TestingSessionLocal() as db:
+            assert get_task_projection(db, 1, 1, ("id", "status")) is None
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    select_clause = statements[-1].split("FROM")[0]
+    assert "tasks.id" in select_clause and "tasks.status" in select_clause
+    assert "description" not in select_clause
+
+def test_task_and_user_endpoints_return_requested_fields(client):
+    login(client, "fields_user")
+    client.post("/tasks", json={"title": "t", "description": "long text", "status": StatusEnum.in_process.value})
+
+    tasks = client.get("/tasks", params={"fields": "id,status"}).json()
+    task_id = tasks[0]["id"]
+    single = client.get(f"/tasks/{task_id}", params={"fields": "description,updated_at"}).json()
+    users = client.get("/users", params={"fields": "username"}).json()
+    user = client.get(f"/users/{1}", params={"fields": "id,email"})
+    unknown = client.get("/tasks", params={"fields": "owner"})
+    client.cookies.clear()
+
+    assert tasks == [{"id": task_id, "status": None}]
+    assert single["description"] == "long text" and set(single) == {"description", "updated_at"}
+    assert users == [{"username": "fields_user"}]
+    assert user.json() == {"id": 1, "email": "fields_user@example.com"}
+    assert unknown.status_code == 400
@@ -0,0 +1,42 @@
+"""
+Test Module for the Password Hashing Policy
+
+This module contains tests for the shared hashing policy. It covers:
+
+1. Calibrating bcrypt rounds within their bounds.
+2. Flagging hashes below the current cost for update.
+3. Rehashing a weak stored hash on login.
+"""
+
+
+from passlib.hash import bcrypt
+
+from auth.hashing import build_password_context, calibrate_bcrypt_rounds, pwd_context
+from db.crud import authenticate_user, create_user
+from tests.conftests import TestingSessionLocal, client
+
+def test_calibrated_rounds_stay_within_bounds():
+    assert calibrate_bcrypt_rounds(target_ms=0.001, min_rounds=10, max_rounds=16) == 10
+    assert calibrate_bcrypt_rounds(target_ms=10 ** 9, min_rounds=10, max_rounds=16) == 16
+    assert 10 <= calibrate_bcrypt_rounds(target_ms=250) <= 16
+
+def test_weaker_hashes_need_update():
+    context = build_password_context("bcrypt")
+    current = context.hash("password123")
+    weaker = bcrypt.using(rounds=4).hash("password123")
+
+    assert not context.needs_update(current)
+    assert context.needs_update(weaker)
+    assert context.verify("password123", weaker)
+
+def test_login_rehashes_weak_hash(client):
+    with TestingSessionLocal() as db:
+        user = create_user(db, "rehash_user", "password123", "rehash@example.com")
+        user.hashed_password = bcrypt.using(rounds=4).hash("password123")
+        db.commit()
+
+        assert authenticate_user(db, "rehash_user", "password123") is not None
+        db.refresh(user)
+
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert pwd_context.verify("password123", user.hashed_password)
@@ -0,0 +1,52 @@
+"""
+Test Module for Idempotency-Key Support
+
+This module contains tests for the idempotency store and the create endpoints. It covers:
+
+1. Replaying the stored response for a repeated key.
+2. Rejecting a key reused with a different payload.
+3. Rejecting a retry while the first attempt is still in flight.
+4. LRU eviction of the in-memory store.
+"""
+
+
+import pytest
+from fastapi import HTTPException
+
+from db.idempotency import MemoryIdempotencyStore, StoredResponse
+from tests.conftests import client
+
+def test_memory_store_replays_and_validates_payload():
+    store = MemoryIdempotencyStore(max_entries=10, ttl=60)
+
+    assert store.reserve("users:abc", "fp1") is None
+    with pytest.raises(HTTPException) as exc:
+        store.reserve("users:abc", "fp1")
+    assert exc.value.status_code == 409
+
+    store.complete("users:abc", StoredResponse(200, {"id": 1}))
+    assert store.reserve("users:abc", "fp1") == StoredResponse(200, {"id": 1})
+
+    with pytest.raises(HTTPException) as exc:
+        store.reserve("users:abc", "fp2")
+    assert exc.value.status_code == 422
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryIdempotencyStore(max_entries=2, ttl=60)
+    for key in ("a", "b", "c"):
+        store.reserve(key, "fp")
+        store.complete(key, StoredResponse(200, {}))
+    assert len(store) == 2
+    assert store.reserve("a", "fp") is None
+
+def test_register_user_replays_with_same_key(client):
+    payload = {"username": "idem_user", "email": "idem@example.com", "password": "password123"}
+    headers = {"Idempotency-Key": "register-idem-user"}
+
+    first = client.post("/users", json=payload, headers=headers)
+    second = client.post("/users", json=payload, headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
@@ -0,0 +1,84 @@
+"""
+Test Module for Database Maintenance
+
+This module contains tests for the database maintenance scheduler. It covers:
+
+1. Reclaiming the space of deleted rows with a full or incremental VACUUM.
+2. Postponing due jobs outside the maintenance window or under traffic.
+3. Reporting and running jobs through /debug/maintenance.
+"""
+
+
+import os
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+import auth.user_auth
+from db.database import create_sqlite_engines
+from db.maintenance import MaintenanceScheduler, default_jobs, in_window
+from tests.conftests import client
+
+def fill_and_delete(engine, first_id):
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, body TEXT)")
+        connection.exec_driver_sql("INSERT INTO items (body) SELECT hex(randomblob(500)) FROM "
+                                   "(WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+                                   "WHERE i < 2000) SELECT i FROM n)")
+        connection.exec_driver_sql(f"DELETE FROM items WHERE id > {first_id}")
+
+def test_vacuum_and_analyze_reclaim_space(tmp_path):
+    path = tmp_path / "app.db"
+    _, writer = create_sqlite_engines(f"sqlite:///{path}")
+    scheduler = MaintenanceScheduler(targets=lambda: [("primary", writer)], enabled=False, window="")
+    fill_and_delete(writer, 100)
+
+    status = scheduler.run_job("vacuum")
+    assert status["last_status"] == "ok" and status["last_duration_ms"] > 0
+    assert status["last_details"]["primary"]["mode"] == "full"
+    assert status["last_details"]["primary"]["freed_bytes"] > 500_000
+    assert os.path.getsize(path) < 500_000
+    assert scheduler.run_job("vacuum")["last_details"]["primary"] == {"mode": "incremental", "freed_bytes": 0}
+
+    fill_and_delete(writer, 100)
+    details = scheduler.run_job("vacuum")["last_details"]["primary"]
+    assert details["mode"] == "incremental" and details["freed_bytes"] > 500_000
+
+    assert scheduler.run_job("analyze")["last_status"] == "ok"
+    with writer.connect() as connection:
+        assert connection.exec_driver_sql("SELECT tbl FROM sqlite_stat1").scalars().all() == ["items"]
+
+def test_due_jobs_wait_for_window_and_quiet_traffic(tmp_path):
+    assert in_window("22:00-04:00", datetime(2024, 1, 1, 23, 30))
+    assert not in_window("22:00-04:00", datetime(2024, 1, 1, 12, 0))
+    assert in_window("02:00-05:00", datetime(2024, 1, 1, 2, 0)) and in_window("", datetime(2024, 1, 1, 12, 0))
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    traffic = {"active": 5}
+    outside_window = "00:00-00:00"
+    jobs = default_jobs()
+    for job in jobs:
+        job.period = 0
+    scheduler = MaintenanceScheduler(jobs, targets=lambda: [("primary", engine)], enabled=False,
+                                     window=outside_window, max_active=2, traffic=lambda: traffic["active"])
+
+    assert scheduler.run_due() == []
+    traffic["active"] = 0
+    assert scheduler.run_due() == ["optimize"]
+    scheduler.window = ""
+    assert scheduler.run_due() == ["optimize", "analyze", "vacuum"]
+    assert scheduler.status()["jobs"]["analyze"]["last_run"] is not None
+
+def test_maintenance_endpoints(client, monkeypatch):
+    monkeypatch.setattr(auth.user_auth, "ADMIN_TOKEN", "secret")
+    admin = {"X-Admin-Token": "secret"}
+
+    response = client.post("/debug/maintenance/optimize", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["last_details"]["primary"] == {}
+
+    status = client.get("/debug/maintenance", headers=admin).json()
+    assert set(status["jobs"]) == {"optimize", "analyze", "vacuum"}
+    assert status["jobs"]["optimize"]["last_status"] == "ok"
+    assert status["jobs"]["optimize"]["last_duration_ms"] is not None
+    assert client.post("/debug/maintenance/reindex", headers=admin).status_code == 404
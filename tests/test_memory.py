@@ -0,0 +1,65 @@
+"""
+Test Module for Memory Diagnostics
+
+This module contains tests for the tracemalloc diagnostics. It covers:
+
+1. Diffing two snapshots to find a growing allocation site.
+2. Dropping the oldest snapshots beyond the limit.
+3. Serving tracing control, snapshots, gc stats and object counts behind the admin token.
+"""
+
+
+import tracemalloc
+
+import auth.user_auth
+from logs.memory import MemoryDiagnostics
+from tests.conftests import client
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+def test_diff_shows_growing_allocation_site():
+    diagnostics = MemoryDiagnostics()
+    diagnostics.start(frames=5)
+    try:
+        base = diagnostics.take_snapshot()["id"]
+        leak = [bytearray(1024) for _ in range(200)]
+        target = diagnostics.take_snapshot()["id"]
+    finally:
+        diagnostics.stop()
+
+    growth = diagnostics.diff(base, target)
+    assert growth[0]["size_diff"] >= 200 * 1024
+    assert "test_memory.py" in growth[0]["location"][0]
+    assert diagnostics.top(target, "filename", limit=3)
+    del leak
+
+def test_oldest_snapshots_are_dropped():
+    diagnostics = MemoryDiagnostics(max_snapshots=2)
+    diagnostics.start(frames=1)
+    try:
+        ids = [diagnostics.take_snapshot()["id"] for _ in range(3)]
+    finally:
+        diagnostics.stop()
+
+    assert [snapshot["id"] for snapshot in diagnostics.list_snapshots()] == ids[1:]
+
+def test_memory_routes(client, monkeypatch):
+    assert client.post("/debug/memory/start").status_code == 404
+    monkeypatch.setattr(auth.user_auth, "ADMIN_TOKEN", "secret")
+
+    assert client.post("/debug/memory/snapshots", headers=ADMIN).status_code == 409
+    try:
+        assert client.post("/debug/memory/start", headers=ADMIN, params={"frames": 3}).json()["tracing"]
+        first = client.post("/debug/memory/snapshots", headers=ADMIN).json()["id"]
+        second = client.post("/debug/memory/snapshots", headers=ADMIN).json()["id"]
+    finally:
+        client.post("/debug/memory/stop", headers=ADMIN)
+    assert not tracemalloc.is_tracing()
+
+    assert client.get(f"/debug/memory/snapshots/{first}/top", headers=ADMIN).status_code == 200
+    assert client.get("/debug/memory/diff", headers=ADMIN, params={"base": first, "target": second}).status_code == 200
+    assert client.get("/debug/memory/diff", headers=ADMIN, params={"base": first, "target": 999}).status_code == 404
+    assert client.get("/debug/memory/snapshots/1/top", headers=ADMIN, params={"key_type": "bogus"}).status_code == 422
+    assert len(client.get("/debug/memory/gc", headers=ADMIN).json()["generations"]) == 3
+    objects = client.get("/debug/memory/objects", headers=ADMIN, params={"prefix": "builtins.", "limit": 5}).json()
+    assert all(entry["type"].startswith("builtins.") for entry in objects["objects"])
@@ -0,0 +1,72 @@
+"""
+Test Module for Request Profiling
+
+This module contains tests for the profiling middleware and the diagnostics routes. It covers:
+
+1. Accepting only authentic, unexpired profiling tokens.
+2. Writing sampled and cProfile profiles for selected requests only.
+3. Keeping only the newest profiles.
+4. Protecting the profile listing with the admin token.
+"""
+
+
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import auth.user_auth
+from middleware.profiling import ProfilingMiddleware, list_profiles, sign_profile_token, verify_profile_token
+from tests.conftests import client
+
+def make_app(tmp_path, **options):
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, enabled=True, directory=str(tmp_path), interval=0.001, **options)
+    return TestClient(app)
+
+def test_profile_tokens():
+    assert verify_profile_token(sign_profile_token())
+    assert not verify_profile_token(sign_profile_token(ttl_seconds=-10))
+    expires, _, signature = sign_profile_token().partition(".")
+    assert not verify_profile_token(f"{int(expires) + 60}.{signature}")
+    assert not verify_profile_token("garbage")
+
+def test_sampled_profile_is_written_for_signed_requests(tmp_path):
+    test_client = make_app(tmp_path, mode="sample")
+
+    assert "X-Profile-Id" not in test_client.get("/slow").headers
+    response = test_client.get("/slow", headers={"X-Profile-Token": sign_profile_token()})
+
+    name = response.headers["X-Profile-Id"]
+    assert name.endswith(".collapsed")
+    with open(os.path.join(tmp_path, name)) as profile:
+        lines = profile.read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("slow (test_profiling.py" in line for line in lines)
+
+def test_cprofile_mode_and_retention(tmp_path):
+    test_client = make_app(tmp_path, mode="cprofile", sample_rate=1.0, max_files=2)
+
+    names = [test_client.get("/slow").headers["X-Profile-Id"] for _ in range(3)]
+
+    assert all(name.endswith(".prof") for name in names)
+    assert len(list_profiles(str(tmp_path))) == 2
+
+def test_profile_listing_requires_admin_token(client, monkeypatch):
+    assert client.get("/debug/profiles").status_code == 404
+
+    monkeypatch.setattr(auth.user_auth, "ADMIN_TOKEN", "secret")
+    assert client.get("/debug/profiles").status_code == 403
+    assert client.get("/debug/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/debug/profiles", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "profiles" in response.json()
@@ -0,0 +1,81 @@
+"""
+Test Module for Bulk User Provisioning
+
+This module contains tests for the provisioning command. It covers:
+
+1. Reading CSV and NDJSON input.
+2. Rejecting invalid rows, duplicates within the file and existing users.
+3. Hashing in worker processes and inserting in batches.
+"""
+
+
+import json
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base
+from db.models import User
+from scripts.provision_users import provision_users, read_rows
+
+FAST_CONTEXT = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4)
+
+def make_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'provision.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def test_read_rows_from_csv_and_ndjson(tmp_path):
+    csv_path = tmp_path / "users.csv"
+    csv_path.write_text("username,email,password\nann,ann@example.com,password123\n")
+    ndjson_path = tmp_path / "users.ndjson"
+    ndjson_path.write_text(json.dumps({"username": "bob", "email": "bob@example.com", "password": "x"}) + "\n\n{broken\n[1, 2]\n\"x\"\nnull\n")
+
+    assert list(read_rows(str(csv_path))) == [(2, {"username": "ann", "email": "ann@example.com", "password": "password123"})]
+    rows = list(read_rows(str(ndjson_path)))
+    assert rows[0] == (1, {"username": "bob", "email": "bob@example.com", "password": "x"})
+    assert rows[1][0] == 3 and "_error" in rows[1][1]
+    assert rows[2:] == [(line, {"_error": "Expected a JSON object"}) for line in (4, 5, 6)]
+
+def test_provision_users_reports_conflicts_and_inserts_in_batches(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    with session_factory() as db:
+        db.add(User(username="taken", email="taken@example.com", hashed_password="x"))
+        db.commit()
+
+    rows = [(index + 2, {"username": f"user{index}", "email": f"user{index}@example.com", "password": "password123"})
+            for index in range(5)]
+    rows += [
+        (10, {"username": "user0", "email": "other@example.com", "password": "password123"}),
+        (11, {"username": "taken", "email": "new@example.com", "password": "password123"}),
+        (12, {"username": "fresh", "email": "taken@example.com", "password": "password123"}),
+        (13, {"username": "short", "email": "short@example.com", "password": "short"}),
+    ]
+    messages = []
+
+    report = provision_users(rows, session_factory, workers=2, batch_size=2, context=FAST_CONTEXT,
+                             progress=messages.append)
+
+    assert (report.total, report.created) == (9, 5)
+    assert {error["line"]: error["error"].split(":")[0] for error in report.errors} == {
+        10: "Duplicate username or email in the input",
+        11: "Username already exists",
+        12: "Email already exists",
+        13: "password",
+    }
+    assert "Created 5/5 users" in messages
+    with session_factory() as db:
+        user = db.query(User).filter(User.username == "user3").one()
+        assert FAST_CONTEXT.verify("password123", user.hashed_password)
+        assert db.query(User).count() == 6
+
+def test_dry_run_inserts_nothing(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    rows = [(2, {"username": "dry", "email": "dry@example.com", "password": "password123"})]
+
+    report = provision_users(rows, session_factory, workers=1, dry_run=True, context=FAST_CONTEXT)
+
+    assert (report.total, report.created, report.errors) == (1, 0, [])
+    with session_factory() as db:
+        assert db.query(User).count() == 0
@@ -0,0 +1,114 @@
+"""
+Test Module for Rate Limiting
+
+This module contains tests for the token bucket rate limiter. It covers:
+
+1. Allowing a burst and refilling tokens over time.
+2. Evicting idle buckets.
+3. Retrying when another worker creates the same SQL bucket, and sweeping SQL buckets by
+   their own rule.
+4. Rejecting requests with 429 before the route handler runs.
+"""
+
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from auth.rate_limit import MemoryBucketStore, RateLimiter, RateLimitRule, SQLBucketStore
+from db.database import Base
+from db.models import RateLimitBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = MemoryBucketStore(sweep_interval=1000, clock=clock)
+    rule = RateLimitRule(burst=2, per_minute=60)
+
+    assert store.hit("ip:1", rule) == 0
+    assert store.hit("ip:1", rule) == 0
+    assert store.hit("ip:1", rule) > 0
+
+    clock.now += 1.0
+    assert store.hit("ip:1", rule) == 0
+
+def test_idle_buckets_are_evicted():
+    clock = FakeClock()
+    store = MemoryBucketStore(sweep_interval=10, clock=clock)
+    rule = RateLimitRule(burst=2, per_minute=60)
+
+    store.hit("ip:1", rule)
+    store.hit("ip:2", rule)
+    assert len(store) == 2
+
+    clock.now += 10
+    store.hit("ip:3", rule)
+    assert len(store) == 1
+
+def test_sql_store_handles_concurrent_inserts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'buckets.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    clock = FakeClock()
+    store = SQLBucketStore(factory, sweep_interval=1000, clock=clock)
+    rule = RateLimitRule(burst=2, per_minute=60)
+
+    raced = []
+
+    def other_worker_inserts_first(session, flush_context, instances):
+        if not raced:
+            raced.append(True)
+            with factory() as other:
+                other.add(RateLimitBucket(key="ip:1", tokens=1.0, updated_at=clock.now, full_at=clock.now + 1))
+                other.commit()
+
+    event.listen(factory, "before_flush", other_worker_inserts_first)
+    assert store.hit("ip:1", rule) == 0
+    assert store.hit("ip:1", rule) > 0
+    assert raced == [True]
+
+def test_sql_store_sweeps_each_bucket_by_its_rule(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'buckets.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    clock = FakeClock()
+    store = SQLBucketStore(factory, sweep_interval=10, clock=clock)
+
+    store.hit("fast", RateLimitRule(burst=2, per_minute=60))
+    store.hit("slow", RateLimitRule(burst=2, per_minute=1))
+    clock.now += 10
+    store.hit("other", RateLimitRule(burst=2, per_minute=60))
+
+    with factory() as db:
+        assert sorted(bucket.key for bucket in db.query(RateLimitBucket)) == ["other", "slow"]
+
+def test_rejected_requests_skip_the_handler():
+    limiter = RateLimiter(
+        "test",
+        store=MemoryBucketStore(),
+        ip_rule=RateLimitRule(burst=10, per_minute=1),
+        user_rule=RateLimitRule(burst=1, per_minute=1),
+    )
+    calls = []
+    app = FastAPI()
+
+    @app.post("/login", dependencies=[Depends(limiter)])
+    def login(payload: dict):
+        calls.append(payload)
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.post("/login", json={"username": "alice"}).status_code == 200
+    response = client.post("/login", json={"username": "Alice"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.post("/login", json={"username": "bob"}).status_code == 200
+    assert len(calls) == 2
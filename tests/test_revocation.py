@@ -0,0 +1,136 @@
+"""
+Test Module for Token Revocation
+
+This module contains tests for the revoked token deny list. It covers:
+
+1. The Bloom filter never missing an added item.
+2. Propagating revocations to other workers through incremental refreshes, including rows
+   committed out of ID order.
+3. Dropping expired entries on the read-only full reload, deleting their rows apart, and
+   refreshing again after a failed reload.
+4. Rejecting a token after logout.
+"""
+
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from auth.revocation import BloomFilter, RevocationList
+from db.database import Base
+from db.models import RevokedToken
+from tests.conftests import client
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'revocation.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for index in range(1000):
+        bloom.add(f"jti-{index}")
+
+    assert all(f"jti-{index}" in bloom for index in range(1000))
+    false_positives = sum(f"other-{index}" in bloom for index in range(10000))
+    assert false_positives < 300
+
+def test_revocations_reach_other_workers(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    clock = FakeClock()
+    worker_a = RevocationList(session_factory, refresh_interval=1, clock=clock)
+    worker_b = RevocationList(session_factory, refresh_interval=1, clock=clock)
+    assert not worker_b.is_revoked("abc")
+
+    worker_a.revoke("abc", expires_at=2000)
+    assert worker_a.is_revoked("abc")
+    assert not worker_b.is_revoked("abc")
+
+    clock.now += 1
+    assert worker_b.is_revoked("abc")
+    assert not worker_b.is_revoked("def")
+    assert not worker_b.is_revoked(None)
+
+def test_rows_committed_out_of_id_order_are_loaded(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    clock = FakeClock()
+    revocations = RevocationList(session_factory, refresh_interval=1, prune_interval=60, clock=clock, overlap=10)
+
+    def commit_row(row_id, jti):
+        with session_factory() as db:
+            db.add(RevokedToken(id=row_id, jti=jti, expires_at=5000))
+            db.commit()
+        clock.now += 1
+
+    commit_row(50, "committed first")
+    assert revocations.is_revoked("committed first")
+    commit_row(45, "in the overlap")
+    assert revocations.is_revoked("in the overlap")
+    commit_row(20, "below the overlap")
+    assert not revocations.is_revoked("below the overlap")
+
+    clock.now += 60
+    assert revocations.is_revoked("below the overlap")
+
+def test_expired_entries_are_pruned(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    clock = FakeClock()
+    revocations = RevocationList(session_factory, refresh_interval=1, prune_interval=60, clock=clock)
+    revocations.revoke("short", expires_at=1030)
+    revocations.revoke("long", expires_at=5000)
+
+    statements = []
+    engine = session_factory.kw["bind"]
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    clock.now += 61
+    revocations.refresh()
+
+    assert len(revocations) == 1
+    assert not revocations.is_revoked("short")
+    assert revocations.is_revoked("long")
+    assert all(statement.startswith("SELECT") for statement in statements)
+
+    assert revocations.purge_expired() == 1
+    with session_factory() as db:
+        assert [row.jti for row in db.query(RevokedToken)] == ["long"]
+
+def test_failed_reload_does_not_hold_back_refreshes(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    clock = FakeClock()
+    failing = []
+
+    def flaky_factory():
+        if failing:
+            failing.pop()
+            raise RuntimeError("database is locked")
+        return session_factory()
+
+    revocations = RevocationList(flaky_factory, refresh_interval=1, prune_interval=60, clock=clock)
+    RevocationList(session_factory, clock=clock).revoke("other worker", expires_at=5000)
+    clock.now += 61
+    failing.append(True)
+    assert not revocations.is_revoked("other worker")
+
+    clock.now += 1
+    assert revocations.is_revoked("other worker")
+
+def test_logout_revokes_token(client):
+    client.post("/users", json={"username": "logout_user", "email": "logout@example.com", "password": "password123"})
+    login = client.post("/login", json={"username": "logout_user", "email": "logout@example.com", "password": "password123"})
+    token = login.cookies.get("access_token")
+    client.cookies.set("access_token", token)
+    assert client.get("/tasks/changes").status_code == 200
+
+    assert client.post("/logout").status_code == 200
+    client.cookies.set("access_token", token)
+    response = client.get("/tasks/changes")
+    client.cookies.clear()
+
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
@@ -0,0 +1,49 @@
+"""
+Test Module for the ORM-Free Read Path
+
+This module contains tests for the compact row listings. It covers:
+
+1. Returning only the owner's tasks as TaskRow tuples.
+2. Leaving password hashes out of user rows.
+3. Rendering the task listing from rows.
+"""
+
+
+from db.crud import create_task, create_user
+from db.rows import TaskRow, UserRow, list_task_rows, list_user_rows
+from db.schemas import StatusEnum
+from tests.conftests import TestingSessionLocal, client
+
+def test_task_rows_are_compact_tuples(client):
+    with TestingSessionLocal() as db:
+        owner = create_user(db, "rows_owner", "password123", "owner@example.com")
+        other = create_user(db, "rows_other", "password123", "other@example.com")
+        create_task(db, "mine", owner.id)
+        create_task(db, "theirs", other.id)
+
+        rows = list_task_rows(db, owner.id)
+
+    assert [row.description for row in rows] == ["mine"]
+    assert isinstance(rows[0], TaskRow)
+    assert not hasattr(rows[0], "__dict__")
+    assert rows[0]._asdict()["owner_id"] == owner.id
+
+def test_user_rows_exclude_password_hash(client):
+    with TestingSessionLocal() as db:
+        create_user(db, "rows_user", "password123", "rows@example.com")
+        rows = list_user_rows(db)
+
+    assert rows == [UserRow(rows[0].id, "rows_user", "rows@example.com")]
+    assert "hashed_password" not in UserRow._fields
+
+def test_task_listing_renders_rows(client):
+    client.post("/users", json={"username": "rows_page", "email": "page@example.com", "password": "password123"})
+    login = client.post("/login", json={"username": "rows_page", "email": "page@example.com", "password": "password123"})
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+    client.post("/tasks", json={"title": "row", "description": "rendered from a row", "status": StatusEnum.in_process.value})
+
+    response = client.get("/tasks")
+    client.cookies.clear()
+
+    assert response.status_code == 200
+    assert "rendered from a row" in response.text
@@ -0,0 +1,129 @@
+"""
+Test Module for Task Sharding
+
+This module contains tests for spreading tasks across shards by owner. It covers:
+
+1. Remapping only a proportional share of owners when a shard is added to the ring.
+2. Routing task reads and writes to the owner's shard, with IDs unique across shards.
+3. Listing the most recent tasks of all shards with a scatter-gather query.
+4. Moving an owner to another shard, keeping IDs and the delta-sync counter, and refusing
+   writes routed to the old shard.
+5. Carrying over deletions made while an owner's tasks are being copied.
+"""
+
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import db.rows
+import db.sharding
+from db.crud import create_task, delete_task, get_task_by_id, get_task_changes, get_tasks_by_user, update_task
+from db.database import Base, RoutingSession
+from db.models import Task, User
+from db.rows import list_all_task_rows
+from db.sharding import HashRing, OwnerMovingError, ShardRouter
+from scripts.rebalance_shards import compact_directory, move_owner, plan_rebalance
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    Base.metadata.create_all(bind=engine)
+    primary = sessionmaker(bind=engine, class_=RoutingSession, autoflush=False)
+    with primary() as session:
+        session.add_all([User(id=owner_id, username=f"shard_user{owner_id}", email=f"shard{owner_id}@example.com",
+                              hashed_password="x") for owner_id in range(1, 21)])
+        session.commit()
+    urls = {name: f"sqlite:///{tmp_path / f'shard_{name}.db'}" for name in ("a", "b")}
+    shard_router = ShardRouter(urls, directory_ttl=0, id_block_size=3, session_factory=primary)
+    monkeypatch.setattr(db.sharding, "shard_router", shard_router)
+    monkeypatch.setattr(db.rows, "shard_router", shard_router)
+    shard_router.primary = primary
+    return shard_router
+
+def owners_on(router, name):
+    return [owner_id for owner_id in range(1, 21) if router.shard_for(owner_id) == name]
+
+def test_ring_remaps_a_proportional_share():
+    keys = range(10000)
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [key for key in keys if before.lookup(key) != after.lookup(key)]
+
+    assert 0.15 < len(moved) / len(keys) < 0.35
+    assert all(after.lookup(key) == "d" for key in moved)
+
+def test_tasks_are_routed_to_the_owner_shard(router):
+    owner_a, owner_b = owners_on(router, "a")[0], owners_on(router, "b")[0]
+    with router.primary() as session:
+        tasks = [create_task(session, f"task {n}", owner) for n in range(4) for owner in (owner_a, owner_b)]
+        ids = [task.id for task in tasks]
+
+        assert len(set(ids)) == len(ids)
+        assert [task.description for task in get_tasks_by_user(session, owner_a)] == [f"task {n}" for n in range(4)]
+        assert get_task_by_id(session, owner_b, tasks[1].id).owner_id == owner_b
+        assert not get_task_by_id(session, owner_a, tasks[1].id)
+        assert session.execute(select(Task)).first() is None
+
+    with router.session("a") as shard_a, router.session("b") as shard_b:
+        assert {task.owner_id for task in shard_a.execute(select(Task)).scalars()} == {owner_a}
+        assert {task.owner_id for task in shard_b.execute(select(Task)).scalars()} == {owner_b}
+        assert shard_a.get(User, owner_a).change_seq == 4
+
+def test_list_all_task_rows_gathers_every_shard(router):
+    owner_a, owner_b = owners_on(router, "a")[0], owners_on(router, "b")[0]
+    with router.primary() as session:
+        ids = [create_task(session, f"task {n}", owner_a if n % 2 else owner_b).id for n in range(6)]
+
+    rows = list_all_task_rows(limit=4)
+
+    assert [row.id for row in rows] == sorted(ids, reverse=True)[:4]
+    assert router.stats() == {"a": {"tasks": 3, "owners": 1, "archived": 0},
+                              "b": {"tasks": 3, "owners": 1, "archived": 0}}
+
+def test_move_owner_online(router, tmp_path, monkeypatch):
+    owner = owners_on(router, "a")[0]
+    with router.primary() as session:
+        kept, changed, deleted = (create_task(session, name, owner).id for name in ("kept", "changed", "deleted"))
+        delete_task(session, owner, deleted)
+    urls = {name: f"sqlite:///{tmp_path / f'shard_{name}.db'}" for name in ("a", "b")}
+    stale_router = ShardRouter(urls, directory_ttl=3600, session_factory=router.primary)
+    assert stale_router.shard_for(owner) == "a"
+
+    result = move_owner(owner, "b", router=router, batch_size=1, settle=0)
+
+    assert result == {"tasks": 3, "tombstones": 1, "archived": 0, "seq": 4}
+    assert router.shard_for(owner) == "b"
+    with router.primary() as session:
+        assert [task.id for task in get_tasks_by_user(session, owner)] == [kept, changed]
+        update_task(session, owner, changed, "name", "changed again", False)
+        assert get_task_changes(session, owner, 0)["deleted"] == [deleted]
+        changes = get_task_changes(session, owner, 4)
+        assert ([task.id for task in changes["changes"]], changes["cursor"]) == ([changed], 5)
+    with router.session("a") as shard_a:
+        assert shard_a.execute(select(Task)).first() is None
+
+    monkeypatch.setattr(db.sharding, "shard_router", stale_router)
+    with router.primary() as session, pytest.raises(OwnerMovingError):
+        create_task(session, "lost", owner)
+
+    assert plan_rebalance(["a", "b"], router=router) == [(owner, "b", "a")]
+    assert compact_directory(router) == 0
+
+def test_tasks_deleted_during_a_move_stay_deleted(router):
+    owner = owners_on(router, "a")[0]
+    with router.primary() as session:
+        kept, deleted = (create_task(session, name, owner).id for name in ("kept", "deleted"))
+
+    def delete_during_copy(message):
+        if message.endswith("freezing"):
+            with router.primary() as session:
+                delete_task(session, owner, deleted)
+
+    result = move_owner(owner, "b", router=router, settle=0, progress=delete_during_copy)
+
+    assert result["tombstones"] == 1
+    with router.primary() as session:
+        assert [task.id for task in get_tasks_by_user(session, owner)] == [kept]
+        assert get_task_changes(session, owner, 0)["deleted"] == [deleted]
@@ -0,0 +1,91 @@
+"""
+Test Module for Request Coalescing
+
+This module contains tests for the single-flight layer around the crud read functions.
+It covers:
+
+1. Sharing one result between concurrent identical calls, copied only when callers wait.
+2. Propagating the leader's error to waiting callers.
+3. Returning the leader's objects from its own session and copies to the waiting callers.
+"""
+
+
+import threading
+
+import pytest
+from sqlalchemy import inspect
+
+from db.crud import create_user, get_user_by_username
+from db.singleflight import SingleFlight, _attach, _share
+from tests.conftests import TestingSessionLocal, client
+
+class CountingEvent(threading.Event):
+    """Event that records how many threads are waiting on it."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiters = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        self.waiters.release()
+        return super().wait(timeout)
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "row"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", slow_query, str.upper)))
+    leader.start()
+    started.wait(5)
+    done = flight._calls["key"].done = CountingEvent()
+
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow_query, str.upper)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for _ in followers:
+        assert done.waiters.acquire(timeout=5)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("ROW", True)] * 3 + [("row", False)]
+
+    def unexpected_share(result):
+        raise AssertionError("nothing to share without waiting callers")
+
+    assert flight.do("key", lambda: "row", unexpected_share) == ("row", False)
+
+def test_leader_error_is_raised():
+    flight = SingleFlight()
+
+    def failing_query():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", failing_query)
+    assert flight.in_flight == 0
+
+def test_coalesced_read_returns_object_in_callers_session(client):
+    with TestingSessionLocal() as db:
+        create_user(db, "flight_user", "password123", "flight@example.com")
+
+    with TestingSessionLocal() as db, TestingSessionLocal() as waiting_db:
+        user = get_user_by_username(db, "flight_user")
+        assert user in db
+        assert user.email == "flight@example.com"
+
+        copy = _share([user])[0]
+        assert inspect(copy).detached
+        merged = _attach(waiting_db, copy)
+        assert merged in waiting_db and merged is not user
+        assert merged.email == "flight@example.com"
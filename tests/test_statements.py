@@ -0,0 +1,31 @@
+"""
+Test Module for Cached Statements
+
+This module contains tests for the prebuilt crud statements. It covers:
+
+1. Serving repeated crud lookups from the compiled cache.
+2. Exposing the compiled cache counters on the /metrics endpoint.
+"""
+
+
+from db.crud import create_user, get_user_by_username
+from logs.metrics import metrics
+from tests.conftests import TestingSessionLocal, client
+
+def test_repeated_lookups_hit_compiled_cache(client):
+    with TestingSessionLocal() as db:
+        create_user(db, "cached_user", "password123", "cached@example.com")
+        get_user_by_username(db, "cached_user")
+        misses = metrics.get("sql.compiled_cache.misses")
+        hits = metrics.get("sql.compiled_cache.hits")
+        for _ in range(5):
+            assert get_user_by_username(db, "cached_user").username == "cached_user"
+
+    assert metrics.get("sql.compiled_cache.misses") == misses
+    assert metrics.get("sql.compiled_cache.hits") == hits + 5
+    assert 0 < metrics.get("sql.compiled_cache.hit_ratio") <= 1
+
+def test_metrics_endpoint_reports_compiled_cache(client):
+    body = client.get("/metrics").json()
+    assert "sql.compiled_cache.hits" in body
+    assert "sql.compiled_cache.hit_ratio" in body
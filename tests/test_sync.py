@@ -0,0 +1,69 @@
+"""
+Test Module for Delta Sync
+
+This module contains tests for the task change feed. It covers:
+
+1. Returning created, updated and deleted tasks in change order.
+2. Returning only the changes after a cursor, page by page.
+3. Serving the change feed through the GET /tasks/changes route.
+"""
+
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.crud import create_task, update_task, delete_task, get_task_changes
+from db.database import Base
+from db.models import User
+from db.schemas import StatusEnum
+from tests.conftests import client
+
+def make_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add(User(id=1, username="sync_user", email="sync@example.com", hashed_password="x"))
+    db.commit()
+    return db
+
+def test_changes_include_updates_and_deletions(tmp_path):
+    db = make_session(tmp_path)
+    first = create_task(db, "first", 1)
+    second = create_task(db, "second", 1)
+    update_task(db, 1, first.id, "renamed", "first again", None)
+    delete_task(db, 1, second.id)
+
+    result = get_task_changes(db, 1, 0)
+
+    assert [task.description for task in result["changes"]] == ["first again"]
+    assert result["deleted"] == [second.id]
+    assert result["cursor"] == 4
+    assert result["has_more"] is False
+
+def test_changes_resume_from_cursor(tmp_path):
+    db = make_session(tmp_path)
+    for index in range(5):
+        create_task(db, f"task {index}", 1)
+
+    page = get_task_changes(db, 1, 0, limit=3)
+    assert [task.description for task in page["changes"]] == ["task 0", "task 1", "task 2"]
+    assert page["has_more"] is True
+
+    page = get_task_changes(db, 1, page["cursor"], limit=3)
+    assert [task.description for task in page["changes"]] == ["task 3", "task 4"]
+    assert page["has_more"] is False
+    assert get_task_changes(db, 1, page["cursor"])["changes"] == []
+
+def test_changes_route(client):
+    client.post("/users", json={"username": "sync_route", "email": "route@example.com", "password": "password123"})
+    login = client.post("/login", json={"username": "sync_route", "email": "route@example.com", "password": "password123"})
+    client.cookies.set("access_token", login.cookies.get("access_token"))
+    client.post("/tasks", json={"title": "sync", "description": "synced", "status": StatusEnum.in_process.value})
+
+    response = client.get("/tasks/changes", params={"since": 0})
+    client.cookies.clear()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [task["description"] for task in body["changes"]] == ["synced"]
+    assert body["cursor"] == body["changes"][0]["seq"]